@@ -0,0 +1,150 @@
+######################################################
+# Search of the largest alpha (percentage of resources usage) for which a partition can be packed into the hosts
+# Alpha 1.0 is probed first, then the grid 1.0, 0.9, ..., 0.0 is bisected instead of swept linearly,
+# partitions found for a higher alpha are refined instead of being recomputed and candidate alphas can be solved
+# in parallel
+# With a Placement_Problem the partition algorithms that have a from_problem constructor and Bin Packing run on its
+# arrays, the problem is built once and shared by every alpha
+# Input: Partition algorithm with its arguments, Bin Packing arguments, Placement_Problem (optional)
+# Output: Chosen alpha, partition and placement solution, number of solves and solves saved against the sweep
+######################################################
+import copy
+import multiprocessing
+
+from Bin_Packing import Bin_Packing
+from Instrumentation import Instrumentation
+
+
+# Partition and pack for one alpha - Returns the alpha index, the partition before companions are added,
+# the partition that was packed, the placement solution and the cut weights of the partition algorithm
+# The placement solution is {} unless every part was packed - app_placement keeps the parts packed before a failure
+def solve_alpha(arguments):
+    index, alpha, partition_class, partition_arguments, partition_options, initial_partition, packing_arguments, \
+        companions, problem = arguments
+    if problem is not None and hasattr(partition_class, "from_problem"):
+        partition_algorithm = partition_class.from_problem(problem, **partition_options)
+    else:
+        partition_algorithm = partition_class(*partition_arguments, **partition_options)
+    partition_algorithm.calculate_app_partitions(alpha, initial_partition)
+    app_partition = copy.deepcopy(partition_algorithm.app_partition)
+    Alpha_Search.add_companions(partition_algorithm.app_partition, companions)
+
+    if problem is not None:
+        bin_packing = Bin_Packing.from_problem(problem, partition_algorithm.app_partition)
+    else:
+        bin_packing = Bin_Packing(partition_algorithm.app_partition, *packing_arguments)
+    placement = bin_packing.heuristic_packing()
+    return index, app_partition, partition_algorithm.app_partition, placement, partition_algorithm.cut_weights
+
+
+class Alpha_Search:
+    def __init__(self, partition_class, partition_arguments, partition_options, packing_arguments, companions=None,
+                 processes=1, delta=0.1, problem=None):
+        self.partition_class = partition_class  # Binary_Partition, K_Partition or Spectral_Partition
+        self.partition_arguments = partition_arguments
+        self.partition_options = dict(partition_options)
+        self.packing_arguments = packing_arguments  # Arguments of Bin_Packing after the partition
+        self.companions = companions if companions is not None else {}  # Pattern: {"service": "companion"}
+        self.processes = processes  # Candidate alphas solved at the same time
+        self.problem = problem  # Placement_Problem of the same cluster state - None keeps the dictionaries
+        if self.processes > 1 and "processes" in self.partition_options:
+            # Pool workers cannot start the pool of the contraction trials
+            self.partition_options["processes"] = 1
+
+        steps = int(round(1.0 / delta))
+        self.alphas = [round(1.0 - step * delta, 10) for step in range(steps + 1)]
+        self.partitions = {}  # Pattern: {alpha index: partition before companions are added}
+        self.alpha = None
+        self.app_partition = {}
+        self.placement = {}
+        self.cut_weights = []
+        self.solves = 0
+        self.sweep_solves = 0  # Solves of the linear sweep from 1.0 down to the chosen alpha
+        self.solves_saved = 0  # Sweep solves minus solves - Negative when the sweep would have been cheaper
+        self.partitions_reused = 0
+
+    # Services that must share the partition of another service (e.g. redis-cart with cartservice)
+    @staticmethod
+    def add_companions(app_partition, companions):
+        for key in app_partition:
+            for x in range(len(app_partition[key])):
+                if app_partition[key][x] in companions:
+                    app_partition[key].append(companions[app_partition[key][x]])
+
+    # Alpha indexes of the next round - Alpha 1.0 first since it is the common case (one solve like the sweep),
+    # then binary search between the infeasible and feasible alphas (at most 4 more solves on the 11 point grid)
+    def candidates(self, low, high):
+        if low == 0 and 0 not in self.partitions:
+            return [0] + self.split_points(1, high, self.processes - 1)
+        return self.split_points(low, high, self.processes)
+
+    # Points splitting [low, high) into equal segments
+    @staticmethod
+    def split_points(low, high, number_of_points):
+        span = high - low
+        if span <= 0 or number_of_points <= 0:
+            return []
+        if span <= number_of_points:
+            return list(range(low, high))
+        return sorted(set(low + (span * (point + 1)) // (number_of_points + 1) for point in range(number_of_points)))
+
+    # The partition of the closest higher alpha that was already solved is refined
+    def initial_partition(self, index):
+        solved = [solved_index for solved_index in self.partitions if solved_index < index]
+        if not solved:
+            return None
+        self.partitions_reused += 1
+        return self.partitions[max(solved)]
+
+    def solve(self, indexes, pool):
+        tasks = []
+        for index in indexes:
+            tasks.append((index, self.alphas[index], self.partition_class, self.partition_arguments,
+                          self.partition_options, self.initial_partition(index), self.packing_arguments,
+                          self.companions, self.problem))
+        self.solves += len(tasks)
+        Instrumentation.count("alpha_solves", len(tasks))
+        if pool is not None and len(tasks) > 1:
+            return pool.map(solve_alpha, tasks)
+        return [solve_alpha(task) for task in tasks]
+
+    # Search assuming that any alpha below a feasible one is feasible too
+    # Invariant: every alpha index below low is infeasible and the index high is feasible (or past the grid)
+    @Instrumentation.timed
+    def search(self):
+        low = 0
+        high = len(self.alphas)
+        best = None
+        pool = multiprocessing.Pool(self.processes) if self.processes > 1 else None
+        try:
+            while low < high:
+                results = self.solve(self.candidates(low, high), pool)
+                for index, app_partition, packed_partition, placement, cut_weights in sorted(results,
+                                                                                          key=lambda x: x[0]):
+                    self.partitions[index] = app_partition
+                    if bool(placement):
+                        if index < high:
+                            high = index
+                            best = (packed_partition, placement, cut_weights)
+                    elif index < high:
+                        low = max(low, index + 1)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        # A linear sweep solves every alpha down to the chosen one
+        if best is not None:
+            self.alpha = self.alphas[high]
+            self.app_partition, self.placement, self.cut_weights = best
+            self.sweep_solves = high + 1
+        else:
+            self.sweep_solves = len(self.alphas)
+        self.solves_saved = self.sweep_solves - self.solves
+        return self.placement
+
+    def print_report(self):
+        print("Alpha search: alpha=" + str(self.alpha) + " solves=" + str(self.solves) + " linear sweep solves=" +
+              str(self.sweep_solves) + (" solves saved=" + str(self.solves_saved) if self.solves_saved >= 0 else
+                                        " extra solves=" + str(-self.solves_saved)) +
+              " partitions reused=" + str(self.partitions_reused))
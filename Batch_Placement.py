@@ -0,0 +1,192 @@
+######################################################
+# Headless placement of many cluster states without the interactive menus
+# Snapshot files (or the directories holding them) are solved by a pool of workers and one JSON line is streamed
+# per snapshot in the order of the files, a live cluster is collected once and solved in this process
+# Input: Algorithm, Affinity metric, K, Alpha policy, Snapshot files and directories or the IP of a live cluster
+# Output: JSON lines with the placement solution, its scores and the time of every snapshot
+######################################################
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from Cluster_Snapshot import Cluster_Snapshot
+from GCP_Metrics import GCP_Metrics
+from Latency_Objective import Latency_Objective
+from Local_Search import Local_Search
+from Migration_Planner import Migration_Planner
+from Placement_Problem import Placement_Problem
+from Placement_Scoring import Placement_Scoring
+from Portfolio_Runner import Portfolio_Runner
+
+affinity_metrics = {"requests": "service_affinities", "bytes": "total_affinities_bytes",
+                    "latency": "latency_affinities"}
+
+
+# Solve one cluster state - Returns the JSON result of the snapshot
+def place_snapshot(arguments):
+    source, state, algorithm, affinity_metric, options, local_search_budget, portfolio_budget = arguments
+    result = {"snapshot": source, "algorithm": algorithm, "affinity_metric": affinity_metric, "status": "ok"}
+    start_time = time.time()
+    try:
+        collector = Cluster_Snapshot.replay(source) if state is None else Cluster_Snapshot.from_state(state)
+        service_affinities = Portfolio_Runner.affinities(collector, affinity_metric)
+        if algorithm == "portfolio":
+            portfolio_runner = Portfolio_Runner(collector, affinity_metric, portfolio_budget, options=options)
+            placement = portfolio_runner.run()
+            result["best_algorithm"] = portfolio_runner.best_algorithm
+        else:
+            # The problem of the snapshot is built once for the pipeline
+            placement = getattr(Portfolio_Runner, algorithm)(collector, affinity_metric, options,
+                                                             Placement_Problem.from_metrics(collector,
+                                                                                            service_affinities))
+        placement_scoring = Placement_Scoring.from_metrics(collector, service_affinities)
+        # A partial placement is only reported - It is not improved, rolled out or used for predictions
+        complete = bool(placement) and \
+            int(placement_scoring.score(placement_scoring.assignment(placement))["unplaced"][0]) == 0
+        if local_search_budget > 0.0 and complete:
+            placement = Local_Search.from_metrics(collector, placement, service_affinities, local_search_budget,
+                                                  options["seed"]).simulated_annealing()
+    except Exception as error:
+        result["status"] = "error: " + repr(error)
+        result["seconds"] = time.time() - start_time
+        return result
+    result["seconds"] = time.time() - start_time
+
+    if not bool(placement):
+        result["status"] = "no solution"
+        return result
+    assignments = placement_scoring.assignments([collector.current_placement, placement])
+    scores = placement_scoring.score(assignments)
+    result["initial_cross_host_traffic"] = float(scores["cross_host_rate"][0])
+    result["cross_host_traffic"] = float(scores["cross_host_rate"][1])
+    result["initial_cross_host_bytes"] = float(scores["cross_host_bytes"][0])
+    result["cross_host_bytes"] = float(scores["cross_host_bytes"][1])
+    result["nodes_used"] = int(scores["nodes_used"][1])
+    result["migrations"] = int(scores["migrations"][1])
+    result["unplaced_services"] = int(scores["unplaced"][1])
+    if result["unplaced_services"] > 0:
+        result["status"] = "partial"
+        result["placement"] = placement
+        return result
+    # Request-milliseconds per second saved by the edges that become node-local
+    result["predicted_latency_saving"] = \
+        Latency_Objective.from_metrics(collector).predicted_latency_saving(placement)[0]
+    migration_planner = Migration_Planner.from_metrics(collector, placement)
+    migration_planner.plan()
+    result["migration_waves"] = len(migration_planner.waves)
+    result["temporary_moves"] = migration_planner.temporary_moves
+    result["blocked_moves"] = len(migration_planner.blocked_moves)
+    result["placement"] = placement
+    return result
+
+
+class Batch_Placement:
+    def __init__(self, algorithm, affinity_metric="service_affinities", options=None, processes=1,
+                 local_search_budget=0.0, portfolio_budget=60.0):
+        self.algorithm = algorithm  # A pipeline of Portfolio_Runner or "portfolio"
+        self.affinity_metric = affinity_metric
+        self.options = dict(Portfolio_Runner.default_options)
+        if options is not None:
+            self.options.update(options)
+        self.processes = processes
+        if self.algorithm == "portfolio":
+            # The portfolio starts its own processes - Pool workers cannot start them
+            self.processes = 1
+        self.local_search_budget = local_search_budget
+        self.portfolio_budget = portfolio_budget
+
+    # Snapshot files of the given files and directories - Directories are listed in name order
+    @staticmethod
+    def snapshot_files(paths):
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                for name in sorted(os.listdir(path)):
+                    if os.path.isfile(os.path.join(path, name)):
+                        files.append(os.path.join(path, name))
+            else:
+                files.append(path)
+        return files
+
+    def task(self, source, state=None):
+        return (source, state, self.algorithm, self.affinity_metric, self.options, self.local_search_budget,
+                self.portfolio_budget)
+
+    # Stream one JSON line per snapshot to the output as soon as the results arrive in file order
+    def run(self, paths, output):
+        tasks = [self.task(source) for source in self.snapshot_files(paths)]
+        if self.processes > 1 and len(tasks) > 1:
+            with multiprocessing.Pool(min(self.processes, len(tasks))) as pool:
+                for result in pool.imap(place_snapshot, tasks):
+                    self.write(result, output)
+        else:
+            for task in tasks:
+                self.write(place_snapshot(task), output)
+
+    # Collect a live cluster once and solve it in this process
+    def run_live(self, collector, output):
+        self.write(place_snapshot(self.task(collector.url_prometheus, Cluster_Snapshot.state(collector))), output)
+
+    @staticmethod
+    def write(result, output):
+        output.write(json.dumps(result) + "\n")
+        output.flush()
+
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(description="Solve the service placement of snapshots or of a live cluster "
+                                                 "without the menus and print one JSON line per cluster state")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--host", help="external IP of one VM of a live cluster")
+    source.add_argument("--snapshots", nargs="+", help="snapshot files or directories of snapshot files")
+    parser.add_argument("--algorithm", default="heuristic_first_fit",
+                        choices=Portfolio_Runner.pipelines + ["spectral_partition", "portfolio"])
+    parser.add_argument("--affinity-metric", default="requests", choices=sorted(affinity_metrics))
+    parser.add_argument("--k", type=int, default=None, help="K of Bisecting K-Means - the K sweep when left out")
+    parser.add_argument("--alpha-policy", default="search", choices=["search", "linear", "fixed"])
+    parser.add_argument("--alpha", type=float, default=None, help="alpha of the fixed alpha policy")
+    parser.add_argument("--binary-partition-engine", default="stoer_wagner",
+                        choices=["contraction", "karger_stein", "stoer_wagner"])
+    parser.add_argument("--partition-engine", default="karger_stein",
+                        choices=["contraction", "karger_stein", "multilevel"])
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--local-search", type=float, default=0.0, help="seconds of simulated annealing")
+    parser.add_argument("--portfolio-budget", type=float, default=60.0)
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="snapshots solved at the same time")
+    parser.add_argument("--output", default=None, help="JSON lines file - standard output when left out")
+    parser.add_argument("--kiali-port", type=int, default=32002)
+    parser.add_argument("--prometheus-port", type=int, default=32003)
+    parser.add_argument("--namespace", default="default")
+    arguments = parser.parse_args(argv)
+    if arguments.alpha_policy == "fixed" and arguments.alpha is None:
+        parser.error("--alpha is required by the fixed alpha policy")
+    return arguments
+
+
+def main(argv):
+    arguments = parse_arguments(argv)
+    batch_placement = Batch_Placement(arguments.algorithm, affinity_metrics[arguments.affinity_metric],
+                                      {"binary_partition_engine": arguments.binary_partition_engine,
+                                       "partition_engine": arguments.partition_engine, "seed": arguments.seed,
+                                       "alpha_policy": arguments.alpha_policy, "alpha": arguments.alpha,
+                                       "k_value": arguments.k},
+                                      arguments.processes, arguments.local_search, arguments.portfolio_budget)
+    output = open(arguments.output, "w") if arguments.output is not None else sys.stdout
+    try:
+        if arguments.host is not None:
+            collector = GCP_Metrics(arguments.host, arguments.kiali_port, arguments.prometheus_port,
+                                    arguments.namespace)
+            collector.collect_resources()
+            batch_placement.run_live(collector, output)
+        else:
+            batch_placement.run(arguments.snapshots, output)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
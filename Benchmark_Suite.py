@@ -0,0 +1,174 @@
+######################################################
+# Benchmark of the placement algorithms over a grid of synthetic meshes
+# Every algorithm runs on every instance in a fresh process under a time limit, runtime, peak memory (tracemalloc)
+# and the quality of the placement are written as one JSON line per run, and two result files can be compared
+# Input: Grid of (services, hosts), Seeds, Algorithms, Time limit
+# Output: Results file and the comparison of two results files
+######################################################
+import json
+import multiprocessing
+import sys
+import time
+import tracemalloc
+
+from Cluster_Snapshot import Cluster_Snapshot
+from Mesh_Generator import Mesh_Generator
+from Placement_Scoring import Placement_Scoring
+from Portfolio_Runner import Portfolio_Runner
+
+
+# Run one algorithm on one instance - Returns the placement solution, the seconds, the peak of traced memory
+# in bytes and the error message (None if it finished)
+def benchmark_run(arguments):
+    algorithm, state, affinity_metric, options = arguments
+    collector = Cluster_Snapshot.from_state(state)
+    error = None
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    try:
+        placement = getattr(Portfolio_Runner, algorithm)(collector, affinity_metric, options)
+    except Exception as exception:
+        placement = {}
+        error = repr(exception)
+    seconds = time.perf_counter() - start_time
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return placement, seconds, peak, error
+
+
+class Benchmark_Suite:
+    grid = [(10, 3), (100, 10), (1000, 100), (10000, 1000)]  # Pattern: [(services, hosts)] in increasing size
+    metrics = ["seconds", "peak_memory", "cross_host_traffic", "cross_host_bytes", "cpu_imbalance", "ram_imbalance",
+               "nodes_used", "migrations", "unplaced_services"]
+
+    def __init__(self, grid=None, seeds=None, algorithms=None, time_limit=300.0, affinity_metric="service_affinities",
+                 max_replicas=3, options=None, label=""):
+        self.grid = list(grid) if grid is not None else list(Benchmark_Suite.grid)
+        self.seeds = list(seeds) if seeds is not None else [0]
+        self.algorithms = list(algorithms) if algorithms is not None else list(Portfolio_Runner.pipelines)
+        self.time_limit = time_limit  # Seconds of one algorithm on one instance
+        self.affinity_metric = affinity_metric
+        self.max_replicas = max_replicas
+        self.options = dict(Portfolio_Runner.default_options)
+        self.options["seed"] = 0
+        if options is not None:
+            self.options.update(options)
+        self.label = label  # Version of the code the results belong to
+        self.records = []
+
+    # Run in a process of its own - The process is terminated when the time limit is over
+    def run_algorithm(self, algorithm, state):
+        pool = multiprocessing.Pool(1)
+        try:
+            return pool.apply_async(benchmark_run, ((algorithm, state, self.affinity_metric, self.options),)).get(
+                timeout=self.time_limit)
+        except multiprocessing.TimeoutError:
+            return None
+        finally:
+            pool.terminate()
+            pool.join()
+
+    # An algorithm that timed out or failed on an instance is skipped on the larger instances of the same seed
+    def run(self, path):
+        self.records = []
+        with open(path, "w") as results_file:
+            for seed in self.seeds:
+                broken = set()
+                for number_of_services, number_of_hosts in self.grid:
+                    state = Mesh_Generator(number_of_services, number_of_hosts, seed, self.max_replicas).state()
+                    collector = Cluster_Snapshot.from_state(state)
+                    placement_scoring = Placement_Scoring.from_metrics(
+                        collector, Portfolio_Runner.affinities(collector, self.affinity_metric))
+                    for algorithm in self.algorithms:
+                        record = {"label": self.label, "algorithm": algorithm, "services": number_of_services,
+                                  "hosts": number_of_hosts, "seed": seed, "status": "skipped"}
+                        for metric in Benchmark_Suite.metrics:
+                            record[metric] = None
+                        if algorithm not in broken:
+                            self.measure(algorithm, state, placement_scoring, record)
+                            if record["status"] != "ok" and record["status"] != "no solution":
+                                broken.add(algorithm)
+                        self.records.append(record)
+                        results_file.write(json.dumps(record) + "\n")
+                        results_file.flush()
+                        print(json.dumps(record))
+        return self.records
+
+    def measure(self, algorithm, state, placement_scoring, record):
+        result = self.run_algorithm(algorithm, state)
+        if result is None:
+            record["status"] = "timeout"
+            return
+        placement, seconds, peak, error = result
+        record["seconds"] = seconds
+        record["peak_memory"] = peak
+        if error is not None:
+            record["status"] = "error: " + error
+            return
+        if not bool(placement):
+            record["status"] = "no solution"
+            return
+        assignment = placement_scoring.assignment(placement)
+        scores = placement_scoring.score(assignment)
+        record["status"] = "ok"
+        record["cross_host_traffic"] = float(scores["cross_host_rate"][0])
+        record["cross_host_bytes"] = float(scores["cross_host_bytes"][0])
+        record["cpu_imbalance"] = float(scores["cpu_imbalance"][0])
+        record["ram_imbalance"] = float(scores["ram_imbalance"][0])
+        record["nodes_used"] = int(scores["nodes_used"][0])
+        record["migrations"] = int(scores["migrations"][0])
+        record["unplaced_services"] = int(scores["unplaced"][0])
+
+    @staticmethod
+    def load(path):
+        records = []
+        with open(path) as results_file:
+            for line in results_file:
+                if line.strip():
+                    records.append(json.loads(line))
+        return records
+
+    # Ratio new / baseline of runtime, peak memory and cross-host traffic of the runs found in both files
+    @staticmethod
+    def compare(baseline_path, path):
+        baseline = {}
+        for record in Benchmark_Suite.load(baseline_path):
+            baseline[(record["algorithm"], record["services"], record["hosts"], record["seed"])] = record
+        comparison = []
+        for record in Benchmark_Suite.load(path):
+            key = (record["algorithm"], record["services"], record["hosts"], record["seed"])
+            if key not in baseline:
+                continue
+            row = {"algorithm": key[0], "services": key[1], "hosts": key[2], "seed": key[3],
+                   "status": baseline[key]["status"] + " -> " + record["status"]}
+            for metric in ["seconds", "peak_memory", "cross_host_traffic"]:
+                old = baseline[key][metric]
+                new = record[metric]
+                row[metric] = None if old is None or new is None or old == 0 else new / old
+            comparison.append(row)
+
+        columns = ["algorithm", "services", "hosts", "seed", "seconds", "peak_memory", "cross_host_traffic", "status"]
+        print("#" * 100)
+        print("Benchmark comparison - Ratios new / baseline")
+        print("-" * 40)
+        print("".join(column.ljust(20) for column in columns))
+        for row in comparison:
+            values = []
+            for column in columns:
+                value = row[column]
+                if isinstance(value, float):
+                    value = format(value, '.3f')
+                values.append(str(value if value is not None else "-").ljust(20))
+            print("".join(values))
+        print("#" * 100)
+        return comparison
+
+
+if __name__ == "__main__":
+    # Usage: results file [baseline results file to compare with]
+    if len(sys.argv) != 2 and len(sys.argv) != 3:
+        print("ERROR:A results file should be inserted as parameter! Try again!")
+        exit(1)
+    Benchmark_Suite().run(sys.argv[1])
+    if len(sys.argv) == 3:
+        Benchmark_Suite.compare(sys.argv[2], sys.argv[1])
@@ -4,89 +4,129 @@
 # Output: A new placement solution for current problem
 # Paper: Optimizing Service Placement for MicroserviceArchitecture in Clouds
 ######################################################
-import copy
+import numpy as np
+
+from Instrumentation import Instrumentation
+from Placement_Problem import Placement_Problem
 
 
 class Bin_Packing():
     def __init__(self, app_partition, current_placement, current_node_usage_cpu, current_node_usage_ram,
-                 current_node_available_cpu, current_node_available_ram, pod_request_cpu, pod_request_ram, host_list, service_affinities):
+                 current_node_available_cpu, current_node_available_ram, pod_request_cpu, pod_request_ram, host_list, service_affinities,
+                 problem=None):
+        # Requests, host resources, affinities and the current placement are read from the arrays of the problem
+        # Built from the dictionaries if not given
+        if problem is None:
+            problem = Placement_Problem(list(pod_request_cpu), host_list, pod_request_cpu, pod_request_ram, {}, {},
+                                        current_node_available_cpu, current_node_available_ram, current_node_usage_cpu,
+                                        current_node_usage_ram, service_affinities, 0.0, 0.0, current_placement)
+        self.problem = problem
         self.app_partition = app_partition
-        self.current_node_usage_cpu = copy.deepcopy(current_node_usage_cpu)
-        self.current_node_usage_ram = copy.deepcopy(current_node_usage_ram)
-        self.current_node_available_cpu = copy.deepcopy(current_node_available_cpu)
-        self.current_node_available_ram = copy.deepcopy(current_node_available_ram)
-        self.pod_request_cpu = pod_request_cpu
-        self.pod_request_ram = pod_request_ram
-        self.current_placement = current_placement
-        self.service_affinities = service_affinities
-        self.host_list = host_list
+        self.current_node_usage_cpu = problem.host_values(problem.node_initial_cpu_usage)
+        self.current_node_usage_ram = problem.host_values(problem.node_initial_ram_usage)
+        self.current_node_available_cpu = problem.host_values(problem.node_initial_available_cpu)
+        self.current_node_available_ram = problem.host_values(problem.node_initial_available_ram)
+        self.host_list = problem.hosts
         self.app_placement = {}
 
+    # Build the packing of given partitions from a Placement_Problem
+    @staticmethod
+    def from_problem(problem, app_partition):
+        return Bin_Packing(app_partition, None, None, None, None, None, None, None, problem.hosts, None, problem)
+
+    # Traffic terms (service, host, traffic) of every service towards the pods of its neighbours on other hosts,
+    # sorted by service, host and position of the pod in its host - Neighbours follow the lookup order of the
+    # affinities dictionary: outgoing affinities when the service is a source, incoming affinities otherwise
+    def traffic_terms(self):
+        problem = self.problem
+        incoming = ~problem.affinity_sources[problem.edge_dest]
+        term_service = np.concatenate((problem.edge_source, problem.edge_dest[incoming]))
+        term_neighbour = np.concatenate((problem.edge_dest, problem.edge_source[incoming]))
+        term_traffic = np.concatenate((problem.edge_weight, problem.edge_weight[incoming]))
+
+        # One term for each pod of the neighbour
+        pod_order = np.argsort(problem.pod_service, kind="stable")
+        pod_start = np.cumsum(problem.replicas) - problem.replicas
+        counts = problem.replicas[term_neighbour]
+        pods = pod_order[Placement_Problem.expand_ranges(pod_start[term_neighbour], counts)]
+        term_service = np.repeat(term_service, counts)
+        term_traffic = np.repeat(term_traffic, counts)
+        term_host = problem.pod_host[pods]
+        term_position = problem.pod_position[pods]
+
+        # Pods on a host of the service itself are left out
+        same_host = np.isin(term_service * problem.number_of_hosts + term_host,
+                            problem.pod_service * problem.number_of_hosts + problem.pod_host)
+        keep = np.flatnonzero(~same_host)
+        order = keep[np.lexsort((term_position[keep], term_host[keep], term_service[keep]))]
+        return term_service[order], term_host[order], term_traffic[order]
+
+    # Traffic gain of every part towards every host of the current placement: {part: array of host traffic}
+    # Terms are summed in the order of services in the part and of services in the host
+    def traffic_gain_table(self):
+        term_service, term_host, term_traffic = self.traffic_terms()
+        term_count = np.bincount(term_service, minlength=self.problem.number_of_services)
+        term_start = np.cumsum(term_count) - term_count
+
+        traffic_gain = {}
+        for part in self.app_partition:
+            part_ids = self.problem.service_ids(self.app_partition[part])
+            terms = Placement_Problem.expand_ranges(term_start[part_ids], term_count[part_ids])
+            # Bincount adds the terms one after the other in the order they are given
+            traffic_gain[part] = np.bincount(term_host[terms], weights=term_traffic[terms],
+                                             minlength=self.problem.number_of_hosts)
+        return traffic_gain
+
+    @Instrumentation.timed
     def heuristic_packing(self):
+        # Host resources as arrays to check all hosts at once
+        available_cpu = self.problem.node_initial_available_cpu.copy()
+        available_ram = self.problem.node_initial_available_ram.copy()
+        usage_cpu = self.problem.node_initial_cpu_usage.copy()
+        usage_ram = self.problem.node_initial_ram_usage.copy()
+
+        # Traffic rates depend only on the current placement - Placed parts are dropped from the table
+        traffic_gain = self.traffic_gain_table()
+
         # Iterate through all parts
         for part in self.app_partition:
-            max_tf = 0.0
-            max_ml_ram = 0.0
-            max_ml_cpu = 0.0
+            # Calculate Resource Demands - Summed in the order of the part
+            part_ids = self.problem.service_ids(self.app_partition[part])
+            total_cpu = 0.0 + sum(self.problem.service_cpu[part_ids].tolist())
+            total_ram = 0.0 + sum(self.problem.service_ram[part_ids].tolist())
+
+            # Check resource demands of all hosts
+            candidates = np.flatnonzero((total_cpu < available_cpu) & (total_ram < available_ram))
+            Instrumentation.count("packing_parts")
+            Instrumentation.count("hosts_evaluated", len(self.host_list))
+            part_gain = traffic_gain.pop(part)
+
+            # Maximum Traffic Rates then Most-Loaded Situation (CPU prioritized) - First host wins ties
             max_host = ''
-            total_ram = 0.0
-            total_cpu = 0.0
-
-            # Calculate Resource Demands
-            for service in self.app_partition[part]:
-                # Calculate resources for current service
-                temp_cpu = float(self.pod_request_cpu[service])
-                temp_ram = float(self.pod_request_ram[service])
-
-                total_cpu += temp_cpu
-                total_ram += temp_ram
-
-            # Iterate through available hosts
-            for host in self.host_list:
-                enough_resources = False
-
-                if (total_cpu < float(self.current_node_available_cpu[host]) and total_ram < float(
-                        self.current_node_available_ram[host])):
-                    enough_resources = True
-
-                # Check if resource demands are enough
-                if enough_resources:
-                    temp_tf = 0.0
-
-                    # Calculate Traffic rates between services in current part of partition and services in current host
-                    for service in self.app_partition[part]:
-                        for x in self.current_placement[host]:
-                            if service in self.current_placement[host] and x in self.current_placement[host]:
-                                continue  # Same host
-                            else:  # Different hosts
-                                if service in self.service_affinities:
-                                    if x in self.service_affinities[service]:
-                                        temp_tf += float(self.service_affinities[service][x])
-                                elif x in self.service_affinities:
-                                    if service in self.service_affinities[x]:
-                                        temp_tf += float(self.service_affinities[x][service])
-
-                    # Calculate Most Loaded Situation - Prioritize CPU
-                    temp_ml_cpu = float(self.current_node_usage_cpu[host]) + total_cpu
-                    temp_ml_ram = float(self.current_node_usage_ram[host]) + total_ram
-
-                    # Check Traffic Rates and Most-Loaded Situtations - Maximum searched
-                    if (temp_tf > max_tf) or (temp_tf == max_tf and temp_ml_cpu > max_ml_cpu) or (
-                            temp_tf == max_tf and temp_ml_cpu == max_ml_cpu and temp_ml_ram > max_ml_ram):
-                        max_tf = temp_tf
-                        max_ml_cpu = temp_ml_cpu
-                        max_ml_ram = temp_ml_ram
-                        max_host = host
+            if candidates.size > 0:
+                temp_tf = part_gain[candidates]
+                candidates = candidates[temp_tf == temp_tf.max()]
+                temp_ml_cpu = usage_cpu[candidates] + total_cpu
+                candidates = candidates[temp_ml_cpu == temp_ml_cpu.max()]
+                temp_ml_ram = usage_ram[candidates] + total_ram
+                best = candidates[np.argmax(temp_ml_ram)]
+                # The host must improve on the empty maximum (0.0, 0.0, 0.0)
+                if (part_gain[best], usage_cpu[best] + total_cpu, usage_ram[best] + total_ram) > (0.0, 0.0, 0.0):
+                    max_host = self.host_list[best]
 
             # Check max_host
             if max_host == '':  # No host found -> return
                 return {}
             else:
                 # Update Resources
-                self.current_node_available_cpu[max_host] = float(self.current_node_available_cpu[max_host]) - total_cpu
-                self.current_node_available_ram[max_host] = float(self.current_node_available_ram[max_host]) - total_ram
-                self.current_node_usage_cpu[max_host] = float(self.current_node_usage_cpu[max_host]) + total_cpu
-                self.current_node_usage_ram[max_host] = float(self.current_node_usage_ram[max_host]) + total_ram
+                available_cpu[best] -= total_cpu
+                available_ram[best] -= total_ram
+                usage_cpu[best] += total_cpu
+                usage_ram[best] += total_ram
+                self.current_node_available_cpu[max_host] = float(available_cpu[best])
+                self.current_node_available_ram[max_host] = float(available_ram[best])
+                self.current_node_usage_cpu[max_host] = float(usage_cpu[best])
+                self.current_node_usage_ram[max_host] = float(usage_ram[best])
 
                 # Update placement
                 if max_host not in self.app_placement:
@@ -95,3 +135,4 @@ class Bin_Packing():
                 # Append services in host
                 for service in self.app_partition[part]:
                     self.app_placement[max_host].append(service)
+        return self.app_placement
@@ -7,17 +7,36 @@
 import copy
 import random
 
+from Instrumentation import Instrumentation
+from Karger_Stein import Karger_Stein
+from Parallel_Contraction import Parallel_Contraction
+from Placement_Problem import Placement_Problem
+from Stoer_Wagner import Stoer_Wagner
+
 
 class Binary_Partition:
-    def __init__(self, pod_request_cpu, pod_request_ram, service_affinities, max_ram_allocation, max_cpu_allocation, host_list, service_list):
-        self.pod_request_cpu = copy.deepcopy(pod_request_cpu)
-        self.pod_request_ram = copy.deepcopy(pod_request_ram)
-        self.service_affinities = copy.deepcopy(service_affinities)
+    def __init__(self, pod_request_cpu, pod_request_ram, service_affinities, max_ram_allocation, max_cpu_allocation, host_list, service_list,
+                 engine="contraction", seed=None, processes=1, target_cut=None, time_budget=None, problem=None):
+        # Requests and affinities are read from the arrays of the problem - Built from the dictionaries if not given
+        if problem is None:
+            problem = Placement_Problem(service_list, host_list, pod_request_cpu, pod_request_ram, {}, {}, {}, {}, {},
+                                        {}, service_affinities, max_cpu_allocation, max_ram_allocation, {})
+        self.problem = problem
         self.max_ram_allocation = float(max_ram_allocation)
         self.max_cpu_allocation = float(max_cpu_allocation)
         self.host_list = host_list
         self.service_list = service_list
         self.app_partition = {}
+        self.engine = engine  # "contraction", "karger_stein" or "stoer_wagner"
+        # Independent trials seeded from one master seed - Spread over a process pool when processes > 1
+        self.contraction_trials = Parallel_Contraction(processes, seed, target_cut, time_budget)
+        self.cut_weights = []  # Weight of the cut found for each partitioned part
+
+    # Build the partition algorithm from a Placement_Problem - The service list keeps one entry per pod
+    @staticmethod
+    def from_problem(problem, engine="contraction", seed=None, processes=1, target_cut=None, time_budget=None):
+        return Binary_Partition(None, None, None, problem.max_ram_allocation, problem.max_cpu_allocation, problem.hosts,
+                                problem.service_list, engine, seed, processes, target_cut, time_budget, problem)
 
     @staticmethod
     def graph_construction(services, affinities):
@@ -47,8 +66,9 @@ class Binary_Partition:
 
         return graph
 
+    # Random choices come from random_generator (a random.Random of the trial) - The global state by default
     @staticmethod
-    def contract_graph(parts, temp_graph, affinities):
+    def contract_graph(parts, temp_graph, affinities, random_generator=random):
         curr_graph = copy.deepcopy(temp_graph)
 
         # Total Edjes
@@ -59,12 +79,12 @@ class Binary_Partition:
         while edje_count > (
                 parts - 1):  # For Binary Partition we need 2 Vertices and 1 Edje - K partition -> K Vertices and K-1 Edjes(at least)
             # Pick random source and destination whose affinity hasnt be processed
-            random_source = random.choice(list(curr_graph.keys()))
-            random_dest = random.choice((curr_graph[random_source]))
+            random_source = random_generator.choice(list(curr_graph.keys()))
+            random_dest = random_generator.choice((curr_graph[random_source]))
 
             while float(affinities[random_source][random_dest]) == 0.0:
-                random_source = random.choice(list(curr_graph.keys()))
-                random_dest = random.choice((curr_graph[random_source]))
+                random_source = random_generator.choice(list(curr_graph.keys()))
+                random_dest = random_generator.choice((curr_graph[random_source]))
 
             # Check if Random_Dest is also a source and update all the destination services for random_source
             if random_dest in curr_graph:
@@ -169,88 +189,78 @@ class Binary_Partition:
 
         return app_partition
 
+    # Minimum cut of a part of the application with the chosen engine - Trials run in the contraction pool
+    # Stoer-Wagner finds the exact minimum cut deterministically in a single run
+    @Instrumentation.timed
+    def min_cut(self, k_partition, services):
+        if self.engine == "stoer_wagner":
+            Instrumentation.count("stoer_wagner_cuts")
+            part_services, edges = self.problem.part_edges(services)
+            return Stoer_Wagner(part_services, None, edges).min_cut()
+        if self.engine == "karger_stein":
+            trials = Karger_Stein.recommended_trials(len(set(services)))
+        else:
+            trials = len(services)  # One repeat of the contraction for each service
+        return self.contraction_trials.min_cut(self.engine, self.contract_graph, k_partition, services,
+                                               self.problem, trials)
+
     # Calculate the partitions of Application for given alpha value (percentage of resources usage)
-    def calculate_app_partitions(self, alpha):
+    # A partition found for a higher alpha can be given as initial partition since a lower alpha only refines it
+    @Instrumentation.timed
+    def calculate_app_partitions(self, alpha, initial_partition=None):
         # Initialization
-        curr_partition = {'1': copy.deepcopy(self.service_list)}
-        total_parts = len(curr_partition)
+        if initial_partition is not None:
+            curr_partition = copy.deepcopy(initial_partition)
+            total_parts = max([int(part) for part in curr_partition] + [0])
+        else:
+            curr_partition = {'1': copy.deepcopy(self.service_list)}
+            total_parts = len(curr_partition)
         k_partition = 2
 
-        # Iterate until we find a suitable partition
-        while True:
-            app_partition = copy.deepcopy(curr_partition)
-            # Gather Resource demands and Number of Services
-            for part in app_partition:
-                sum_cpu_usage = 0.0
-                sum_ram_usage = 0.0
-                check_resource_demands = True
-                check_number_of_services = True
-
-                # Check if part contains more than one service
-                if len(app_partition[part]) <= 1:
-                    check_number_of_services = False
-
-                # Check resource demands and if they exceed alpha
-                for service in app_partition[part]:
-                    temp_cpu = float(self.pod_request_cpu[service])
-                    temp_ram = float(self.pod_request_ram[service])
-
-                    sum_cpu_usage += temp_cpu
-                    sum_ram_usage += temp_ram
-
-                if (sum_cpu_usage < (self.max_cpu_allocation * alpha) and
-                        sum_ram_usage < (self.max_ram_allocation * alpha)):
-                    check_resource_demands = False
-
-                # Cannot meet Criteria - Partition Application Part
-                if check_number_of_services and check_resource_demands:
-                    contraction_repeats = len(app_partition[part])
-                    temp_graph = self.graph_construction(app_partition[part], self.service_affinities)
-                    min_graph = copy.deepcopy(temp_graph)
-                    min_sum = 0.0
-                    temp_sum = 0.0
-
-                    # Find part service affinities and min sum
-                    part_service_traffic = {}
-                    for source in temp_graph:
-                        part_service_traffic[source] = {}
-                        for dest in temp_graph[source]:
-                            part_service_traffic[source][dest] = float(self.service_affinities[source][dest])
-                            min_sum += float(self.service_affinities[source][dest])
-
-                    # Remove current part
-                    curr_partition.pop(part)
-
-                    # Contraction Algorithm
-                    while contraction_repeats > 0:
-                        # Apply contraction Algorithm
-                        service_traffic = copy.deepcopy(part_service_traffic)
-                        partitioned_graph = self.contract_graph(k_partition, temp_graph, service_traffic)
-
-                        # Compare with minimum - Check if null
-                        if bool(partitioned_graph):
-                            for service in service_traffic:
-                                for x in service_traffic[service]:
-                                    temp_sum += float(service_traffic[service][x])
-
-                            # Check if another minimum Graph found
-                            if temp_sum < min_sum:
-                                min_graph = partitioned_graph
-                                min_sum = temp_sum
-
-                        # Decrease repeats
-                        temp_sum = 0.0
-                        contraction_repeats -= 1
-
-                    # Partition the application and repeat process
-                    for key in min_graph:
-                        curr_partition[str(total_parts + 1)] = min_graph[key]
-                        if key not in curr_partition[str(total_parts + 1)]:
-                            curr_partition[str(total_parts + 1)].append(key)
-                        total_parts += 1
-
-            # Identical dictionaries - No changes happen - Break
-            if app_partition == curr_partition:
-                break
+        # The pool of the contraction trials serves every part of this alpha
+        try:
+            # Iterate until we find a suitable partition
+            while True:
+                app_partition = copy.deepcopy(curr_partition)
+                # Gather Resource demands and Number of Services
+                for part in app_partition:
+                    sum_cpu_usage = 0.0
+                    sum_ram_usage = 0.0
+                    check_resource_demands = True
+                    check_number_of_services = True
+
+                    # Check if part contains more than one service
+                    if len(app_partition[part]) <= 1:
+                        check_number_of_services = False
+
+                    # Check resource demands and if they exceed alpha - Summed in the order of the part
+                    part_ids = self.problem.service_ids(app_partition[part])
+                    sum_cpu_usage += sum(self.problem.service_cpu[part_ids].tolist())
+                    sum_ram_usage += sum(self.problem.service_ram[part_ids].tolist())
+
+                    if (sum_cpu_usage < (self.max_cpu_allocation * alpha) and
+                            sum_ram_usage < (self.max_ram_allocation * alpha)):
+                        check_resource_demands = False
+
+                    # Cannot meet Criteria - Partition Application Part
+                    if check_number_of_services and check_resource_demands:
+                        min_graph, min_sum = self.min_cut(k_partition, app_partition[part])
+                        self.cut_weights.append(min_sum)
+
+                        # Remove current part
+                        curr_partition.pop(part)
+
+                        # Partition the application and repeat process
+                        for key in min_graph:
+                            curr_partition[str(total_parts + 1)] = min_graph[key]
+                            if key not in curr_partition[str(total_parts + 1)]:
+                                curr_partition[str(total_parts + 1)].append(key)
+                            total_parts += 1
+
+                # Identical dictionaries - No changes happen - Break
+                if app_partition == curr_partition:
+                    break
+        finally:
+            self.contraction_trials.close()
 
         self.app_partition = app_partition
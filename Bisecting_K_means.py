@@ -1,144 +1,172 @@
 ######################################################
 # A modified version of Bisecting K-Means algorithm to produce app clusters given the K value of Cluster
-# Input: Service List, Service Affinities, K value
+# Clusters are bisected on the symmetric affinity matrix and the clustering of every K is recorded so that
+# K can be picked by the cross-host traffic left after Bin Packing
+# Input: Service List, Service Affinities, K value (or Bin Packing arguments for the K sweep)
 # Output: K clusters with high affinity
 ######################################################
 import copy
-import random
-import sys
+import multiprocessing
+
+import numpy as np
+from scipy import sparse
+
+from Bin_Packing import Bin_Packing
+from Instrumentation import Instrumentation
+
+
+# Pack the clusters of one K - Returns K, the placement solution and the cross-host traffic (None if not packed)
+def score_clusters(arguments):
+    k_value, app_clusters, packing_arguments, service_to_id, edge_u, edge_v, edge_w = arguments
+    bin_packing = Bin_Packing(app_clusters, *packing_arguments)
+    # heuristic_packing returns {} when a cluster does not fit - app_placement keeps the clusters packed before it
+    if bin_packing.heuristic_packing() == {} or not bool(bin_packing.app_placement):
+        return k_value, {}, None
+
+    service_host = np.full(len(service_to_id), -1, dtype=np.int64)
+    for host_index, host in enumerate(bin_packing.app_placement):
+        for service in bin_packing.app_placement[host]:
+            if service in service_to_id:
+                service_host[service_to_id[service]] = host_index
+    return k_value, bin_packing.app_placement, float(edge_w[service_host[edge_u] != service_host[edge_v]].sum())
 
 
 class Bisecting_K_means:
-    def __init__(self, service_affinities, service_list):
+    def __init__(self, service_affinities, service_list, random_generator=None):
         self.service_affinities = copy.deepcopy(service_affinities)
         self.service_list = service_list
         self.total_nodes = len(service_list)
         self.app_clusters = {}
-
+        self.clusterings = {}  # Pattern: {K: app_clusters} for every K reached by the bisections
+        self.random = random_generator if random_generator is not None else np.random.default_rng()
+        self.k_scores = {}  # Pattern: {K: cross-host traffic after Bin Packing} of the K sweep
+        self.best_k = None
+        self.placement = {}
+
+        self.services = []
+        self.service_to_id = {}
+        for service in service_list:
+            if service not in self.service_to_id:
+                self.service_to_id[service] = len(self.services)
+                self.services.append(service)
+
+        # Symmetric affinity matrix - Both directions of an affinity are summed and self loops dropped
+        rows = []
+        cols = []
+        weights = []
+        for source in self.service_affinities:
+            if source not in self.service_to_id:
+                continue
+            for dest in self.service_affinities[source]:
+                if dest not in self.service_to_id or dest == source:
+                    continue
+                rows.append(self.service_to_id[source])
+                cols.append(self.service_to_id[dest])
+                weights.append(float(self.service_affinities[source][dest]))
+        shape = (len(self.services), len(self.services))
+        directed = sparse.csr_matrix((np.array(weights, dtype=float), (np.array(rows, dtype=np.int64),
+                                                                        np.array(cols, dtype=np.int64))), shape=shape)
+        self.affinity = (directed + directed.T).tocsr()
+        self.affinity.eliminate_zeros()
+
+    # Pair of services of a cluster with the least affinity - A pair without affinity is picked first
+    @staticmethod
+    def find_centroids(cluster_matrix):
+        size = cluster_matrix.shape[0]
+        degrees = np.diff(cluster_matrix.indptr)
+        incomplete = np.flatnonzero(degrees < size - 1)
+        if incomplete.size > 0:
+            first = int(incomplete[0])
+            neighbours = cluster_matrix.indices[cluster_matrix.indptr[first]:cluster_matrix.indptr[first + 1]]
+            others = np.setdiff1d(np.arange(size), np.append(neighbours, first))
+            return first, int(others[0])
+
+        # Every pair has an affinity - Minimum over the upper triangle, first pair wins ties
+        coo = sparse.triu(cluster_matrix, k=1).tocoo()
+        order = np.lexsort((coo.col, coo.row, coo.data))
+        return int(coo.row[order[0]]), int(coo.col[order[0]])
+
+    @Instrumentation.timed
     def find_bistecting_K_means_partitions(self, k_value):
-        parent_cluster = copy.deepcopy(self.service_list)
-        self.app_clusters = {"1": parent_cluster}
-        cluster_affinities = {"1": 0.0}
+        members = {"1": np.arange(len(self.services))}
+        cluster_affinities = {"1": float(self.affinity.sum()) / 2.0}
         cluster_count = 1
-        index = -1
         last_index = 1
+        self.clusterings = {1: {"1": list(self.services)}}
 
         while cluster_count < int(k_value):
             # Find the cluster with the least sum of affinities - Maximum Error
-            min_total_affinity = sys.float_info.max
-            for x in self.app_clusters:
+            index = None
+            for x in members:
                 # If cluster contains only one service skip
-                if len(self.app_clusters[x]) == 1:
+                if members[x].size == 1:
                     continue
-                if cluster_affinities[x] < min_total_affinity:
-                    parent_cluster = self.app_clusters[x]
+                if index is None or cluster_affinities[x] < cluster_affinities[index]:
                     index = x
+            if index is None:
+                break
 
             # Remove the cluster to be split up
-            self.app_clusters.pop(index)
+            parent_cluster = members.pop(index)
             cluster_affinities.pop(index)
+            cluster_matrix = self.affinity[parent_cluster][:, parent_cluster].tocsr()
+
+            # Pick centroids according to less or no affinities
+            first_centroid, second_centroid = self.find_centroids(cluster_matrix)
+
+            # Assign every service to the centroid with the highest affinity - Ties are assigned randomly
+            affinity_centroid_1 = cluster_matrix[:, first_centroid].toarray().ravel()
+            affinity_centroid_2 = cluster_matrix[:, second_centroid].toarray().ravel()
+            to_first = affinity_centroid_1 > affinity_centroid_2
+            ties = affinity_centroid_1 == affinity_centroid_2
+            to_first[ties] = self.random.integers(2, size=int(ties.sum())) == 0
+            to_first[first_centroid] = True
+            to_first[second_centroid] = False
 
-            # Pick centroids according to less or no affinities and remove them from list
-            if len(parent_cluster) == 2:
-                # Cluster contains only 2 services - > Make them centroids
-                first_centroid = random.choice(parent_cluster)
-                parent_cluster.remove(first_centroid)
-                second_centroid = random.choice(parent_cluster)
-                parent_cluster.remove(second_centroid)
-            else:
-                centroids_found = False
-                min_affinity = sys.float_info.max
-                first_centroid = ""
-                second_centroid = ""
-                # Cluster contains more than 2 clusters -> Find min or no affinity and pick the centroids accordingly
-                for first_service in parent_cluster:
-                    for second_service in parent_cluster:
-                        if first_service == second_service:
-                            # Same service
-                            continue
-                        else:
-                            # Check for affinity
-                            if first_service in self.service_affinities:
-                                if second_service in self.service_affinities[first_service]:
-                                    if min_affinity > float(self.service_affinities[first_service][second_service]):
-                                        min_affinity = float(self.service_affinities[first_service][second_service])
-                                        first_centroid = first_service
-                                        second_centroid = second_service
-                                else:
-                                    # They dont have an affinity so pick them for centroids
-                                    centroids_found = True
-                                    first_centroid = first_service
-                                    second_centroid = second_service
-                                    break
-                            elif second_service in self.service_affinities:
-                                if first_service in self.service_affinities[second_service]:
-                                    if min_affinity > float(self.service_affinities[second_service][first_service]):
-                                        min_affinity = float(self.service_affinities[second_service][first_service])
-                                        first_centroid = first_service
-                                        second_centroid = second_service
-                                else:
-                                    # They dont have an affinity so pick them for centroids
-                                    centroids_found = True
-                                    first_centroid = first_service
-                                    second_centroid = second_service
-                                    break
-                            else:
-                                # They dont have an affinity so pick them for centroids
-                                centroids_found = True
-                                first_centroid = first_service
-                                second_centroid = second_service
-                                break
-
-                                # Check if centroids have been found
-                    if centroids_found:
-                        break
-
-                parent_cluster.remove(first_centroid)
-                parent_cluster.remove(second_centroid)
-
-            # Create Lists for centroids
-            self.app_clusters[last_index] = [first_centroid]
-            self.app_clusters[last_index + 1] = [second_centroid]
-
-            sum_affinity_centroid_1 = 0.0
-            sum_affinity_centroid_2 = 0.0
-            # Insert services to the random generated centroids
-            while parent_cluster:
-                curr_service = parent_cluster.pop(len(parent_cluster) - 1)
-                affinity_centroid_1 = 0.0
-                affinity_centroid_2 = 0.0
-
-                # Check if service belongs to keys of service_affinities dictionary
-                if curr_service in self.service_affinities:
-                    # Check the affinities with centroids
-                    if first_centroid in self.service_affinities[curr_service]:
-                        affinity_centroid_1 += float(self.service_affinities[curr_service][first_centroid])
-                    elif second_centroid in self.service_affinities[curr_service]:
-                        affinity_centroid_2 += float(self.service_affinities[curr_service][second_centroid])
-
-                # Check if centroids contain the current service
-                if first_centroid in self.service_affinities:
-                    if curr_service in self.service_affinities[first_centroid]:
-                        affinity_centroid_1 += float(self.service_affinities[first_centroid][curr_service])
-
-                if second_centroid in self.service_affinities:
-                    if curr_service in self.service_affinities[second_centroid]:
-                        affinity_centroid_2 += float(self.service_affinities[second_centroid][curr_service])
-
-                # Assign service the best centroid according to max affinity
-                sum_affinity_centroid_1 += affinity_centroid_1
-                sum_affinity_centroid_2 += affinity_centroid_2
-                if affinity_centroid_1 < sum_affinity_centroid_2:
-                    self.app_clusters[last_index + 1].append(curr_service)
-                elif affinity_centroid_1 > sum_affinity_centroid_2:
-                    self.app_clusters[last_index].append(curr_service)
-                else:
-                    self.app_clusters[random.choice([last_index, last_index + 1])].append(curr_service)
-
-            # Update total affinities
-            cluster_affinities[last_index] = sum_affinity_centroid_1
-            cluster_affinities[last_index + 1] = sum_affinity_centroid_2
+            # Create the new clusters and their sum of affinities
+            for key, mask in ((str(last_index + 1), to_first), (str(last_index + 2), ~to_first)):
+                members[key] = parent_cluster[mask]
+                cluster_affinities[key] = float(cluster_matrix[mask][:, mask].sum()) / 2.0
 
             # Update variables
             last_index += 2
             cluster_count += 1
+            self.clusterings[cluster_count] = self.cluster_names(members)
+
+        self.app_clusters = self.cluster_names(members)
+
+    def cluster_names(self, members):
+        app_clusters = {}
+        for key in members:
+            app_clusters[key] = [self.services[service] for service in members[key]]
+        return app_clusters
+
+    # K sweep - Bisect down to single services once, pack the clusters of every K from 2 to N in parallel
+    # and keep the K with the least cross-host traffic (smallest K on ties)
+    @Instrumentation.timed
+    def find_best_k(self, packing_arguments, processes=1):
+        self.find_bistecting_K_means_partitions(len(self.services))
+        coo = sparse.triu(self.affinity, k=1).tocoo()
+        tasks = [(k_value, self.clusterings[k_value], packing_arguments, self.service_to_id, coo.row, coo.col,
+                  coo.data) for k_value in sorted(self.clusterings) if k_value >= 2 or len(self.clusterings) == 1]
+
+        results = []
+        if processes > 1 and len(tasks) > 1:
+            with multiprocessing.Pool(min(processes, len(tasks))) as pool:
+                results = pool.map(score_clusters, tasks)
+        else:
+            results = [score_clusters(task) for task in tasks]
+
+        self.k_scores = {}
+        self.best_k = None
+        self.placement = {}
+        for k_value, placement, cross_host_traffic in results:
+            if cross_host_traffic is None:
+                continue
+            self.k_scores[k_value] = cross_host_traffic
+            if self.best_k is None or cross_host_traffic < self.k_scores[self.best_k]:
+                self.best_k = k_value
+                self.placement = placement
+        if self.best_k is not None:
+            self.app_clusters = self.clusterings[self.best_k]
+        return self.placement
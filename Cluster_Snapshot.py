@@ -0,0 +1,66 @@
+######################################################
+# Record and replay of the Kubernetes Cluster state collected by GCP_Metrics
+# Input: GCP_Metrics after collect_resources (record) or a snapshot file (replay)
+# Output: Compressed and versioned snapshot file or a GCP_Metrics rebuilt without network access
+######################################################
+import gzip
+import json
+
+from GCP_Metrics import GCP_Metrics
+
+
+class Cluster_Snapshot:
+    snapshot_format = "service-placement-snapshot"
+    snapshot_version = 1
+
+    # Processed collector attributes stored in the snapshot - raw API responses are never stored
+    attributes = ["host_list", "service_list", "number_of_hosts",
+                  "node_request_cpu", "node_request_ram", "node_allocatable_cpu", "node_allocatable_ram",
+                  "node_available_cpu", "node_available_ram", "node_initial_available_cpu",
+                  "node_initial_available_ram", "node_initial_cpu_usage", "node_initial_ram_usage",
+                  "max_cpu_allocation", "max_ram_allocation",
+                  "pod_request_cpu", "pod_request_ram", "current_pod_request_cpu", "current_pod_request_ram",
+                  "pod_usage_cpu", "pod_usage_ram",
+                  "traffic_requested_bytes", "traffic_responsed_bytes", "traffic_requested_count",
+                  "traffic_responsed_count",
+                  "total_edjes", "response_times", "service_affinities", "sorted_service_affinities",
+                  "affinities_collection", "total_affinities_bytes", "affinities_bytes_collection",
+                  "initial_placement", "current_placement"]
+
+    # State of the collector as a plain dictionary
+    @staticmethod
+    def state(collector):
+        state = {"format": Cluster_Snapshot.snapshot_format, "version": Cluster_Snapshot.snapshot_version,
+                 "namespace": collector.namespace, "url_prometheus": collector.url_prometheus,
+                 "url_kiali": collector.url_kiali, "attributes": {}}
+        for attribute in Cluster_Snapshot.attributes:
+            state["attributes"][attribute] = getattr(collector, attribute)
+        return state
+
+    # Rebuild a collector from a state dictionary - no request is sent
+    @staticmethod
+    def from_state(state):
+        if state.get("format") != Cluster_Snapshot.snapshot_format:
+            raise ValueError("Not a cluster snapshot")
+        if state.get("version") != Cluster_Snapshot.snapshot_version:
+            raise ValueError("Unsupported cluster snapshot version: " + str(state.get("version")))
+
+        collector = GCP_Metrics("", 0, 0, state["namespace"])
+        collector.url_prometheus = state["url_prometheus"]
+        collector.url_kiali = state["url_kiali"]
+        for attribute in Cluster_Snapshot.attributes:
+            setattr(collector, attribute, state["attributes"][attribute])
+        return collector
+
+    # Save the collected cluster state as gzip compressed JSON
+    @staticmethod
+    def record(collector, path):
+        with gzip.open(path, "wt", encoding="utf-8", compresslevel=6) as snapshot_file:
+            json.dump(Cluster_Snapshot.state(collector), snapshot_file, separators=(",", ":"))
+
+    # Load a snapshot file into a GCP_Metrics ready for the placement algorithms
+    @staticmethod
+    def replay(path):
+        with gzip.open(path, "rt", encoding="utf-8") as snapshot_file:
+            state = json.load(snapshot_file)
+        return Cluster_Snapshot.from_state(state)
@@ -0,0 +1,167 @@
+######################################################
+# Local mock of kube-scheduler driving a Scheduler_Extender over HTTP
+# Every pod is scheduled the way kube-scheduler does with an extender: POST /filter on the candidate nodes,
+# POST /prioritize on the nodes that passed, the node with the highest priority wins (ties to the first node) and
+# POST /bind binds the pod through a binder that records the binding - Deleted pods are reported with POST /unbind
+# The mock reschedules pods of the current placement (delete then schedule again), checks the score table served
+# by the extender against one built from scratch on the resulting placement and reports the latency of every verb
+# Input: Cluster snapshot or synthetic mesh (Mesh_Generator), Number of pods to reschedule, Affinity metric
+# Output: Bindings, consistency of the score table, latency of the verbs
+######################################################
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+
+import numpy as np
+
+from Batch_Placement import affinity_metrics
+from Cluster_Snapshot import Cluster_Snapshot
+from Mesh_Generator import Mesh_Generator
+from Portfolio_Runner import Portfolio_Runner
+from Scheduler_Extender import Scheduler_Extender
+
+
+class Extender_Mock:
+    def __init__(self, address="127.0.0.1", port=8888):
+        self.connection = http.client.HTTPConnection(address, port)  # One keep-alive connection like kube-scheduler
+        self.timings = {}  # Pattern: {"verb": [seconds of every request]}
+
+    def post(self, verb, arguments):
+        body = json.dumps(arguments)
+        start_time = time.perf_counter()
+        self.connection.request("POST", "/" + verb, body, {"Content-Type": "application/json"})
+        response = self.connection.getresponse()
+        result = json.loads(response.read())
+        if verb not in self.timings:
+            self.timings[verb] = []
+        self.timings[verb].append(time.perf_counter() - start_time)
+        if response.status != 200:
+            raise RuntimeError(verb + " answered " + str(response.status) + ": " + str(result))
+        return result
+
+    def get(self, path):
+        self.connection.request("GET", "/" + path)
+        return json.loads(self.connection.getresponse().read())
+
+    # Filter, prioritize and bind one pod - Returns the node of the pod, None when no node passed or bind failed
+    def schedule(self, pod_name, service, nodes, namespace="default"):
+        pod = {"metadata": {"name": pod_name, "namespace": namespace, "labels": {"app": service}}}
+        result = self.post("filter", {"Pod": pod, "NodeNames": nodes})
+        if result.get("Error"):
+            return None
+        passed = result.get("NodeNames") or []
+        if not passed:
+            return None
+        priorities = self.post("prioritize", {"Pod": pod, "NodeNames": passed})
+        best = None
+        for priority in priorities:
+            if best is None or priority["Score"] > best["Score"]:
+                best = priority
+        result = self.post("bind", {"PodName": pod_name, "PodNamespace": namespace, "PodUID": pod_name,
+                                    "Node": best["Host"]})
+        if result.get("Error"):
+            return None
+        return best["Host"]
+
+    def delete(self, pod_name, node, namespace="default"):
+        self.post("unbind", {"PodName": pod_name, "PodNamespace": namespace, "Node": node})
+
+    def close(self):
+        self.connection.close()
+
+    # Largest difference between two score tables
+    @staticmethod
+    def table_difference(table, expected):
+        difference = 0.0
+        for service in set(table) | set(expected):
+            row = table.get(service, {})
+            expected_row = expected.get(service, {})
+            for node in set(row) | set(expected_row):
+                difference = max(difference, abs(row.get(node, 0.0) - expected_row.get(node, 0.0)))
+        return difference
+
+    def print_report(self, bindings, failed, difference):
+        print("#" * 100)
+        print("Extender mock - " + str(len(bindings)) + " pods bound, " + str(len(failed)) + " not scheduled")
+        print("-" * 40)
+        for pod_name in sorted(bindings):
+            print("  " + pod_name.ljust(50) + bindings[pod_name])
+        if failed:
+            print("ERROR: Pods without a node: " + str(failed))
+        print("-" * 40)
+        for verb in sorted(self.timings):
+            milliseconds = np.array(self.timings[verb]) * 1000.0
+            print(verb.ljust(12) + str(len(milliseconds)).rjust(6) + " requests - median " +
+                  format(float(np.median(milliseconds)), '.3f') + " ms, max " +
+                  format(float(np.max(milliseconds)), '.3f') + " ms")
+        print("Largest difference of the score table from a rebuilt one: " + format(difference, '.6f'))
+        print("#" * 100)
+
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(description="Drive a local Scheduler_Extender like kube-scheduler and check "
+                                                 "its score table")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--snapshot", help="recorded cluster snapshot file")
+    source.add_argument("--mesh", nargs=2, type=int, default=[100, 10], metavar=("SERVICES", "HOSTS"),
+                        help="synthetic mesh of Mesh_Generator (default 100 services on 10 hosts)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic mesh and of the pods")
+    parser.add_argument("--pods", type=int, default=20, help="pods of the current placement to reschedule")
+    parser.add_argument("--affinity-metric", default="requests", choices=sorted(affinity_metrics))
+    parser.add_argument("--port", type=int, default=8888, help="port of the local extender")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    arguments = parse_arguments(argv)
+    if arguments.snapshot is not None:
+        collector = Cluster_Snapshot.replay(arguments.snapshot)
+    else:
+        collector = Mesh_Generator(arguments.mesh[0], arguments.mesh[1], arguments.seed).generate()
+    affinity_metric = affinity_metrics[arguments.affinity_metric]
+
+    # The binder records the bindings instead of calling the API server
+    bindings = {}
+
+    def binder(pod_name, namespace, uid, node):
+        bindings[pod_name] = node
+        return ""
+
+    extender = Scheduler_Extender.from_metrics(collector, affinity_metric, binder)
+    server = extender.serve("127.0.0.1", arguments.port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    mock = Extender_Mock("127.0.0.1", arguments.port)
+    try:
+        # Pods of the current placement are deleted and scheduled again one at a time
+        placement = dict((host, list(services)) for host, services in collector.current_placement.items())
+        pods = [(host, service) for host in sorted(placement) for service in placement[host]]
+        random_generator = np.random.default_rng(arguments.seed)
+        chosen = random_generator.choice(len(pods), min(arguments.pods, len(pods)), replace=False)
+        nodes = sorted(collector.host_list)
+        failed = []
+        for number, index in enumerate(sorted(int(index) for index in chosen)):
+            host, service = pods[index]
+            pod_name = service + "-mock" + str(number) + "-pod"
+            mock.delete(pod_name, host)
+            placement[host].remove(service)
+            node = mock.schedule(pod_name, service, nodes)
+            if node is None:
+                failed.append(pod_name)
+            else:
+                placement[node].append(service)
+        expected = Scheduler_Extender(Portfolio_Runner.affinities(collector, affinity_metric), placement,
+                                      collector.current_pod_request_cpu, collector.current_pod_request_ram,
+                                      collector.node_available_cpu, collector.node_available_ram)
+        table = mock.get("scores")["table"]
+        mock.print_report(bindings, failed, Extender_Mock.table_difference(table, expected.table))
+    finally:
+        mock.close()
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -5,15 +5,41 @@ import copy
 import json
 import pprint
 import re
+import time
 import requests
 import operator
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+from Instrumentation import Instrumentation
 
 
 class GCP_Metrics:
-    def __init__(self, vm_external_ip, kiali_port, prometheus_port, namespace):
+    def __init__(self, vm_external_ip, kiali_port, prometheus_port, namespace, max_concurrent_queries=8,
+                 grouped_usage_queries=False, node_shard_size=0):
         self.url_prometheus = "http://" + vm_external_ip + ":" + str(prometheus_port) + "/api/v1/query"
         self.url_kiali = "http://" + vm_external_ip + ":" + str(kiali_port) + "/kiali/api/namespaces/graph"
         self.namespace = namespace
+
+        # Connection pool shared by all queries - keep-alive connections are reused between requests
+        self.max_concurrent_queries = max_concurrent_queries
+        self.session = requests.Session()
+        self.session.headers.update({'cache-control': "no-cache"})
+        self.session.mount("http://", HTTPAdapter(pool_connections=2, pool_maxsize=max_concurrent_queries))
+
+        # Pod usage with one query per metric for the whole cluster instead of two queries per host
+        self.grouped_usage_queries = grouped_usage_queries
+        self.node_shard_size = node_shard_size  # Hosts per grouped query - 0 sends one query for all hosts
+
+        self.reset()
+
+    # Clear the collected data before collecting again - The connection pool and its keep-alive connections are kept
+    # Every attribute gets a new object so states taken before (Cluster_Snapshot.state) are left as they were
+    def reset(self):
+        self.prefetched_responses = {}  # Pattern: {(url, params): Future, ...}
+        self.query_timings = {}  # Pattern: {"query": seconds, ...}
+        self.collection_time = 0.0
+
         self.host_list = []
         self.service_list = []
         self.number_of_hosts = 0
@@ -61,16 +87,102 @@ class GCP_Metrics:
         self.initial_placement = {}
         self.current_placement = {}
 
+    # Functions to send the API requests through the connection pool
+    @staticmethod
+    def request_key(url, params):
+        return url, tuple(sorted(params.items()))
+
+    # Send one GET request and keep the time it took
+    def send_request(self, url, params):
+        start_time = time.time()
+        response = self.session.get(url, params=params)
+        result = json.loads(response.text)
+        label = params["query"] if "query" in params else "kiali graph"
+        self.query_timings[label] = time.time() - start_time
+        Instrumentation.count("http_requests")
+        Instrumentation.count("http_bytes_received", len(response.content))
+        return result
+
+    # Submit requests to the executor - their results are picked up later by query_api
+    def prefetch(self, executor, url, params_list):
+        for params in params_list:
+            self.prefetched_responses[self.request_key(url, params)] = executor.submit(self.send_request, url, params)
+
+    # Return the prefetched response if the request was submitted before - otherwise send it now
+    def query_api(self, url, params):
+        key = self.request_key(url, params)
+        if key in self.prefetched_responses:
+            return self.prefetched_responses.pop(key).result()
+        return self.send_request(url, params)
+
+    def query_prometheus(self, query):
+        return self.query_api(self.url_prometheus, {"query": query})
+
+    # Queries used by each collection function
+    @staticmethod
+    def node_request_queries():
+        return ["sum(kube_pod_container_resource_requests_cpu_cores) by (node)",
+                "sum(kube_pod_container_resource_requests_memory_bytes) by (node)",
+                "kube_node_status_allocatable{resource='cpu'}",
+                "kube_node_status_allocatable{resource='memory'}"]
+
+    def pod_request_queries(self):
+        return ["sum(kube_pod_container_resource_requests_cpu_cores{namespace='" + self.namespace + "'}) by (pod)",
+                "sum(kube_pod_container_resource_requests_memory_bytes{namespace='" + self.namespace + "'}) by (pod)"]
+
+    # Per host queries (or per shard of hosts in grouped mode) - the host list must be collected first
+    def pod_usage_queries(self):
+        if self.grouped_usage_queries:
+            shards = self.node_shards()
+            return [self.grouped_ram_query(shard) for shard in shards], [self.grouped_cpu_query(shard) for shard in shards]
+
+        ram_queries = []
+        cpu_queries = []
+        for host in self.host_list:
+            ram_queries.append("avg(container_memory_max_usage_bytes{instance='" + host + "', namespace='" +
+                               self.namespace + "', pod!~'billowing.*'}) by (pod)")
+            cpu_queries.append("avg(rate(container_cpu_usage_seconds_total{kubernetes_io_hostname='" + str(
+                host) + "',pod!~'billowing.*', namespace='" + self.namespace + "'}[30m])) by (pod)")
+        return ram_queries, cpu_queries
+
+    # Split the host list in shards of node_shard_size hosts
+    def node_shards(self):
+        if self.node_shard_size <= 0 or self.node_shard_size >= self.number_of_hosts:
+            return [self.host_list]
+        return [self.host_list[i:i + self.node_shard_size] for i in range(0, self.number_of_hosts, self.node_shard_size)]
+
+    # Label matcher for a shard of hosts - no matcher is needed when the shard contains all hosts
+    def host_matcher(self, label, hosts):
+        if len(hosts) >= self.number_of_hosts:
+            return ""
+        return label + "=~'" + "|".join(host.replace(".", "\\\\.") for host in hosts) + "', "
+
+    def grouped_ram_query(self, hosts):
+        return "avg(container_memory_max_usage_bytes{" + self.host_matcher("instance", hosts) + "namespace='" + \
+            self.namespace + "', pod!~'billowing.*'}) by (instance, pod)"
+
+    def grouped_cpu_query(self, hosts):
+        return "avg(rate(container_cpu_usage_seconds_total{" + self.host_matcher("kubernetes_io_hostname", hosts) + \
+            "pod!~'billowing.*', namespace='" + self.namespace + "'}[30m])) by (kubernetes_io_hostname, pod)"
+
+    @staticmethod
+    def affinity_bytes_queries():
+        labels = "{response_code = '" + str(
+            200) + "', connection_security_policy = 'mutual_tls', source_app != 'unknown',  destination_app != 'unknown'}"
+        return ["istio_request_bytes_sum" + labels, "istio_response_bytes_sum" + labels,
+                "istio_request_bytes_count" + labels, "istio_response_bytes_count" + labels]
+
+    def kiali_graph_params(self):
+        # Graph type must be Wokload and Duration is set as required
+        return {"duration": "30m", "namespaces": self.namespace, "graphType": "workload"}
+
     # Functions to collect Kubernetes Cluster Metrics and save them to be processed
     # Collect Requests from Nodes
+    @Instrumentation.timed
     def kube_node_requests(self):
-        # Headers of cURL command
-        headers_prometheus = {'cache-control': "no-cache"}
+        cpu_query, ram_query, cpu_allocatable_query, ram_allocatable_query = self.node_request_queries()
         # CPU request
-        app_request = {"query": "sum(kube_pod_container_resource_requests_cpu_cores) by (node)"}
-        # cURL command for Node Ram Usage
-        response = requests.request("GET", self.url_prometheus, headers=headers_prometheus, params=app_request)
-        result = json.loads(response.text)
+        result = self.query_prometheus(cpu_query)
         for x in result['data']['result']:
             if bool(x['metric']):
                 self.host_list.append(x['metric']['node'])
@@ -80,28 +192,19 @@ class GCP_Metrics:
         self.max_cpu_allocation = format(float(max(self.node_request_cpu.values())), '.3f')
 
         # RAM Requests
-        app_request = {"query": "sum(kube_pod_container_resource_requests_memory_bytes) by (node)"}
-        # cURL command for Node Ram Usage
-        response = requests.request("GET", self.url_prometheus, headers=headers_prometheus, params=app_request)
-        result = json.loads(response.text)
+        result = self.query_prometheus(ram_query)
         for node in result['data']['result']:
             if bool(node['metric']):
                 self.node_request_ram[node['metric']['node']] = format(float(node['value'][1]), '.3f')
         self.max_ram_allocation = format(float(max(self.node_request_ram.values())), '.3f')
 
         # CPU allocation
-        app_request = {"query": "kube_node_status_allocatable{resource='cpu'}"}
-        # cURL command for Node Ram Usage
-        response = requests.request("GET", self.url_prometheus, headers=headers_prometheus, params=app_request)
-        result = json.loads(response.text)
+        result = self.query_prometheus(cpu_allocatable_query)
         for node in result['data']['result']:
             self.node_allocatable_cpu[node['metric']['node']] = node['value'][1]
 
         # RAM allocation
-        app_request = {"query": "kube_node_status_allocatable{resource='memory'}"}
-        # cURL command for Node Ram Usage
-        response = requests.request("GET", self.url_prometheus, headers=headers_prometheus, params=app_request)
-        result = json.loads(response.text)
+        result = self.query_prometheus(ram_allocatable_query)
         for node in result['data']['result']:
             self.node_allocatable_ram[node['metric']['node']] = node['value'][1]
 
@@ -111,42 +214,35 @@ class GCP_Metrics:
             self.node_available_ram[host] = float(self.node_allocatable_ram[host]) - float(self.node_request_ram[host])
 
     # Collect Requests from Pods
+    @Instrumentation.timed
     def kube_pod_requests(self):
-        # Headers of cURL command
-        headers_prometheus = {'cache-control': "no-cache"}
+        cpu_query, ram_query = self.pod_request_queries()
         # CPU request
-        app_request = {
-            "query": "sum(kube_pod_container_resource_requests_cpu_cores{namespace='" + self.namespace + "'}) by (pod)"}
-        # cURL command for Node Ram Usage
-        response = requests.request("GET", self.url_prometheus, headers=headers_prometheus, params=app_request)
-        result = json.loads(response.text)
+        result = self.query_prometheus(cpu_query)
         for service in result['data']['result']:
             self.pod_request_cpu[service['metric']['pod']] = service['value'][1]
 
         # RAM Requests
-        app_request = {
-            "query": "sum(kube_pod_container_resource_requests_memory_bytes{namespace='" + self.namespace + "'}) by (pod)"}
-        # cURL command for Node Ram Usage
-        response = requests.request("GET", self.url_prometheus, headers=headers_prometheus, params=app_request)
-        result = json.loads(response.text)
+        result = self.query_prometheus(ram_query)
 
         for service in result['data']['result']:
             self.pod_request_ram[service['metric']['pod']] = service['value'][1]
 
     # Collect the pod average usage resources
+    @Instrumentation.timed
     def kube_pod_usage_resources(self):
-        # Headers of cURL command
-        headers_prometheus = {'cache-control': "no-cache"}
+        if self.grouped_usage_queries:
+            self.kube_grouped_pod_usage_resources()
+            return
+
+        ram_queries, cpu_queries = self.pod_usage_queries()
 
         # Ram Usage per Pod
         for i in range(self.number_of_hosts):
-            query_pod_ram = {"query": "avg(container_memory_max_usage_bytes{instance='" + self.host_list[
-                i] + "', namespace='" + self.namespace + "', pod!~'billowing.*'}) by (pod)"}
             self.pod_usage_ram[self.host_list[i]] = {}
 
-            # cURL command for Pod Ram Usage
-            response = requests.request("GET", self.url_prometheus, headers=headers_prometheus, params=query_pod_ram)
-            result = json.loads(response.text)
+            # Query for Pod Ram Usage
+            result = self.query_prometheus(ram_queries[i])
 
             number_of_pods = len(result["data"]["result"])
             for k in range(number_of_pods):
@@ -156,13 +252,10 @@ class GCP_Metrics:
 
         # CPU Usage per Pod
         for i in range(self.number_of_hosts):
-            query_pod_cpu = {"query": "avg(rate(container_cpu_usage_seconds_total{kubernetes_io_hostname='" + str(
-                self.host_list[i]) + "',pod!~'billowing.*', namespace='" + self.namespace + "'}[30m])) by (pod)"}
             self.pod_usage_cpu[self.host_list[i]] = {}
 
-            # cURL command for Pod Cpu Usage
-            response = requests.request("GET", self.url_prometheus, headers=headers_prometheus, params=query_pod_cpu)
-            result = json.loads(response.text)
+            # Query for Pod Cpu Usage
+            result = self.query_prometheus(cpu_queries[i])
 
             self.initial_placement[self.host_list[i]] = []
             serv_list = []
@@ -174,26 +267,60 @@ class GCP_Metrics:
                     float(result["data"]["result"][k]["value"][1]), '.4f')
             # Save the services with their app name
             for x in range(len(serv_list)):
-                split_string = re.split("-", serv_list[x])
-                if len(split_string) == 3:
-                    curr_service = split_string[0]
-                else:
-                    if split_string[1] == 'cart':
-                        curr_service = split_string[0] + '-' + split_string[1]
-                    else:
-                        curr_service = split_string[0]
-                self.service_list.append(curr_service)
+                self.service_list.append(self.service_name(serv_list[x]))
             serv_list.clear()
 
+    # Collect the pod usage with one query per metric grouped by (node, pod) for the whole cluster
+    # The hosts are split in shards when node_shard_size is set or when Prometheus rejects a response as too big
+    @Instrumentation.timed
+    def kube_grouped_pod_usage_resources(self):
+        ram_usage = {}
+        cpu_usage = {}
+        for host in self.host_list:
+            ram_usage[host] = []
+            cpu_usage[host] = []
+
+        ram_queries, cpu_queries = self.pod_usage_queries()
+        for i, shard in enumerate(self.node_shards()):
+            for series in self.query_usage_shard(ram_queries[i], self.grouped_ram_query, shard):
+                if series["metric"]["instance"] in ram_usage:
+                    ram_usage[series["metric"]["instance"]].append(series)
+            for series in self.query_usage_shard(cpu_queries[i], self.grouped_cpu_query, shard):
+                if series["metric"]["kubernetes_io_hostname"] in cpu_usage:
+                    cpu_usage[series["metric"]["kubernetes_io_hostname"]].append(series)
+
+        # Ram Usage per Pod
+        for host in self.host_list:
+            self.pod_usage_ram[host] = {}
+            for series in ram_usage[host]:
+                self.pod_usage_ram[host][series["metric"]["pod"]] = format(float(series["value"][1]), '.2f')
+
+        # CPU Usage per Pod - Initial placement and service list follow the order of hosts
+        for host in self.host_list:
+            self.pod_usage_cpu[host] = {}
+            self.initial_placement[host] = []
+            for series in cpu_usage[host]:
+                pod = series["metric"]["pod"]
+                self.initial_placement[host].append(pod)
+                self.pod_usage_cpu[host][pod] = format(float(series["value"][1]), '.4f')
+            for pod in self.initial_placement[host]:
+                self.service_list.append(self.service_name(pod))
+
+    # Run a grouped query for a shard of hosts - split the shard in half while the response is rejected
+    def query_usage_shard(self, query, query_builder, shard):
+        result = self.query_prometheus(query)
+        if result["status"] == "success":
+            return result["data"]["result"]
+        if len(shard) == 1:
+            raise ValueError("Prometheus rejected the usage query of " + shard[0] + ": " + str(result.get("error")))
+        middle = len(shard) // 2
+        return self.query_usage_shard(query_builder(shard[:middle]), query_builder, shard[:middle]) + \
+            self.query_usage_shard(query_builder(shard[middle:]), query_builder, shard[middle:])
+
     # Collect the service affinities and response times from kiali
+    @Instrumentation.timed
     def kube_service_affinities(self):
-        headers_kiali = {'cache-control': "no-cache"}
-        query_string_kiali = {"duration": "30m", "namespaces": self.namespace,
-                              "graphType": "workload"}  # Graph type must be Wokload and Duration is set as required
-
-        # cURL command
-        response = requests.request("GET", self.url_kiali, headers=headers_kiali, params=query_string_kiali)
-        result = json.loads(response.text)
+        result = self.query_api(self.url_kiali, self.kiali_graph_params())
 
         # INFO NOTE: redis-cart won't appear from kiali graph. There must be internal communication between cartservice and redis-cart so these two pods should be placed together and calculate as one
         # Graph Services ID
@@ -252,27 +379,15 @@ class GCP_Metrics:
         self.affinities_collection = dict(sorted(sorted_dict.items(), key=operator.itemgetter(1), reverse=True))
 
     # Collect total requested and responsed bytes for each service
+    @Instrumentation.timed
     def kube_total_affinity_bytes(self):
-        # Headers of cURL command
-        headers_prometheus = {'cache-control': "no-cache"}
-        request_query = {"query": "istio_request_bytes_sum{response_code = '" + str(
-            200) + "', connection_security_policy = 'mutual_tls', source_app != 'unknown',  destination_app != 'unknown'}"}
-        response_query = {"query": "istio_response_bytes_sum{response_code = '" + str(
-            200) + "', connection_security_policy = 'mutual_tls', source_app != 'unknown',  destination_app != 'unknown'}"}
-        req_count_query = {"query": "istio_request_bytes_count{response_code = '" + str(
-            200) + "', connection_security_policy = 'mutual_tls', source_app != 'unknown',  destination_app != 'unknown'}"}
-        resp_count_query = {"query": "istio_response_bytes_count{response_code = '" + str(
-            200) + "', connection_security_policy = 'mutual_tls', source_app != 'unknown',  destination_app != 'unknown'}"}
-
-        # cURL command for Request Metrics
-        response = requests.request("GET", self.url_prometheus, headers=headers_prometheus, params=request_query)
-        req_result = json.loads(response.text)
-        response = requests.request("GET", self.url_prometheus, headers=headers_prometheus, params=response_query)
-        resp_result = json.loads(response.text)
-        response = requests.request("GET", self.url_prometheus, headers=headers_prometheus, params=req_count_query)
-        req_count_result = json.loads(response.text)
-        response = requests.request("GET", self.url_prometheus, headers=headers_prometheus, params=resp_count_query)
-        resp_count_result = json.loads(response.text)
+        request_query, response_query, req_count_query, resp_count_query = self.affinity_bytes_queries()
+
+        # Queries for Request Metrics
+        req_result = self.query_prometheus(request_query)
+        resp_result = self.query_prometheus(response_query)
+        req_count_result = self.query_prometheus(req_count_query)
+        resp_count_result = self.query_prometheus(resp_count_query)
 
         total_queries = len(req_result['data']['result'])
         # Iterate throught Results
@@ -308,35 +423,27 @@ class GCP_Metrics:
                 self.affinities_bytes_collection = dict(
                     sorted(self.affinities_bytes_collection.items(), key=operator.itemgetter(1), reverse=True))
 
+    # Service name of a pod - Pattern: service_name-ID-SubID
+    @staticmethod
+    def service_name(pod):
+        split_string = re.split("-", pod)
+        if len(split_string) == 3:
+            return split_string[0]
+        if split_string[1] == 'cart':
+            return split_string[0] + '-' + split_string[1]
+        return split_string[0]
+
     # Adjust service names in Initial Placement
     def refactor_placement(self):
         for key in self.initial_placement:
             self.current_placement[key] = []
             for index, services in enumerate(self.initial_placement[key]):
-                # Pattern: service_name-ID-SubID
-                split_string = re.split("-", services)
-                if len(split_string) == 3:
-                    curr_service = split_string[0]
-                else:
-                    if split_string[1] == 'cart':
-                        curr_service = split_string[0] + '-' + split_string[1]
-                    else:
-                        curr_service = split_string[0]
-                self.current_placement[key].append(curr_service)
+                self.current_placement[key].append(self.service_name(services))
 
     # Adjust service name in Pod Requests Dictionaries
     def refactor_pod_requests(self):
         for services in self.pod_request_cpu.keys():
-            # Pattern: service_name-ID-SubID
-            split_string = re.split("-", services)
-            if len(split_string) == 3:
-                curr_service = split_string[0]
-            else:
-                if split_string[1] == 'cart':
-                    curr_service = split_string[0] + '-' + split_string[1]
-                else:
-                    curr_service = split_string[0]
-
+            curr_service = self.service_name(services)
             self.current_pod_request_cpu[curr_service] = format(float(self.pod_request_cpu[services]), '.3f')
             self.current_pod_request_ram[curr_service] = format(float(self.pod_request_ram[services]), '.3f')
 
@@ -363,12 +470,38 @@ class GCP_Metrics:
                 self.node_initial_ram_usage[host] = float(self.node_initial_ram_usage[host]) - total_requested_ram
 
     # Function to collect data and initiliaze class variables
+    # Independent queries are sent together through the pool - at most max_concurrent_queries run at once
+    @Instrumentation.timed
     def collect_resources(self):
-        self.kube_node_requests()
-        self.kube_pod_requests()
-        self.kube_pod_usage_resources()
-        self.kube_service_affinities()
-        self.kube_total_affinity_bytes()
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_queries) as executor:
+            self.prefetch(executor, self.url_prometheus, [{"query": query} for query in
+                                                          self.node_request_queries() + self.pod_request_queries() +
+                                                          self.affinity_bytes_queries()])
+            self.prefetch(executor, self.url_kiali, [self.kiali_graph_params()])
+            self.kube_node_requests()
+
+            # Per host usage queries need the host list
+            ram_queries, cpu_queries = self.pod_usage_queries()
+            self.prefetch(executor, self.url_prometheus, [{"query": query} for query in ram_queries + cpu_queries])
+            self.kube_pod_requests()
+            self.kube_pod_usage_resources()
+            self.kube_service_affinities()
+            self.kube_total_affinity_bytes()
+        self.collection_time = time.time() - start_time
+
         self.refactor_placement()
         self.refactor_pod_requests()
         self.calculate_node_metrics_without_pods()
+
+    # Print the time of each query and the total wall time of the collection
+    def print_collection_report(self):
+        print("")
+        print("#" * 100)
+        print("Metric collection time per query in seconds")
+        print("-" * 40)
+        for query, seconds in sorted(self.query_timings.items(), key=operator.itemgetter(1), reverse=True):
+            print(format(seconds, '.3f') + "  " + query)
+        print("-" * 40)
+        print("Total wall time of collection:  --- %s seconds ---" % self.collection_time)
+        print("#" * 100)
@@ -7,108 +7,143 @@
 ######################################################
 import copy
 
+from Instrumentation import Instrumentation
+from Placement_Problem import Placement_Problem
+
 
 class Heuristic_First_Fit:
-    def __init__(self, current_placement, pod_request_cpu, pod_request_ram, node_available_cpu, node_available_ram, service_affinities, host_list):
+    def __init__(self, current_placement, pod_request_cpu, pod_request_ram, node_available_cpu, node_available_ram, service_affinities, host_list,
+                 problem=None):
         self.final_placement = copy.deepcopy(current_placement)
-        self.moved_services = []  # List to store which services have been moved (source-destination services)
-        self.node_available_cpu = copy.deepcopy(node_available_cpu)
-        self.node_available_ram = copy.deepcopy(node_available_ram)
-        self.pod_request_cpu = copy.deepcopy(pod_request_cpu)
-        self.pod_request_ram = copy.deepcopy(pod_request_ram)
-        self.service_affinities = copy.deepcopy(service_affinities)
+        self.moved_services = set()  # Set to store which services have been moved (source-destination services)
         self.host_list = host_list
-
+        # Requests and available resources are read from the arrays of the problem - Built from the dictionaries
+        # if not given, affinities are then visited in the order of the given collection
+        if problem is None:
+            sources = []
+            dests = []
+            for key in service_affinities:
+                partition_key = key.partition('->')
+                sources.append(partition_key[0])
+                dests.append(partition_key[2])
+            problem = Placement_Problem(sources + dests, host_list, pod_request_cpu, pod_request_ram,
+                                        node_available_cpu, node_available_ram, {}, {}, {}, {}, {}, 0.0, 0.0,
+                                        current_placement)
+            self.affinity_sources = [problem.service_to_id[service] for service in sources]
+            self.affinity_dests = [problem.service_to_id[service] for service in dests]
+        else:
+            self.affinity_sources = problem.edge_source[problem.edge_order].tolist()
+            self.affinity_dests = problem.edge_dest[problem.edge_order].tolist()
+        self.problem = problem
+        self.node_available_cpu = problem.host_values(problem.node_available_cpu)
+        self.node_available_ram = problem.host_values(problem.node_available_ram)
+
+    # Build the algorithm from a Placement_Problem - Affinities are visited in decent order
+    @staticmethod
+    def from_problem(problem):
+        return Heuristic_First_Fit(problem.current_placement_dict(), None, None, None, None, None, problem.hosts,
+                                   problem)
+
+    # Service id -> {host id: number of pods} index of the final placement
+    def service_host_index(self):
+        service_hosts = {}
+        for host_id, host in enumerate(self.host_list):
+            for service in self.final_placement[host]:
+                service_id = self.problem.service_to_id[service]
+                if service_id not in service_hosts:
+                    service_hosts[service_id] = {}
+                service_hosts[service_id][host_id] = service_hosts[service_id].get(host_id, 0) + 1
+        return service_hosts
+
+    # Move one pod of a service between hosts and keep both indexes up to date
+    # With replicas the pod on the last host of host list represents the service
+    def move_pod(self, service_hosts, service_host, service, from_host, to_host):
+        self.final_placement[self.host_list[from_host]].remove(self.problem.services[service])
+        Instrumentation.count("pods_moved")
+        self.final_placement[self.host_list[to_host]].append(self.problem.services[service])
+        service_hosts[service][from_host] -= 1
+        if service_hosts[service][from_host] == 0:
+            service_hosts[service].pop(from_host)
+        service_hosts[service][to_host] = service_hosts[service].get(to_host, 0) + 1
+        service_host[service] = max(service_hosts[service])
+
+    # The loop runs on service and host ids - A service without a host has host -1 and never moves
+    @Instrumentation.timed
     def heuristic_placement(self):
-        for key in self.service_affinities:
-
-            # Partition dictionary
-            partition_key = key.partition('->')
-            source_service = partition_key[0]
-            dest_service = partition_key[2]
-
-            # Initialize variables
-            source_host = ""
-            dest_host = ""
-            dest_pod = ""
-            source_pod = ""
-            available_node_source_cpu = 0.0
-            available_node_source_ram = 0.0
-            available_node_dest_cpu = 0.0
-            available_node_dest_ram = 0.0
-            source_cpu = 0.0
-            source_ram = 0.0
-            dest_cpu = 0.0
-            dest_ram = 0.0
-
-            # Find resources
-            for host in self.host_list:
-                for service in self.final_placement[host]:
-
-                    # Gather Resources of Source Service
-                    if source_service == service:
-                        source_cpu = float(self.pod_request_cpu[service])
-                        source_ram = float(self.pod_request_ram[service])
-                        available_node_source_cpu = float(self.node_available_cpu[host])
-                        available_node_source_ram = float(self.node_available_ram[host])
-                        source_host = host
-                        source_pod = service
-
-                    # Gather Resources of Destination Service
-                    if dest_service == service:
-                        dest_cpu = float(self.pod_request_cpu[service])
-                        dest_ram = float(self.pod_request_ram[service])
-                        available_node_dest_cpu = float(self.node_available_cpu[host])
-                        available_node_dest_ram = float(self.node_available_ram[host])
-                        dest_host = host
-                        dest_pod = service
+        service_hosts = self.service_host_index()
+        service_host = [-1] * self.problem.number_of_services
+        for service in service_hosts:
+            service_host[service] = max(service_hosts[service])
+
+        # Resources as lists of floats indexed by id
+        request_cpu = self.problem.service_cpu.tolist()
+        request_ram = self.problem.service_ram.tolist()
+        available_cpu = self.problem.node_available_cpu.tolist()
+        available_ram = self.problem.node_available_ram.tolist()
+        moved = [False] * self.problem.number_of_services
+        for service in self.moved_services:
+            if service in self.problem.service_to_id:
+                moved[self.problem.service_to_id[service]] = True
+
+        Instrumentation.count("affinities_evaluated", len(self.affinity_sources))
+        for source_service, dest_service in zip(self.affinity_sources, self.affinity_dests):
+
+            # Find hosts
+            source_host = service_host[source_service]
+            dest_host = service_host[dest_service]
 
             # Check for same host
             if dest_host == source_host:
                 # Mark them as moved so that they cant move again
-                if dest_service not in self.moved_services:
-                    self.moved_services.append(dest_service)
-                if source_service not in self.moved_services:
-                    self.moved_services.append(source_service)
+                moved[dest_service] = True
+                moved[source_service] = True
                 continue  # Proceed to next iteration
-            else:
-                moved_Flag = False
-                # Check if destination service has already moved
-                if dest_service not in self.moved_services:
-                    if (dest_cpu < available_node_source_cpu) and (dest_ram < available_node_source_ram):
-                        # CPU resources update
-                        self.node_available_cpu[source_host] = float(self.node_available_cpu[source_host]) - dest_cpu
-                        self.node_available_cpu[dest_host] = float(self.node_available_cpu[dest_host]) + dest_cpu
-
-                        # RAM resources update
-                        self.node_available_ram[source_host] = float(self.node_available_ram[source_host]) - dest_ram
-                        self.node_available_ram[dest_host] = float(self.node_available_ram[dest_host]) + dest_ram
-
-                        # Host services transfer and update
-                        self.final_placement[dest_host].remove(dest_pod)
-                        self.final_placement[source_host].append(dest_pod)
-                        moved_Flag = True
-
-                # Check if source service has already moved
-                elif source_service not in self.moved_services:
-                    if (source_cpu < available_node_dest_cpu) and (source_ram < available_node_dest_ram):
-                        self.node_available_cpu[source_host] = float(self.node_available_cpu[source_host]) + source_cpu
-                        self.node_available_cpu[dest_host] = float(self.node_available_cpu[dest_host]) - source_cpu
-
-                        # RAM resources update
-                        self.node_available_ram[source_host] = float(self.node_available_ram[source_host]) + source_ram
-                        self.node_available_ram[dest_host] = float(self.node_available_ram[dest_host]) - source_ram
-
-                        # Host services transfer and update
-                        self.final_placement[source_host].remove(source_pod)
-                        self.final_placement[dest_host].append(source_pod)
-                        moved_Flag = True
-
-            # If services "moved" then append them to list and continue
-            if moved_Flag:
-                if dest_service not in self.moved_services:
-                    self.moved_services.append(dest_service)
-
-                if source_service not in self.moved_services:
-                    self.moved_services.append(source_service)
 
+            # Both services have already moved - Nothing to do
+            if moved[dest_service] and moved[source_service]:
+                continue
+
+            moved_Flag = False
+            # Check if destination service has already moved
+            if not moved[dest_service]:
+                if source_host >= 0 and dest_host >= 0 and request_cpu[dest_service] < available_cpu[source_host] \
+                        and request_ram[dest_service] < available_ram[source_host]:
+                    # CPU resources update
+                    available_cpu[source_host] = available_cpu[source_host] - request_cpu[dest_service]
+                    available_cpu[dest_host] = available_cpu[dest_host] + request_cpu[dest_service]
+
+                    # RAM resources update
+                    available_ram[source_host] = available_ram[source_host] - request_ram[dest_service]
+                    available_ram[dest_host] = available_ram[dest_host] + request_ram[dest_service]
+
+                    # Host services transfer and update
+                    self.move_pod(service_hosts, service_host, dest_service, dest_host, source_host)
+                    moved_Flag = True
+
+            # Check if source service has already moved
+            elif not moved[source_service]:
+                if source_host >= 0 and dest_host >= 0 and request_cpu[source_service] < available_cpu[dest_host] \
+                        and request_ram[source_service] < available_ram[dest_host]:
+                    available_cpu[source_host] = available_cpu[source_host] + request_cpu[source_service]
+                    available_cpu[dest_host] = available_cpu[dest_host] - request_cpu[source_service]
+
+                    # RAM resources update
+                    available_ram[source_host] = available_ram[source_host] + request_ram[source_service]
+                    available_ram[dest_host] = available_ram[dest_host] - request_ram[source_service]
+
+                    # Host services transfer and update
+                    self.move_pod(service_hosts, service_host, source_service, source_host, dest_host)
+                    moved_Flag = True
+
+            # If services "moved" then append them to set and continue
+            if moved_Flag:
+                moved[dest_service] = True
+                moved[source_service] = True
+
+        # Results back to the name keyed dictionaries
+        for service_id, service in enumerate(self.problem.services):
+            if moved[service_id]:
+                self.moved_services.add(service)
+        for host_id, host in enumerate(self.host_list):
+            self.node_available_cpu[host] = available_cpu[host_id]
+            self.node_available_ram[host] = available_ram[host_id]
@@ -0,0 +1,243 @@
+######################################################
+# Incremental re-placement driven by the changes between two collections
+# Only the services whose affinities, requests or hosts changed and their neighbours are re-optimized with the
+# Heuristic First Fit rules, every other service is frozen on its previous host
+# Input: Previous placement, Affinities and Resource demands of the previous and the current collection,
+# VM resources without the application pods
+# Output: A new placement solution that keeps unaffected services in place
+######################################################
+import copy
+
+from Heuristic_First_Fit import Heuristic_First_Fit
+from Portfolio_Runner import Portfolio_Runner
+
+
+class Incremental_Placement:
+    def __init__(self, previous_placement, current_placement, previous_affinities, service_affinities,
+                 previous_pod_request_cpu, previous_pod_request_ram, pod_request_cpu, pod_request_ram,
+                 node_initial_available_cpu, node_initial_available_ram, host_list, affinity_tolerance=0.0):
+        self.previous_placement = previous_placement  # Plan of the previous cycle (or the placement running then)
+        self.current_placement = current_placement  # Placement running on the cluster now
+        self.previous_affinities = previous_affinities
+        self.service_affinities = service_affinities
+        self.previous_pod_request_cpu = previous_pod_request_cpu
+        self.previous_pod_request_ram = previous_pod_request_ram
+        self.pod_request_cpu = pod_request_cpu
+        self.pod_request_ram = pod_request_ram
+        self.node_initial_available_cpu = node_initial_available_cpu
+        self.node_initial_available_ram = node_initial_available_ram
+        self.host_list = host_list
+        self.affinity_tolerance = affinity_tolerance  # Relative change of an affinity that is ignored
+        self.changed_affinities = {}
+        self.changed_services = set()
+        self.affected_services = set()
+        self.unplaced_services = []
+        self.adjacency = {}  # Pattern: {"service": {"neighbour": affinity of both directions}}
+        self.final_placement = {}
+        self.migrations = 0
+
+    # Build the incremental placement from two GCP_Metrics collections
+    # The previous placement is the plan computed in the previous cycle, without one it defaults to the placement that
+    # was running during the previous collection
+    @staticmethod
+    def from_collections(previous_collector, collector, previous_placement=None, affinity_metric="service_affinities",
+                         affinity_tolerance=0.0):
+        if previous_placement is None:
+            previous_placement = previous_collector.current_placement
+        return Incremental_Placement(previous_placement, collector.current_placement,
+                                     Portfolio_Runner.affinities(previous_collector, affinity_metric),
+                                     Portfolio_Runner.affinities(collector, affinity_metric),
+                                     previous_collector.current_pod_request_cpu,
+                                     previous_collector.current_pod_request_ram,
+                                     collector.current_pod_request_cpu, collector.current_pod_request_ram,
+                                     collector.node_initial_available_cpu, collector.node_initial_available_ram,
+                                     collector.host_list, affinity_tolerance)
+
+    # Pattern: {"source->dest": (previous value, current value), ...} - Added and removed affinities have 0.0
+    @staticmethod
+    def affinity_diff(previous_affinities, service_affinities, tolerance=0.0):
+        changed = {}
+        for source in service_affinities:
+            for dest in service_affinities[source]:
+                current = float(service_affinities[source][dest])
+                previous = 0.0
+                if source in previous_affinities and dest in previous_affinities[source]:
+                    previous = float(previous_affinities[source][dest])
+                if abs(current - previous) > tolerance * abs(previous):
+                    changed[source + "->" + dest] = (previous, current)
+        for source in previous_affinities:
+            for dest in previous_affinities[source]:
+                if source not in service_affinities or dest not in service_affinities[source]:
+                    previous = float(previous_affinities[source][dest])
+                    if previous != 0.0:
+                        changed[source + "->" + dest] = (previous, 0.0)
+        return changed
+
+    # Services whose requests changed or that exist in only one of the collections
+    @staticmethod
+    def resource_diff(previous_pod_request_cpu, previous_pod_request_ram, pod_request_cpu, pod_request_ram):
+        changed = set()
+        for service in pod_request_cpu:
+            if service not in previous_pod_request_cpu or \
+                    float(previous_pod_request_cpu[service]) != float(pod_request_cpu[service]) or \
+                    float(previous_pod_request_ram[service]) != float(pod_request_ram[service]):
+                changed.add(service)
+        for service in previous_pod_request_cpu:
+            if service not in pod_request_cpu:
+                changed.add(service)
+        return changed
+
+    # Pattern: {"service": [hosts of its pods in host list order]}
+    @staticmethod
+    def service_hosts(placement):
+        hosts = {}
+        for host in placement:
+            for service in placement[host]:
+                if service not in hosts:
+                    hosts[service] = []
+                hosts[service].append(host)
+        for service in hosts:
+            hosts[service].sort()
+        return hosts
+
+    # Adjacency index of the current affinity graph - Built once per re-placement
+    @staticmethod
+    def affinity_adjacency(service_affinities):
+        adjacency = {}
+        for source in service_affinities:
+            for dest in service_affinities[source]:
+                affinity = float(service_affinities[source][dest])
+                for service, neighbour in ((source, dest), (dest, source)):
+                    if service not in adjacency:
+                        adjacency[service] = {}
+                    adjacency[service][neighbour] = adjacency[service].get(neighbour, 0.0) + affinity
+        return adjacency
+
+    # Neighbours of the given services in the current affinity graph (both directions)
+    def neighbours(self, services):
+        found = set()
+        for service in services:
+            found.update(self.adjacency.get(service, {}))
+        return found
+
+    # Host for a service without one - The host with most affinity to the service, then most available cpu
+    # service_host holds the host of every placed service (the last pod of a service with replicas)
+    def first_fit_host(self, service, service_host, available_cpu, available_ram):
+        host_affinity = {}
+        for host in self.host_list:
+            host_affinity[host] = 0.0
+        for neighbour, affinity in self.adjacency.get(service, {}).items():
+            if neighbour in service_host:
+                host_affinity[service_host[neighbour]] += affinity
+
+        cpu = float(self.pod_request_cpu[service])
+        ram = float(self.pod_request_ram[service])
+        for host in sorted(self.host_list, key=lambda x: (-host_affinity[x], -available_cpu[x])):
+            if cpu < available_cpu[host] and ram < available_ram[host]:
+                return host
+        return None
+
+    def incremental_placement(self):
+        self.adjacency = self.affinity_adjacency(self.service_affinities)
+        self.changed_affinities = self.affinity_diff(self.previous_affinities, self.service_affinities,
+                                                     self.affinity_tolerance)
+        self.changed_services = self.resource_diff(self.previous_pod_request_cpu, self.previous_pod_request_ram,
+                                                   self.pod_request_cpu, self.pod_request_ram)
+        for key in self.changed_affinities:
+            source, _, dest = key.partition("->")
+            self.changed_services.add(source)
+            self.changed_services.add(dest)
+
+        # Services moved by the cluster since the previous cycle
+        previous_hosts = self.service_hosts(self.previous_placement)
+        current_hosts = self.service_hosts(self.current_placement)
+        for service in set(previous_hosts) | set(current_hosts):
+            if previous_hosts.get(service) != current_hosts.get(service):
+                self.changed_services.add(service)
+
+        # Start from the previous placement - Services that no longer exist or sit on removed hosts are taken out
+        placement = {}
+        displaced = []
+        for host in self.host_list:
+            placement[host] = []
+        for host in self.previous_placement:
+            for service in self.previous_placement[host]:
+                if service not in self.pod_request_cpu:
+                    continue
+                if host in placement:
+                    placement[host].append(service)
+                else:
+                    displaced.append(service)
+        for service in current_hosts:
+            if service in self.pod_request_cpu and service not in previous_hosts:
+                displaced.extend([service] * len(current_hosts[service]))
+
+        # Resources left on each host by the placement
+        available_cpu = {}
+        available_ram = {}
+        for host in self.host_list:
+            available_cpu[host] = float(self.node_initial_available_cpu[host])
+            available_ram[host] = float(self.node_initial_available_ram[host])
+            for service in placement[host]:
+                available_cpu[host] -= float(self.pod_request_cpu[service])
+                available_ram[host] -= float(self.pod_request_ram[service])
+
+            # Requests grew beyond the host - The last pods placed are displaced
+            while placement[host] and (available_cpu[host] < 0.0 or available_ram[host] < 0.0):
+                service = placement[host].pop()
+                available_cpu[host] += float(self.pod_request_cpu[service])
+                available_ram[host] += float(self.pod_request_ram[service])
+                displaced.append(service)
+
+        # Displaced and new services go next to their heaviest neighbours
+        self.unplaced_services = []
+        service_host = {}
+        for host in placement:
+            for service in placement[host]:
+                service_host[service] = host
+        for service in displaced:
+            self.changed_services.add(service)
+            host = self.first_fit_host(service, service_host, available_cpu, available_ram)
+            if host is None:
+                self.unplaced_services.append(service)
+                continue
+            placement[host].append(service)
+            service_host[service] = host
+            available_cpu[host] -= float(self.pod_request_cpu[service])
+            available_ram[host] -= float(self.pod_request_ram[service])
+
+        # Changed services and their neighbours are re-optimized - All the others are frozen as already moved
+        # Edges of services without any host are left out of Heuristic First Fit
+        self.affected_services = set(self.changed_services) | self.neighbours(self.changed_services)
+        homeless = set(self.unplaced_services) - set(service_host)
+        affinities = {}
+        for source in self.service_affinities:
+            if source in homeless:
+                continue
+            for dest in self.service_affinities[source]:
+                if dest in homeless:
+                    continue
+                if source in self.affected_services or dest in self.affected_services:
+                    affinities[source + "->" + dest] = float(self.service_affinities[source][dest])
+        affinities_collection = dict(sorted(affinities.items(), key=lambda x: x[1], reverse=True))
+
+        heuristic_first_fit = Heuristic_First_Fit(placement, self.pod_request_cpu, self.pod_request_ram, available_cpu,
+                                                  available_ram, affinities_collection, self.host_list)
+        for host in placement:
+            for service in placement[host]:
+                if service not in self.affected_services:
+                    heuristic_first_fit.moved_services.add(service)
+        heuristic_first_fit.heuristic_placement()
+        self.final_placement = copy.deepcopy(heuristic_first_fit.final_placement)
+
+        # Pods that are not on a host they had in the previous placement
+        self.migrations = 0
+        final_hosts = self.service_hosts(self.final_placement)
+        for service in final_hosts:
+            remaining = list(previous_hosts.get(service, []))
+            for host in final_hosts[service]:
+                if host in remaining:
+                    remaining.remove(host)
+                else:
+                    self.migrations += 1
+        return self.final_placement
@@ -0,0 +1,183 @@
+######################################################
+# Timing spans and counters of the phases of the placement
+# Spans nest by the call stack of each thread (collection -> queries, alpha search -> partition -> packing), counters
+# track work such as HTTP calls, bytes received, contraction trials, alpha solves and hosts evaluated
+# When disabled a span is a single flag check and a counter update returns at once
+# Spans and counters of pool workers stay in the workers and are not collected
+# Input: Instrumented functions and counter updates
+# Output: Span tree and counters as JSON or as Prometheus text exposition
+######################################################
+import functools
+import json
+import re
+import threading
+import time
+
+
+class Span:
+    def __init__(self, name):
+        self.name = name
+        self.path = None
+        self.start_time = 0.0
+
+    def __enter__(self):
+        stack = Instrumentation.stack()
+        self.path = stack[-1].path + "/" + self.name if stack else self.name
+        stack.append(self)
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self.start_time
+        Instrumentation.stack().pop()
+        Instrumentation.record(self.path, self.start_time - Instrumentation.start_time, seconds)
+        return False
+
+
+# Shared span of disabled instrumentation - Enters and exits without doing anything
+class Null_Span:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class Instrumentation:
+    enabled = False
+    max_spans = 10000  # Spans kept one by one - Totals per path are always kept
+    prefix = "service_placement"  # Prefix of the Prometheus metric names
+
+    start_time = time.perf_counter()
+    spans = []  # Pattern: [{"path": "outer/inner", "start": seconds, "seconds": seconds, "thread": name}]
+    span_totals = {}  # Pattern: {"outer/inner": {"count": n, "seconds": total, "max_seconds": max}}
+    counters = {}  # Pattern: {"name": value}
+    lock = threading.Lock()
+    local = threading.local()
+    null_span = Null_Span()
+
+    @staticmethod
+    def enable():
+        Instrumentation.enabled = True
+
+    @staticmethod
+    def disable():
+        Instrumentation.enabled = False
+
+    @staticmethod
+    def reset():
+        with Instrumentation.lock:
+            Instrumentation.start_time = time.perf_counter()
+            Instrumentation.spans = []
+            Instrumentation.span_totals = {}
+            Instrumentation.counters = {}
+
+    # Open spans of the current thread
+    @staticmethod
+    def stack():
+        if not hasattr(Instrumentation.local, "spans"):
+            Instrumentation.local.spans = []
+        return Instrumentation.local.spans
+
+    # Use: with Instrumentation.span("name"): ...
+    @staticmethod
+    def span(name):
+        if not Instrumentation.enabled:
+            return Instrumentation.null_span
+        return Span(name)
+
+    # Decorator - The span of a function is named after its class and name
+    @staticmethod
+    def timed(function):
+        name = function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not Instrumentation.enabled:
+                return function(*args, **kwargs)
+            with Span(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    @staticmethod
+    def count(name, value=1):
+        if not Instrumentation.enabled:
+            return
+        with Instrumentation.lock:
+            Instrumentation.counters[name] = Instrumentation.counters.get(name, 0) + value
+
+    @staticmethod
+    def record(path, start, seconds):
+        with Instrumentation.lock:
+            if len(Instrumentation.spans) < Instrumentation.max_spans:
+                Instrumentation.spans.append({"path": path, "start": start, "seconds": seconds,
+                                              "thread": threading.current_thread().name})
+            if path not in Instrumentation.span_totals:
+                Instrumentation.span_totals[path] = {"count": 0, "seconds": 0.0, "max_seconds": 0.0}
+            totals = Instrumentation.span_totals[path]
+            totals["count"] += 1
+            totals["seconds"] += seconds
+            totals["max_seconds"] = max(totals["max_seconds"], seconds)
+
+    @staticmethod
+    def to_dict():
+        with Instrumentation.lock:
+            return {"spans": list(Instrumentation.spans),
+                    "span_totals": dict((path, dict(totals)) for path, totals in Instrumentation.span_totals.items()),
+                    "counters": dict(Instrumentation.counters)}
+
+    @staticmethod
+    def export_json(path):
+        with open(path, "w") as json_file:
+            json.dump(Instrumentation.to_dict(), json_file, indent=2)
+
+    @staticmethod
+    def metric_name(name):
+        return Instrumentation.prefix + "_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+    @staticmethod
+    def label_value(value):
+        return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+    # Prometheus text exposition format
+    @staticmethod
+    def prometheus_text():
+        state = Instrumentation.to_dict()
+        lines = []
+        for metric, field, help_text in (("span_seconds_total", "seconds", "Seconds spent in a phase"),
+                                         ("span_calls_total", "count", "Times a phase ran"),
+                                         ("span_max_seconds", "max_seconds", "Longest run of a phase")):
+            name = Instrumentation.metric_name(metric)
+            lines.append("# HELP " + name + " " + help_text)
+            lines.append("# TYPE " + name + (" gauge" if metric == "span_max_seconds" else " counter"))
+            for path in sorted(state["span_totals"]):
+                lines.append(name + "{span=\"" + Instrumentation.label_value(path) + "\"} " +
+                             repr(float(state["span_totals"][path][field])))
+        for counter in sorted(state["counters"]):
+            name = Instrumentation.metric_name(counter + "_total")
+            lines.append("# TYPE " + name + " counter")
+            lines.append(name + " " + repr(float(state["counters"][counter])))
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def export_prometheus(path):
+        with open(path, "w") as prometheus_file:
+            prometheus_file.write(Instrumentation.prometheus_text())
+
+    # Span totals indented by depth and the counters
+    @staticmethod
+    def print_report():
+        state = Instrumentation.to_dict()
+        print("#" * 100)
+        print("Instrumentation - Spans (calls, total seconds, max seconds)")
+        print("-" * 40)
+        for path in sorted(state["span_totals"]):
+            totals = state["span_totals"][path]
+            depth = path.count("/")
+            print(("  " * depth + path.rsplit("/", 1)[-1]).ljust(60) + str(totals["count"]).ljust(10) +
+                  format(totals["seconds"], '.4f').ljust(14) + format(totals["max_seconds"], '.4f'))
+        print("-" * 40)
+        for counter in sorted(state["counters"]):
+            print(counter.ljust(60) + str(state["counters"][counter]))
+        print("#" * 100)
@@ -0,0 +1,164 @@
+######################################################
+# Karger-Stein recursive contraction for the minimum weighted k-cut of a part of the application
+# Edges are contracted with a union-find over arrays of weighted edges instead of copying the graph
+# Input: Services of the part, Service Affinities (or the edges of the part from Placement_Problem), K value
+# Output: Partition in the app_partition format of contract_graph and the weight of the cut
+# Paper: A New Approach to the Minimum Cut Problem, Karger and Stein
+######################################################
+import math
+
+import numpy as np
+
+
+class Karger_Stein:
+    def __init__(self, services, service_affinities, random_generator=None, edges=None):
+        self.services = []
+        self.service_to_id = {}
+        for service in services:
+            if service not in self.service_to_id:
+                self.service_to_id[service] = len(self.services)
+                self.services.append(service)
+        self.number_of_services = len(self.services)
+        self.random = random_generator if random_generator is not None else np.random.default_rng()
+
+        # Edges (u, v, weight) given with the ids of the services are used as they are
+        if edges is not None:
+            self.edge_u, self.edge_v, self.edge_w = edges
+            return
+
+        # Undirected weighted edges between services of the part - Both directions are summed
+        edge_weights = {}
+        for source in service_affinities:
+            if source not in self.service_to_id:
+                continue
+            for dest in service_affinities[source]:
+                if dest not in self.service_to_id or dest == source:
+                    continue
+                u, v = self.service_to_id[source], self.service_to_id[dest]
+                key = (min(u, v), max(u, v))
+                edge_weights[key] = edge_weights.get(key, 0.0) + float(service_affinities[source][dest])
+        self.edge_u = np.array([key[0] for key in edge_weights], dtype=np.int64)
+        self.edge_v = np.array([key[1] for key in edge_weights], dtype=np.int64)
+        self.edge_w = np.array(list(edge_weights.values()), dtype=float)
+
+    # Number of trials giving a high probability to find the minimum cut
+    @staticmethod
+    def recommended_trials(number_of_services):
+        return max(1, math.ceil(math.log(max(number_of_services, 2)) ** 2))
+
+    @staticmethod
+    def find(parent, x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    # Contract random edges until target super vertices remain - Edges are picked with probability
+    # proportional to their weight (exponential race) and zero weight edges only after all the others
+    def contract(self, number_of_vertices, edge_u, edge_v, edge_w, target):
+        parent = list(range(number_of_vertices))
+        components = number_of_vertices
+        keys = np.full(edge_w.size, np.inf)
+        positive = edge_w > 0.0
+        keys[positive] = self.random.exponential(size=int(positive.sum())) / edge_w[positive]
+        order = np.lexsort((self.random.random(edge_w.size), keys))
+
+        for edge in order:
+            if components <= target:
+                break
+            root_u = self.find(parent, int(edge_u[edge]))
+            root_v = self.find(parent, int(edge_v[edge]))
+            if root_u != root_v:
+                parent[root_v] = root_u
+                components -= 1
+
+        # Disconnected graph - Merge random super vertices since their cut costs nothing
+        if components > target:
+            roots = [x for x in range(number_of_vertices) if self.find(parent, x) == x]
+            self.random.shuffle(roots)
+            while components > target:
+                root = roots.pop()
+                parent[root] = roots[self.random.integers(len(roots))]
+                components -= 1
+
+        # Relabel super vertices as 0..components-1
+        labels = np.empty(number_of_vertices, dtype=np.int64)
+        roots = {}
+        for x in range(number_of_vertices):
+            root = self.find(parent, x)
+            if root not in roots:
+                roots[root] = len(roots)
+            labels[x] = roots[root]
+        return labels, components
+
+    # Edges of the contracted graph - Self loops are dropped and parallel edges are summed
+    @staticmethod
+    def contracted_edges(labels, number_of_vertices, edge_u, edge_v, edge_w):
+        u = labels[edge_u]
+        v = labels[edge_v]
+        keep = u != v
+        low = np.minimum(u[keep], v[keep])
+        high = np.maximum(u[keep], v[keep])
+        keys, inverse = np.unique(low * number_of_vertices + high, return_inverse=True)
+        weights = np.bincount(inverse, weights=edge_w[keep], minlength=keys.size)
+        return keys // number_of_vertices, keys % number_of_vertices, weights
+
+    @staticmethod
+    def cut_weight(labels, edge_u, edge_v, edge_w):
+        return float(edge_w[labels[edge_u] != labels[edge_v]].sum())
+
+    # Recursive scheme - Contract to n/sqrt(2) vertices twice independently and keep the best cut
+    def recursive_cut(self, number_of_vertices, edge_u, edge_v, edge_w, parts):
+        if number_of_vertices <= max(6, parts + 1):
+            best_labels = None
+            best_cut = 0.0
+            for _ in range(max(1, number_of_vertices)):
+                labels, _ = self.contract(number_of_vertices, edge_u, edge_v, edge_w, parts)
+                cut = self.cut_weight(labels, edge_u, edge_v, edge_w)
+                if best_labels is None or cut < best_cut:
+                    best_labels, best_cut = labels, cut
+            return best_labels, best_cut
+
+        target = min(number_of_vertices - 1, max(parts, math.ceil(1 + number_of_vertices / math.sqrt(2))))
+        best_labels = None
+        best_cut = 0.0
+        for _ in range(2):
+            labels, components = self.contract(number_of_vertices, edge_u, edge_v, edge_w, target)
+            u, v, w = self.contracted_edges(labels, components, edge_u, edge_v, edge_w)
+            sub_labels, _ = self.recursive_cut(components, u, v, w, parts)
+            labels = sub_labels[labels]
+            cut = self.cut_weight(labels, edge_u, edge_v, edge_w)
+            if best_labels is None or cut < best_cut:
+                best_labels, best_cut = labels, cut
+        return best_labels, best_cut
+
+    # One randomized trial - Super vertex label of every service and the cut weight
+    def trial(self, parts):
+        if self.number_of_services <= parts:
+            labels = np.arange(self.number_of_services)
+            return labels, self.cut_weight(labels, self.edge_u, self.edge_v, self.edge_w)
+        return self.recursive_cut(self.number_of_services, self.edge_u, self.edge_v, self.edge_w, parts)
+
+    # Pattern: {"service": [services contracted into it], ...} - The first service of each group is the key
+    def partition_from_labels(self, labels):
+        app_partition = {}
+        group_key = {}
+        for service, label in enumerate(labels):
+            if label not in group_key:
+                group_key[label] = self.services[service]
+                app_partition[self.services[service]] = []
+            else:
+                app_partition[group_key[label]].append(self.services[service])
+        return app_partition
+
+    # Best cut of several trials
+    def min_cut(self, parts, trials=None):
+        if trials is None:
+            trials = self.recommended_trials(self.number_of_services)
+        best_labels = None
+        best_cut = 0.0
+        for _ in range(trials):
+            labels, cut = self.trial(parts)
+            if best_labels is None or cut < best_cut:
+                best_labels, best_cut = labels, cut
+        return self.partition_from_labels(best_labels), best_cut
@@ -0,0 +1,121 @@
+######################################################
+# Latency-aware affinities of the application graph
+# Every edge is weighted by request rate x observed response time so that hot and slow call paths are co-located
+# first, and the latency saved when an edge goes from remote to node-local is predicted from the network delay
+# Network delay: the remote overhead (difference of the median response times of remote and node-local edges in
+# the current placement) plus the transfer of the mean message over the network bandwidth
+# Input: Service Affinities (requests per second), Response Times (ms), Current placement, Mean bytes per message
+# Output: Affinities and sorted affinities collection in the formats of GCP_Metrics, Predicted latency saving
+######################################################
+import operator
+
+import numpy as np
+
+
+class Latency_Objective:
+    default_remote_overhead = 1.0  # Milliseconds of a remote call when the placement has no local and remote edges
+    bandwidth = 125000.0  # Bytes per millisecond between hosts (1 Gbit/s)
+
+    def __init__(self, service_affinities, response_times, current_placement, message_bytes=None,
+                 remote_overhead=None):
+        self.rates = {}  # Pattern: {("source", "dest"): requests per second}
+        for source in service_affinities:
+            for dest in service_affinities[source]:
+                self.rates[(source, dest)] = float(service_affinities[source][dest])
+
+        # Observed response times - Edges without one get the median of the others
+        self.latencies = {}
+        for source in response_times:
+            for dest in response_times[source]:
+                try:
+                    latency = float(response_times[source][dest])
+                except (TypeError, ValueError):
+                    continue
+                if not np.isnan(latency):
+                    self.latencies[(source, dest)] = latency
+        self.default_latency = float(np.median(list(self.latencies.values()))) if self.latencies else 1.0
+
+        self.message_bytes = {}
+        if message_bytes is not None:
+            for source in message_bytes:
+                for dest in message_bytes[source]:
+                    self.message_bytes[(source, dest)] = float(message_bytes[source][dest])
+
+        self.service_host = self.service_hosts(current_placement)
+        self.remote_overhead = remote_overhead if remote_overhead is not None else self.estimate_remote_overhead()
+
+    # Build the objective from a collector - Messages are the mean bytes exchanged per request and response
+    @staticmethod
+    def from_metrics(collector, remote_overhead=None):
+        return Latency_Objective(collector.service_affinities, collector.response_times,
+                                 collector.current_placement, collector.total_affinities_bytes, remote_overhead)
+
+    # Host of every service - With replicas the last pod wins
+    @staticmethod
+    def service_hosts(placement):
+        service_host = {}
+        for host in placement:
+            for service in placement[host]:
+                service_host[service] = host
+        return service_host
+
+    def latency(self, source, dest):
+        return self.latencies.get((source, dest), self.default_latency)
+
+    # Median response time of remote edges minus the one of node-local edges in the current placement
+    def estimate_remote_overhead(self):
+        local = []
+        remote = []
+        for source, dest in self.latencies:
+            if source not in self.service_host or dest not in self.service_host:
+                continue
+            if self.service_host[source] == self.service_host[dest]:
+                local.append(self.latencies[(source, dest)])
+            else:
+                remote.append(self.latencies[(source, dest)])
+        if not local or not remote:
+            return Latency_Objective.default_remote_overhead
+        return max(0.0, float(np.median(remote) - np.median(local)))
+
+    # Milliseconds a request spends on the network when the edge is remote
+    def network_delay(self, source, dest):
+        return self.remote_overhead + self.message_bytes.get((source, dest), 0.0) / Latency_Objective.bandwidth
+
+    # Milliseconds saved per request when a remote edge becomes node-local - Never more than the observed latency
+    def predicted_saving(self, source, dest):
+        return min(self.latency(source, dest), self.network_delay(source, dest))
+
+    # Pattern: {"source": {"dest": rate x latency}} - Usable wherever service_affinities is
+    def latency_affinities(self):
+        affinities = {}
+        for source, dest in self.rates:
+            if source not in affinities:
+                affinities[source] = {}
+            affinities[source][dest] = format(self.rates[(source, dest)] * self.latency(source, dest), '.3f')
+        return affinities
+
+    # Pattern: {"source->dest": rate x latency} in decreasing order - Usable wherever affinities_collection is
+    def latency_collection(self):
+        collection = {}
+        for source, dest in self.rates:
+            collection[source + "->" + dest] = float(format(self.rates[(source, dest)] * self.latency(source, dest),
+                                                            '.3f'))
+        return dict(sorted(collection.items(), key=operator.itemgetter(1), reverse=True))
+
+    # Predicted change of the latency against the current placement
+    # Returns the request-milliseconds saved per second over all edges and the mean saving per request in ms
+    def predicted_latency_saving(self, placement):
+        service_host = self.service_hosts(placement)
+        saved = 0.0
+        for (source, dest), rate in self.rates.items():
+            if source not in service_host or dest not in service_host or \
+                    source not in self.service_host or dest not in self.service_host:
+                continue
+            was_remote = self.service_host[source] != self.service_host[dest]
+            is_remote = service_host[source] != service_host[dest]
+            if was_remote and not is_remote:
+                saved += rate * self.predicted_saving(source, dest)
+            elif is_remote and not was_remote:
+                saved -= rate * self.network_delay(source, dest)
+        total_rate = sum(self.rates.values())
+        return saved, saved / total_rate if total_rate > 0.0 else 0.0
@@ -0,0 +1,268 @@
+######################################################
+# Simulated annealing improver of a placement solution
+# Relocate and swap moves are scored in O(degree) from a service -> host index, the whole placement is never rescored
+# Input: Placement solution (Heuristic First Fit or Bin Packing), Resource demands, VM resources without the
+# application pods, Service Affinities, Time budget
+# Output: Best placement found, its cross-host traffic and the improvement curve
+######################################################
+import math
+import random
+import time
+
+from Instrumentation import Instrumentation
+
+
+class Local_Search:
+    move_samples = 100  # Random moves used to estimate the initial temperature
+    final_temperature_ratio = 1e-3  # Temperature at the end of the budget relative to the initial one
+    clock_interval = 256  # Moves between two readings of the clock
+
+    def __init__(self, placement, pod_request_cpu, pod_request_ram, node_initial_available_cpu,
+                 node_initial_available_ram, service_affinities, host_list, time_budget=1.0, seed=None):
+        self.host_list = list(host_list)
+        self.host_to_id = {}
+        for index, host in enumerate(self.host_list):
+            self.host_to_id[host] = index
+        self.time_budget = time_budget  # Seconds
+        self.random = random.Random(seed)
+
+        # Pods of the placement - Services with replicas keep their pods where they are
+        pods = {}
+        self.fixed_pods = []  # Pattern: [(host, service)]
+        for host in placement:
+            for service in placement[host]:
+                if service not in pods:
+                    pods[service] = []
+                pods[service].append(host)
+        self.services = []
+        self.service_to_id = {}
+        for service in pods:
+            self.service_to_id[service] = len(self.services)
+            self.services.append(service)
+        self.movable = []
+        self.service_host = [0] * len(self.services)
+        for service in pods:
+            hosts = sorted(pods[service], key=self.host_to_id.__getitem__)
+            # With replicas the pod on the last host of host list represents the service as in Heuristic First Fit
+            self.service_host[self.service_to_id[service]] = self.host_to_id[hosts[-1]]
+            if len(hosts) == 1:
+                self.movable.append(self.service_to_id[service])
+            else:
+                for host in hosts:
+                    self.fixed_pods.append((host, service))
+
+        # Resources left on every host by the placement
+        self.service_cpu = [float(pod_request_cpu[service]) for service in self.services]
+        self.service_ram = [float(pod_request_ram[service]) for service in self.services]
+        self.available_cpu = [float(node_initial_available_cpu[host]) for host in self.host_list]
+        self.available_ram = [float(node_initial_available_ram[host]) for host in self.host_list]
+        for host in placement:
+            for service in placement[host]:
+                self.available_cpu[self.host_to_id[host]] -= float(pod_request_cpu[service])
+                self.available_ram[self.host_to_id[host]] -= float(pod_request_ram[service])
+
+        # Undirected neighbours - Both directions of an affinity are summed
+        self.neighbours = [{} for _ in self.services]
+        for source in service_affinities:
+            if source not in self.service_to_id:
+                continue
+            for dest in service_affinities[source]:
+                if dest not in self.service_to_id or dest == source:
+                    continue
+                u, v = self.service_to_id[source], self.service_to_id[dest]
+                weight = float(service_affinities[source][dest])
+                self.neighbours[u][v] = self.neighbours[u].get(v, 0.0) + weight
+                self.neighbours[v][u] = self.neighbours[v].get(u, 0.0) + weight
+
+        # Services of every host for swap moves
+        self.host_services = [[] for _ in self.host_list]
+        self.position = [0] * len(self.services)
+        for service in self.movable:
+            host = self.service_host[service]
+            self.position[service] = len(self.host_services[host])
+            self.host_services[host].append(service)
+
+        self.initial_cost = self.cost()
+        self.best_cost = self.initial_cost
+        self.best_host = list(self.service_host)
+        self.best_placement = self.placement_dict(self.service_host)
+        self.curve = [(0.0, self.initial_cost)]  # Pattern: [(seconds, best cross-host traffic)]
+        self.moves_evaluated = 0
+        self.moves_accepted = 0
+
+    # Build the improver from a collector - Capacities are the resources of the VMs without the application pods
+    @staticmethod
+    def from_metrics(collector, placement, service_affinities=None, time_budget=1.0, seed=None):
+        if service_affinities is None:
+            service_affinities = collector.service_affinities
+        return Local_Search(placement, collector.current_pod_request_cpu, collector.current_pod_request_ram,
+                            collector.node_initial_available_cpu, collector.node_initial_available_ram,
+                            service_affinities, collector.host_list, time_budget, seed)
+
+    # Cross-host traffic of the whole placement - Only used once at the start
+    def cost(self):
+        total = 0.0
+        for service in range(len(self.services)):
+            for neighbour, weight in self.neighbours[service].items():
+                if service < neighbour and self.service_host[service] != self.service_host[neighbour]:
+                    total += weight
+        return total
+
+    # Change of the cross-host traffic when a service moves to another host - O(degree)
+    def relocate_delta(self, service, host):
+        current = self.service_host[service]
+        own = 0.0
+        other = 0.0
+        for neighbour, weight in self.neighbours[service].items():
+            neighbour_host = self.service_host[neighbour]
+            if neighbour_host == current:
+                own += weight
+            elif neighbour_host == host:
+                other += weight
+        return own - other
+
+    # Change of the cross-host traffic when two services on different hosts swap - O(degree)
+    def swap_delta(self, first, second):
+        first_host = self.service_host[first]
+        second_host = self.service_host[second]
+        return self.relocate_delta(first, second_host) + self.relocate_delta(second, first_host) + \
+            2.0 * self.neighbours[first].get(second, 0.0)
+
+    def relocate_fits(self, service, host):
+        return self.service_cpu[service] < self.available_cpu[host] and \
+            self.service_ram[service] < self.available_ram[host]
+
+    def swap_fits(self, first, second):
+        first_host = self.service_host[first]
+        second_host = self.service_host[second]
+        return self.service_cpu[second] < self.available_cpu[first_host] + self.service_cpu[first] and \
+            self.service_ram[second] < self.available_ram[first_host] + self.service_ram[first] and \
+            self.service_cpu[first] < self.available_cpu[second_host] + self.service_cpu[second] and \
+            self.service_ram[first] < self.available_ram[second_host] + self.service_ram[second]
+
+    def move(self, service, host):
+        current = self.service_host[service]
+        self.available_cpu[current] += self.service_cpu[service]
+        self.available_ram[current] += self.service_ram[service]
+        self.available_cpu[host] -= self.service_cpu[service]
+        self.available_ram[host] -= self.service_ram[service]
+
+        # Remove from the list of the current host in O(1) by moving the last service in its place
+        services = self.host_services[current]
+        last = services.pop()
+        if last != service:
+            services[self.position[service]] = last
+            self.position[last] = self.position[service]
+        self.position[service] = len(self.host_services[host])
+        self.host_services[host].append(service)
+        self.service_host[service] = host
+
+    # Random relocate or swap - Targets are mostly hosts of neighbours since other hosts rarely reduce the traffic
+    def random_move(self):
+        service = self.movable[self.random.randrange(len(self.movable))]
+        neighbours = self.neighbours[service]
+        if neighbours and self.random.random() < 0.8:
+            host = self.service_host[self.random.choice(list(neighbours))]
+        else:
+            host = self.random.randrange(len(self.host_list))
+        if host == self.service_host[service]:
+            return None
+        if self.random.random() < 0.5 or not self.host_services[host]:
+            if not self.relocate_fits(service, host):
+                return None
+            return service, host, None, self.relocate_delta(service, host)
+        other = self.host_services[host][self.random.randrange(len(self.host_services[host]))]
+        if not self.swap_fits(service, other):
+            return None
+        return service, host, other, self.swap_delta(service, other)
+
+    # Temperature at which half of the average uphill moves are accepted
+    def initial_temperature(self):
+        uphill = []
+        for _ in range(Local_Search.move_samples):
+            candidate = self.random_move()
+            if candidate is not None and candidate[3] > 0.0:
+                uphill.append(candidate[3])
+        if not uphill:
+            return 1.0
+        return (sum(uphill) / len(uphill)) / math.log(2.0)
+
+    @Instrumentation.timed
+    def simulated_annealing(self):
+        if not self.movable or len(self.host_list) < 2:
+            return self.best_placement
+        start_time = time.time()
+        initial_temperature = self.initial_temperature()
+        temperature = initial_temperature
+        current_cost = self.initial_cost
+        # Moves applied since the best placement as (service, previous host) - Without a snapshot (best_host None)
+        # the best placement is the current one with the journal undone, so an improvement costs O(1) instead of a
+        # copy of service_host
+        journal = []
+
+        while True:
+            # Geometric cooling over the time budget
+            if self.moves_evaluated % Local_Search.clock_interval == 0:
+                elapsed = time.time() - start_time
+                if elapsed >= self.time_budget:
+                    break
+                temperature = initial_temperature * Local_Search.final_temperature_ratio ** (elapsed / self.time_budget)
+            self.moves_evaluated += 1
+
+            candidate = self.random_move()
+            if candidate is None:
+                continue
+            service, host, other, delta = candidate
+            if delta > 0.0 and self.random.random() >= math.exp(-delta / temperature):
+                continue
+
+            # Apply the move - Journaled only while the best placement has no snapshot
+            if other is None:
+                if self.best_host is None:
+                    journal.append((service, self.service_host[service]))
+                self.move(service, host)
+            else:
+                first_host = self.service_host[service]
+                if self.best_host is None:
+                    journal.append((service, first_host))
+                    journal.append((other, self.service_host[other]))
+                self.move(service, host)
+                self.move(other, first_host)
+            self.moves_accepted += 1
+            current_cost += delta
+            if current_cost < self.best_cost - 1e-9:
+                self.best_cost = current_cost
+                self.best_host = None
+                journal = []
+                self.curve.append((time.time() - start_time, current_cost))
+            elif self.best_host is None and len(journal) > len(self.service_host):
+                # Long walk away from the best placement - Take the snapshot once so the journal stays bounded
+                self.best_host = self.undo(journal)
+                journal = []
+
+        if self.best_host is None:
+            self.best_host = self.undo(journal)
+        if self.best_cost < self.initial_cost:
+            self.best_placement = self.placement_dict(self.best_host)
+        return self.best_placement
+
+    # Host of every service before the moves of the journal
+    def undo(self, journal):
+        service_host = list(self.service_host)
+        for service, host in reversed(journal):
+            service_host[service] = host
+        return service_host
+
+    # Pattern: {"host": [services], ...} - Pods of services with replicas stay where they were
+    def placement_dict(self, service_host):
+        placement = {}
+        for host, service in self.fixed_pods:
+            if host not in placement:
+                placement[host] = []
+            placement[host].append(service)
+        for service in self.movable:
+            host = self.host_list[service_host[service]]
+            if host not in placement:
+                placement[host] = []
+            placement[host].append(self.services[service])
+        return placement
@@ -0,0 +1,253 @@
+######################################################
+# Seeded generator of synthetic microservice meshes in the format collected by GCP_Metrics
+# Services are split in tiers (gateways, business logic, backing services, data stores), calls go to deeper tiers
+# with a power-law fan-out and a power-law popularity of the callees, request rates flow from the gateways down
+# the tiers and services get a power-law number of replicas spread over heterogeneous hosts
+# Input: Number of services, Number of hosts, Seed
+# Output: GCP_Metrics (or its snapshot state) ready for the placement algorithms without a cluster
+######################################################
+import operator
+
+import numpy as np
+
+from Cluster_Snapshot import Cluster_Snapshot
+
+
+class Mesh_Generator:
+    tier_names = ["gateway", "logic", "backend", "store"]
+    tier_shares = [0.05, 0.35, 0.40, 0.20]  # Share of the services in every tier
+    next_tier_probability = 0.8  # Calls that go to the next tier - The others go to any deeper tier
+    fan_out_exponent = 2.0  # Pareto shape of the number of callees of a service
+    popularity_exponent = 1.5  # Pareto shape of the popularity of a service among its callers
+    replica_exponent = 2.5  # Power law of the number of replicas
+    max_fan_out = 30
+    window = 60.0  # Seconds of the traffic counters
+    system_share = 0.1  # Resources of every host requested by pods outside the application
+
+    def __init__(self, number_of_services, number_of_hosts, seed=None, max_replicas=3, load=0.5,
+                 namespace="default"):
+        self.number_of_services = int(number_of_services)
+        self.number_of_hosts = int(number_of_hosts)
+        self.seed = seed
+        self.max_replicas = max_replicas
+        self.load = load  # Application requests over the application capacity of the hosts
+        self.namespace = namespace
+        self.random = np.random.default_rng(seed)
+
+        self.services = []
+        self.tiers = []  # Pattern: [[service indexes of the tier], ...]
+        self.edges = {}  # Pattern: {(source index, dest index): requests per second}
+        self.replicas = []
+
+    # Tier sizes follow the shares - Every tier has a service while there are enough services
+    def build_tiers(self):
+        number_of_tiers = min(len(Mesh_Generator.tier_shares), self.number_of_services)
+        shares = np.array(Mesh_Generator.tier_shares[:number_of_tiers])
+        sizes = np.maximum(1, np.floor(shares / shares.sum() * self.number_of_services).astype(int))
+        sizes[int(np.argmax(sizes))] += self.number_of_services - int(sizes.sum())
+        self.tiers = []
+        self.services = []
+        for tier, size in enumerate(sizes):
+            self.tiers.append(list(range(len(self.services), len(self.services) + int(size))))
+            for index in range(int(size)):
+                self.services.append(Mesh_Generator.tier_names[tier] + str(index))
+
+    # Callees are drawn by popularity from the next tier or from any deeper tier
+    def build_call_graph(self):
+        popularity = self.random.pareto(Mesh_Generator.popularity_exponent, self.number_of_services) + 1.0
+        cumulative = []
+        for members in self.tiers:
+            weights = np.cumsum(popularity[members])
+            cumulative.append(weights / weights[-1])
+
+        def draw(tier):
+            position = int(np.searchsorted(cumulative[tier], self.random.random(), side="right"))
+            return self.tiers[tier][min(position, len(self.tiers[tier]) - 1)]
+
+        callees = [set() for _ in self.services]
+        has_caller = [False] * self.number_of_services
+        last_tier = len(self.tiers) - 1
+        for tier in range(last_tier):
+            for service in self.tiers[tier]:
+                fan_out = min(Mesh_Generator.max_fan_out, int(self.random.pareto(Mesh_Generator.fan_out_exponent)) + 1)
+                for _ in range(fan_out):
+                    if tier + 1 == last_tier or self.random.random() < Mesh_Generator.next_tier_probability:
+                        callee = draw(tier + 1)
+                    else:
+                        callee = draw(int(self.random.integers(tier + 2, last_tier + 1)))
+                    callees[service].add(callee)
+                    has_caller[callee] = True
+
+        # Every service below the gateways is called by a random service of the tier above
+        for tier in range(1, len(self.tiers)):
+            for service in self.tiers[tier]:
+                if not has_caller[service]:
+                    caller = self.tiers[tier - 1][int(self.random.integers(len(self.tiers[tier - 1])))]
+                    callees[caller].add(service)
+                    has_caller[service] = True
+
+        # Request rates flow from the gateways down the tiers
+        incoming = np.zeros(self.number_of_services)
+        incoming[self.tiers[0]] = self.random.lognormal(np.log(50.0), 1.0, len(self.tiers[0]))
+        self.edges = {}
+        for tier in range(len(self.tiers)):
+            for service in self.tiers[tier]:
+                for callee in sorted(callees[service]):
+                    calls_per_request = min(3.0, self.random.lognormal(np.log(0.5), 0.7))
+                    rate = max(0.001, incoming[service] * calls_per_request)
+                    self.edges[(service, callee)] = rate
+                    incoming[callee] += rate
+
+    # Mostly one replica, a few services with up to max_replicas
+    def build_replicas(self):
+        counts = np.arange(1, self.max_replicas + 1)
+        weights = counts ** -float(Mesh_Generator.replica_exponent)
+        self.replicas = [int(count) for count in self.random.choice(counts, self.number_of_services,
+                                                                    p=weights / weights.sum())]
+
+    def pod_name(self, service):
+        return service + "-" + "".join(self.random.choice(list("0123456789abcdef"), 10)) + "-" + \
+            "".join(self.random.choice(list("bcdfghjklmnpqrstvwxz2456789"), 5))
+
+    # Pattern: GCP_Metrics attributes as stored by Cluster_Snapshot
+    def state(self):
+        self.random = np.random.default_rng(self.seed)
+        self.build_tiers()
+        self.build_call_graph()
+        self.build_replicas()
+        host_list = ["node-" + str(host) for host in range(self.number_of_hosts)]
+
+        # Resource demands of every pod of a service
+        service_cpu = np.round(self.random.lognormal(np.log(0.1), 0.6, self.number_of_services), 3) + 0.001
+        service_ram = np.round(self.random.lognormal(np.log(128.0 * 2 ** 20), 0.8, self.number_of_services))
+
+        # Heterogeneous hosts sized so that the application fills the load share of their capacity
+        total_cpu = float(sum(service_cpu[index] * self.replicas[index] for index in range(self.number_of_services)))
+        total_ram = float(sum(service_ram[index] * self.replicas[index] for index in range(self.number_of_services)))
+        sizes = self.random.uniform(0.7, 1.3, self.number_of_hosts)
+        capacity_cpu = sizes * total_cpu / (self.number_of_hosts * self.load)
+        capacity_ram = sizes * total_ram / (self.number_of_hosts * self.load)
+        system_cpu = capacity_cpu * Mesh_Generator.system_share
+        system_ram = capacity_ram * Mesh_Generator.system_share
+
+        # Initial placement - Pods in random order on random hosts with room, replicas on different hosts
+        free_cpu = capacity_cpu.copy()
+        free_ram = capacity_ram.copy()
+        initial_placement = {}
+        current_placement = {}
+        for host in host_list:
+            initial_placement[host] = []
+            current_placement[host] = []
+        pods = [index for index in range(self.number_of_services) for _ in range(self.replicas[index])]
+        self.random.shuffle(pods)
+        pod_request_cpu = {}
+        pod_request_ram = {}
+        service_pod_hosts = [set() for _ in range(self.number_of_services)]
+        for index in pods:
+            fits = (free_cpu > service_cpu[index]) & (free_ram > service_ram[index])
+            fits[list(service_pod_hosts[index])] = False
+            if fits.any():
+                host = int(self.random.choice(np.flatnonzero(fits)))
+            else:
+                host = int(np.argmax(free_cpu))
+            free_cpu[host] -= service_cpu[index]
+            free_ram[host] -= service_ram[index]
+            service_pod_hosts[index].add(host)
+            pod = self.pod_name(self.services[index])
+            initial_placement[host_list[host]].append(pod)
+            current_placement[host_list[host]].append(self.services[index])
+            pod_request_cpu[pod] = format(float(service_cpu[index]), '.3f')
+            pod_request_ram[pod] = format(float(service_ram[index]), '.3f')
+
+        attributes = {"host_list": host_list, "number_of_hosts": self.number_of_hosts, "service_list": [],
+                      "pod_request_cpu": pod_request_cpu, "pod_request_ram": pod_request_ram,
+                      "initial_placement": initial_placement, "current_placement": current_placement}
+        for name in ["node_request_cpu", "node_request_ram", "node_allocatable_cpu", "node_allocatable_ram",
+                     "node_available_cpu", "node_available_ram", "node_initial_available_cpu",
+                     "node_initial_available_ram", "node_initial_cpu_usage", "node_initial_ram_usage",
+                     "current_pod_request_cpu", "current_pod_request_ram", "pod_usage_cpu", "pod_usage_ram"]:
+            attributes[name] = {}
+        for index, service in enumerate(self.services):
+            attributes["current_pod_request_cpu"][service] = format(float(service_cpu[index]), '.3f')
+            attributes["current_pod_request_ram"][service] = format(float(service_ram[index]), '.3f')
+
+        # Node metrics as calculated by GCP_Metrics with and without the application pods
+        for host_index, host in enumerate(host_list):
+            allocatable_cpu = capacity_cpu[host_index] + system_cpu[host_index]
+            allocatable_ram = capacity_ram[host_index] + system_ram[host_index]
+            request_cpu = float(system_cpu[host_index])
+            request_ram = float(system_ram[host_index])
+            attributes["pod_usage_cpu"][host] = {}
+            attributes["pod_usage_ram"][host] = {}
+            for pod in initial_placement[host]:
+                request_cpu += float(pod_request_cpu[pod])
+                request_ram += float(pod_request_ram[pod])
+                # Pods use part of their requests
+                attributes["pod_usage_cpu"][host][pod] = format(float(pod_request_cpu[pod]) *
+                                                                self.random.uniform(0.2, 0.9), '.4f')
+                attributes["pod_usage_ram"][host][pod] = format(float(pod_request_ram[pod]) *
+                                                                self.random.uniform(0.3, 0.9), '.2f')
+            for service in current_placement[host]:
+                attributes["service_list"].append(service)
+            attributes["node_request_cpu"][host] = format(request_cpu, '.3f')
+            attributes["node_request_ram"][host] = format(request_ram, '.3f')
+            attributes["node_allocatable_cpu"][host] = format(float(allocatable_cpu), '.3f')
+            attributes["node_allocatable_ram"][host] = format(float(allocatable_ram), '.3f')
+            attributes["node_available_cpu"][host] = float(allocatable_cpu) - request_cpu
+            attributes["node_available_ram"][host] = float(allocatable_ram) - request_ram
+            attributes["node_initial_available_cpu"][host] = float(capacity_cpu[host_index])
+            attributes["node_initial_available_ram"][host] = float(capacity_ram[host_index])
+            attributes["node_initial_cpu_usage"][host] = float(system_cpu[host_index])
+            attributes["node_initial_ram_usage"][host] = float(system_ram[host_index])
+        attributes["max_cpu_allocation"] = format(max(float(x) for x in attributes["node_request_cpu"].values()),
+                                                  '.3f')
+        attributes["max_ram_allocation"] = format(max(float(x) for x in attributes["node_request_ram"].values()),
+                                                  '.3f')
+
+        # Traffic of every call - Kiali rates and response times, Prometheus bytes and counts over the window
+        for name in ["service_affinities", "response_times", "traffic_requested_bytes", "traffic_responsed_bytes",
+                     "traffic_requested_count", "traffic_responsed_count", "total_affinities_bytes"]:
+            attributes[name] = {}
+        for (source_index, dest_index), rate in self.edges.items():
+            source = self.services[source_index]
+            dest = self.services[dest_index]
+            if source not in attributes["service_affinities"]:
+                for name in ["service_affinities", "response_times", "traffic_requested_bytes",
+                             "traffic_responsed_bytes", "traffic_requested_count", "traffic_responsed_count",
+                             "total_affinities_bytes"]:
+                    attributes[name][source] = {}
+            count = rate * Mesh_Generator.window
+            requested_bytes = count * self.random.lognormal(np.log(500.0), 0.8)
+            responsed_bytes = count * self.random.lognormal(np.log(2000.0), 1.0)
+            attributes["service_affinities"][source][dest] = format(rate, '.3f')
+            attributes["response_times"][source][dest] = format(self.random.lognormal(np.log(5.0), 0.8), '.2f')
+            attributes["traffic_requested_bytes"][source][dest] = requested_bytes
+            attributes["traffic_responsed_bytes"][source][dest] = responsed_bytes
+            attributes["traffic_requested_count"][source][dest] = count
+            attributes["traffic_responsed_count"][source][dest] = count
+            attributes["total_affinities_bytes"][source][dest] = format((requested_bytes + responsed_bytes) /
+                                                                        (2.0 * count), '.3f')
+        attributes["total_edjes"] = len(self.edges)
+
+        # Sorted views of the affinities
+        attributes["sorted_service_affinities"] = {}
+        affinities_collection = {}
+        affinities_bytes_collection = {}
+        for source in attributes["service_affinities"]:
+            attributes["sorted_service_affinities"][source] = dict(
+                sorted(attributes["service_affinities"][source].items(), key=lambda x: float(x[1]), reverse=True))
+            for dest in attributes["service_affinities"][source]:
+                affinities_collection[source + "->" + dest] = float(attributes["service_affinities"][source][dest])
+                affinities_bytes_collection[source + "->" + dest] = float(
+                    attributes["total_affinities_bytes"][source][dest])
+        attributes["affinities_collection"] = dict(sorted(affinities_collection.items(), key=operator.itemgetter(1),
+                                                          reverse=True))
+        attributes["affinities_bytes_collection"] = dict(sorted(affinities_bytes_collection.items(),
+                                                                key=operator.itemgetter(1), reverse=True))
+
+        return {"format": Cluster_Snapshot.snapshot_format, "version": Cluster_Snapshot.snapshot_version,
+                "namespace": self.namespace, "url_prometheus": "", "url_kiali": "", "attributes": attributes}
+
+    # Collector rebuilt from the generated state - Same seed, same mesh
+    def generate(self):
+        return Cluster_Snapshot.from_state(self.state())
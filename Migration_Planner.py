@@ -0,0 +1,226 @@
+######################################################
+# Rollout plan from the current placement to a placement solution in waves of parallel moves
+# A move starts the pod of a service on its new host and deletes it from the old one, the capacity freed by the
+# deletions of a wave is only used from the next wave on so no host is ever overcommitted while a wave runs
+# Moves are edges of a dependency graph between hosts (old host -> new host), a move into a full host waits for the
+# moves out of it and when every remaining move waits a cycle of the graph is broken by parking one pod of the
+# cycle on a temporary host that has room for it, the pod reaches its new host in a later wave
+# Every wave takes the moves that fit, the moves out of the hosts most waited for first
+# Input: Current placement, Placement solution, Resource demands, Available VM resources with the current pods,
+# Temporary hosts with their free resources (hosts of the cluster when left out)
+# Services missing from the placement solution are reported as unplaced and their pods are left where they are
+# Output: Waves of moves, temporary moves, the moves that cannot be planned without overcommitting a host and the
+# unplaced services
+######################################################
+import networkx as nx
+
+from Instrumentation import Instrumentation
+
+
+class Migration_Planner:
+    def __init__(self, current_placement, final_placement, pod_request_cpu, pod_request_ram, node_available_cpu,
+                 node_available_ram, temporary_hosts=None):
+        self.current_placement = current_placement
+        self.final_placement = final_placement
+        self.pod_request_cpu = pod_request_cpu
+        self.pod_request_ram = pod_request_ram
+        self.available_cpu = {}
+        self.available_ram = {}
+        for host in node_available_cpu:
+            self.available_cpu[host] = float(node_available_cpu[host])
+            self.available_ram[host] = float(node_available_ram[host])
+        # Pattern: {"host": [free cpu, free ram]} - Hosts outside the cluster (e.g. a surge node) may be added
+        if temporary_hosts is not None:
+            for host in temporary_hosts:
+                if host not in self.available_cpu:
+                    self.available_cpu[host] = 0.0
+                    self.available_ram[host] = 0.0
+                self.available_cpu[host] += float(temporary_hosts[host][0])
+                self.available_ram[host] += float(temporary_hosts[host][1])
+        self.temporary_hosts = list(temporary_hosts) if temporary_hosts is not None else list(self.available_cpu)
+
+        self.moves = []  # Pattern: [{"service": name, "from": host or None, "to": host or None}]
+        self.waves = []  # Pattern: [[move, ...], ...] - A move "temporary" parks a pod on its way
+        self.temporary_moves = 0
+        self.blocked_moves = []
+        self.unplaced_services = []  # Services of the current placement without a pod in the placement solution
+
+    @staticmethod
+    def from_metrics(collector, final_placement, temporary_hosts=None):
+        return Migration_Planner(collector.current_placement, final_placement, collector.current_pod_request_cpu,
+                                 collector.current_pod_request_ram, collector.node_available_cpu,
+                                 collector.node_available_ram, temporary_hosts)
+
+    # Pattern: {service: [hosts]} with a host once per pod
+    @staticmethod
+    def service_hosts(placement):
+        service_hosts = {}
+        for host in placement:
+            for service in placement[host]:
+                if service not in service_hosts:
+                    service_hosts[service] = []
+                service_hosts[service].append(host)
+        return service_hosts
+
+    # Pods that change host - Pods kept on a host of both placements never move
+    # Extra pods of the placement solution are created (from None), pods beyond its replica count are deleted
+    # (to None) - Services without any pod in the solution were not placed and are never deleted
+    def placement_diff(self):
+        current_hosts = self.service_hosts(self.current_placement)
+        final_hosts = self.service_hosts(self.final_placement)
+        self.unplaced_services = sorted(service for service in current_hosts if service not in final_hosts)
+        moves = []
+        for service in sorted(final_hosts):
+            sources = list(current_hosts.get(service, []))
+            destinations = []
+            for host in final_hosts.get(service, []):
+                if host in sources:
+                    sources.remove(host)
+                else:
+                    destinations.append(host)
+            sources.sort()
+            destinations.sort()
+            for index in range(max(len(sources), len(destinations))):
+                moves.append({"service": service, "from": sources[index] if index < len(sources) else None,
+                              "to": destinations[index] if index < len(destinations) else None})
+        return moves
+
+    def fits(self, move, host, free_cpu, free_ram):
+        return float(self.pod_request_cpu[move["service"]]) <= free_cpu.get(host, 0.0) and \
+            float(self.pod_request_ram[move["service"]]) <= free_ram.get(host, 0.0)
+
+    def reserve(self, move, host, free_cpu, free_ram):
+        free_cpu[host] = free_cpu.get(host, 0.0) - float(self.pod_request_cpu[move["service"]])
+        free_ram[host] = free_ram.get(host, 0.0) - float(self.pod_request_ram[move["service"]])
+
+    # Dependency graph of the waiting moves - An edge old host -> new host per move, keyed by its index
+    @staticmethod
+    def dependency_graph(moves):
+        graph = nx.MultiDiGraph()
+        for index, move in enumerate(moves):
+            graph.add_edge(move["from"], move["to"], key=index)
+        return graph
+
+    # Park one pod of every cycle of waiting moves on a temporary host - Returns the parking moves
+    def break_cycles(self, pending, free_cpu, free_ram):
+        graph = self.dependency_graph(pending)
+        parked = []
+        while True:
+            try:
+                cycle = nx.find_cycle(graph)
+            except nx.NetworkXNoCycle:
+                break
+            # Smallest pod of the cycle that fits on a temporary host outside the cycle - The freest host first
+            cycle_hosts = set(edge[0] for edge in cycle)
+            hosts = sorted((host for host in self.temporary_hosts if host not in cycle_hosts),
+                           key=lambda x: (-free_cpu.get(x, 0.0), -free_ram.get(x, 0.0)))
+            candidates = sorted(cycle, key=lambda edge: (float(self.pod_request_cpu[pending[edge[2]]["service"]]),
+                                                         float(self.pod_request_ram[pending[edge[2]]["service"]])))
+            choice = None
+            for edge in candidates:
+                for host in hosts:
+                    if self.fits(pending[edge[2]], host, free_cpu, free_ram):
+                        choice = (edge, host)
+                        break
+                if choice is not None:
+                    break
+            if choice is None:
+                break
+            edge, host = choice
+            move = pending[edge[2]]
+            self.reserve(move, host, free_cpu, free_ram)
+            parked.append((edge[2], host))
+            graph.remove_edge(*edge)
+        return parked
+
+    @Instrumentation.timed
+    def plan(self):
+        self.moves = self.placement_diff()
+        self.waves = []
+        self.temporary_moves = 0
+        self.blocked_moves = []
+        free_cpu = dict(self.available_cpu)
+        free_ram = dict(self.available_ram)
+
+        # Deletions only free resources - They run in the first wave
+        pending = []
+        first_wave = []
+        for move in self.moves:
+            if move["to"] is None:
+                first_wave.append(dict(move, temporary=False))
+            else:
+                pending.append(move)
+
+        while pending or first_wave:
+            # Moves out of the hosts that most moves wait for go first, then the largest pods
+            waiting = {}
+            for move in pending:
+                waiting[move["to"]] = waiting.get(move["to"], 0) + 1
+            order = sorted(range(len(pending)),
+                           key=lambda x: (-waiting.get(pending[x]["from"], 0),
+                                          -float(self.pod_request_cpu[pending[x]["service"]])))
+            wave = first_wave
+            first_wave = []
+            remaining = []
+            reserved_cpu = dict(free_cpu)
+            reserved_ram = dict(free_ram)
+            for index in order:
+                move = pending[index]
+                if self.fits(move, move["to"], reserved_cpu, reserved_ram):
+                    self.reserve(move, move["to"], reserved_cpu, reserved_ram)
+                    wave.append(dict(move, temporary=False))
+                else:
+                    remaining.append(move)
+
+            # Every move waits - Cycles are broken with temporary hosts, the pods finish their moves later
+            if not wave:
+                parked = dict(self.break_cycles(remaining, reserved_cpu, reserved_ram))
+                # A pod is parked at most once per move on average - More parking would only go round in circles
+                if not parked or self.temporary_moves + len(parked) > len(self.moves):
+                    self.blocked_moves = remaining
+                    break
+                next_pending = []
+                for index, move in enumerate(remaining):
+                    if index in parked:
+                        wave.append({"service": move["service"], "from": move["from"], "to": parked[index],
+                                     "temporary": True})
+                        next_pending.append({"service": move["service"], "from": parked[index], "to": move["to"]})
+                        self.temporary_moves += 1
+                    else:
+                        next_pending.append(move)
+                remaining = next_pending
+
+            # Resources freed by the deletions of the wave are used from the next wave on
+            free_cpu = reserved_cpu
+            free_ram = reserved_ram
+            for move in wave:
+                if move["from"] is not None:
+                    free_cpu[move["from"]] = free_cpu.get(move["from"], 0.0) + \
+                        float(self.pod_request_cpu[move["service"]])
+                    free_ram[move["from"]] = free_ram.get(move["from"], 0.0) + \
+                        float(self.pod_request_ram[move["service"]])
+            self.waves.append(wave)
+            pending = remaining
+        Instrumentation.count("migration_moves", sum(len(wave) for wave in self.waves))
+        return self.waves
+
+    def print_report(self):
+        print("#" * 100)
+        print("Migration plan - " + str(len(self.moves)) + " moves in " + str(len(self.waves)) + " waves (" +
+              str(self.temporary_moves) + " through temporary hosts)")
+        print("-" * 40)
+        for number, wave in enumerate(self.waves):
+            print("Wave " + str(number + 1) + ": " + str(len(wave)) + " moves")
+            for move in wave:
+                print("  " + move["service"].ljust(40) + str(move["from"]) + " -> " + str(move["to"]) +
+                      (" (temporary)" if move["temporary"] else ""))
+        if self.unplaced_services:
+            print("-" * 40)
+            print("ERROR: Services without a host in the placement solution stay where they are: " +
+                  str(self.unplaced_services))
+        if self.blocked_moves:
+            print("-" * 40)
+            print("ERROR: Moves that overcommit a host in every order: " +
+                  str([move["service"] + ": " + str(move["from"]) + " -> " + str(move["to"])
+                       for move in self.blocked_moves]))
+        print("#" * 100)
@@ -0,0 +1,316 @@
+######################################################
+# Multilevel k-way partition of the application under the cpu and ram thresholds of K Partition
+# The service graph is coarsened by heavy edge matching, the coarsest graph is partitioned by greedy graph growing
+# and the partition is projected back level by level and refined with Fiduccia-Mattheyses moves
+# Input: Service List, Service Affinities, Pod Requests, Max Cpu and Ram Allocation, alpha
+# Output: Partition of application in the app_partition format and the weight of the cut
+# Paper: A Fast and High Quality Multilevel Scheme for Partitioning Irregular Graphs, Karypis and Kumar
+######################################################
+import heapq
+
+import numpy as np
+from scipy import sparse
+
+from Instrumentation import Instrumentation
+
+
+class Multilevel_Partition:
+    coarsest_size = 100  # Coarsening stops once the graph has at most this many vertices
+    coarsening_ratio = 0.9  # Coarsening stops when a level keeps more than this fraction of the vertices
+    initial_tries = 4  # Graph growing runs on the coarsest graph - The one with the smallest cut is kept
+    fill_window = 64  # Unconnected vertices tried when a growing part has no connected candidate left
+    refinement_passes = 4  # Fiduccia-Mattheyses passes per level
+    max_bad_moves = 50  # Moves without improvement before a pass is rolled back to its best prefix
+
+    def __init__(self, service_list, service_affinities, pod_request_cpu, pod_request_ram, max_cpu_allocation,
+                 max_ram_allocation, random_generator=None):
+        self.services = []
+        self.service_to_id = {}
+        for service in service_list:
+            if service not in self.service_to_id:
+                self.service_to_id[service] = len(self.services)
+                self.services.append(service)
+        self.number_of_services = len(self.services)
+        self.max_cpu_allocation = float(max_cpu_allocation)
+        self.max_ram_allocation = float(max_ram_allocation)
+        self.random = random_generator if random_generator is not None else np.random.default_rng()
+        self.cpu_limit = 0.0
+        self.ram_limit = 0.0
+
+        self.service_cpu = np.array([float(pod_request_cpu[service]) for service in self.services], dtype=float)
+        self.service_ram = np.array([float(pod_request_ram[service]) for service in self.services], dtype=float)
+
+        # Undirected graph of the services - Both directions of an affinity are summed and self loops dropped
+        rows = []
+        cols = []
+        weights = []
+        for source in service_affinities:
+            if source not in self.service_to_id:
+                continue
+            for dest in service_affinities[source]:
+                if dest not in self.service_to_id or dest == source:
+                    continue
+                rows.append(self.service_to_id[source])
+                cols.append(self.service_to_id[dest])
+                weights.append(float(service_affinities[source][dest]))
+        shape = (self.number_of_services, self.number_of_services)
+        directed = sparse.csr_matrix((np.array(weights, dtype=float), (np.array(rows, dtype=np.int64),
+                                                                        np.array(cols, dtype=np.int64))), shape=shape)
+        self.graph = (directed + directed.T).tocsr()
+        self.graph.eliminate_zeros()
+
+    # Same criteria as K Partition - A part is small enough when both demands are below the thresholds
+    # Demands are summed in a different order than in K Partition so parts on the thresholds are kept out
+    def fits(self, cpu, ram):
+        return cpu < self.cpu_limit - 1e-9 * max(1.0, self.cpu_limit) and \
+            ram < self.ram_limit - 1e-9 * max(1.0, self.ram_limit)
+
+    @staticmethod
+    def graph_lists(graph):
+        return graph.indptr.tolist(), graph.indices.tolist(), graph.data.tolist()
+
+    @staticmethod
+    def cut_weight(graph, labels):
+        coo = graph.tocoo()
+        labels = np.asarray(labels)
+        return float(coo.data[labels[coo.row] != labels[coo.col]].sum()) / 2.0
+
+    # One coarsening level - Every vertex is matched with the unmatched neighbour of its heaviest edge
+    # as long as the merged vertex is still small enough to form a part on its own
+    def coarsen(self, graph, cpu, ram):
+        indptr, indices, data = self.graph_lists(graph)
+        number_of_vertices = len(cpu)
+        match = [-1] * number_of_vertices
+        for vertex in self.random.permutation(number_of_vertices).tolist():
+            if match[vertex] >= 0:
+                continue
+            best = vertex
+            best_weight = 0.0
+            for edge in range(indptr[vertex], indptr[vertex + 1]):
+                neighbour = indices[edge]
+                if match[neighbour] < 0 and neighbour != vertex and data[edge] > best_weight and \
+                        self.fits(cpu[vertex] + cpu[neighbour], ram[vertex] + ram[neighbour]):
+                    best, best_weight = neighbour, data[edge]
+            match[vertex] = best
+            match[best] = vertex
+
+        coarse = [-1] * number_of_vertices
+        number_of_coarse = 0
+        for vertex in range(number_of_vertices):
+            if coarse[vertex] < 0:
+                coarse[vertex] = number_of_coarse
+                coarse[match[vertex]] = number_of_coarse
+                number_of_coarse += 1
+
+        # Coarse graph P^T A P without the edges collapsed inside a coarse vertex
+        coarse = np.array(coarse, dtype=np.int64)
+        projection = sparse.csr_matrix((np.ones(number_of_vertices), (np.arange(number_of_vertices), coarse)),
+                                       shape=(number_of_vertices, number_of_coarse))
+        coarse_graph = (projection.T @ graph @ projection).tolil()
+        coarse_graph.setdiag(0.0)
+        coarse_graph = coarse_graph.tocsr()
+        coarse_graph.eliminate_zeros()
+        coarse_cpu = np.bincount(coarse, weights=cpu, minlength=number_of_coarse)
+        coarse_ram = np.bincount(coarse, weights=ram, minlength=number_of_coarse)
+        return coarse_graph, coarse_cpu, coarse_ram, coarse
+
+    # Greedy graph growing - Each part starts from the heaviest unassigned vertex and takes the vertex most
+    # connected to it while the part stays below the thresholds
+    def grow_partition(self, graph, cpu, ram, order):
+        indptr, indices, data = self.graph_lists(graph)
+        cpu = cpu.tolist()
+        ram = ram.tolist()
+        number_of_vertices = len(cpu)
+        labels = [-1] * number_of_vertices
+        pointer = 0
+        part = 0
+        while True:
+            while pointer < number_of_vertices and labels[order[pointer]] >= 0:
+                pointer += 1
+            if pointer == number_of_vertices:
+                break
+            vertex = order[pointer]
+            part_cpu = 0.0
+            part_ram = 0.0
+            gains = {}
+            heap = []
+            scan = pointer
+            while vertex is not None:
+                labels[vertex] = part
+                part_cpu += cpu[vertex]
+                part_ram += ram[vertex]
+                for edge in range(indptr[vertex], indptr[vertex + 1]):
+                    neighbour = indices[edge]
+                    if labels[neighbour] < 0:
+                        gains[neighbour] = gains.get(neighbour, 0.0) + data[edge]
+                        heapq.heappush(heap, (-gains[neighbour], neighbour))
+
+                # Most connected vertex that fits - Stale heap entries are skipped
+                vertex = None
+                while heap:
+                    gain, candidate = heapq.heappop(heap)
+                    if labels[candidate] >= 0 or -gain != gains[candidate]:
+                        continue
+                    if self.fits(part_cpu + cpu[candidate], part_ram + ram[candidate]):
+                        vertex = candidate
+                        break
+
+                # Fill the part with unconnected vertices that fit
+                tries = 0
+                while vertex is None and scan < number_of_vertices and tries < Multilevel_Partition.fill_window:
+                    candidate = order[scan]
+                    scan += 1
+                    if labels[candidate] < 0:
+                        if self.fits(part_cpu + cpu[candidate], part_ram + ram[candidate]):
+                            vertex = candidate
+                        tries += 1
+            part += 1
+        return labels
+
+    # Initial partition of the coarsest graph - Heaviest vertices first, then random orders
+    def initial_partition(self, graph, cpu, ram):
+        total_cpu = max(float(cpu.sum()), 1e-12)
+        total_ram = max(float(ram.sum()), 1e-12)
+        order = np.argsort(-(cpu / total_cpu + ram / total_ram), kind="stable").tolist()
+        best_labels = None
+        best_cut = 0.0
+        for attempt in range(Multilevel_Partition.initial_tries):
+            if attempt > 0:
+                order = self.random.permutation(len(cpu)).tolist()
+            labels = self.grow_partition(graph, cpu, ram, order)
+            cut = self.cut_weight(graph, labels)
+            if best_labels is None or cut < best_cut:
+                best_labels, best_cut = labels, cut
+        return best_labels
+
+    # Best move of a vertex to a neighbouring part that can take it - (gain, part) or (None, None)
+    def best_move(self, vertex, indptr, indices, data, labels, cpu, ram, part_cpu, part_ram):
+        connection = {}
+        for edge in range(indptr[vertex], indptr[vertex + 1]):
+            part = labels[indices[edge]]
+            connection[part] = connection.get(part, 0.0) + data[edge]
+        own = labels[vertex]
+        internal = connection.get(own, 0.0)
+        best_gain = None
+        best_part = None
+        for part in connection:
+            if part == own or not self.fits(part_cpu[part] + cpu[vertex], part_ram[part] + ram[vertex]):
+                continue
+            gain = connection[part] - internal
+            if best_gain is None or gain > best_gain or (gain == best_gain and part < best_part):
+                best_gain, best_part = gain, part
+        return best_gain, best_part
+
+    # K-way Fiduccia-Mattheyses refinement - Vertices move once per pass in order of gain, negative gains
+    # included, and the pass is rolled back to the prefix of moves with the smallest cut
+    def refine(self, graph, cpu, ram, labels):
+        indptr, indices, data = self.graph_lists(graph)
+        cpu = cpu.tolist()
+        ram = ram.tolist()
+        number_of_vertices = len(cpu)
+        number_of_parts = max(labels) + 1 if labels else 0
+        part_cpu = [0.0] * number_of_parts
+        part_ram = [0.0] * number_of_parts
+        for vertex in range(number_of_vertices):
+            part_cpu[labels[vertex]] += cpu[vertex]
+            part_ram[labels[vertex]] += ram[vertex]
+
+        for _ in range(Multilevel_Partition.refinement_passes):
+            locked = [False] * number_of_vertices
+            heap = []
+            for vertex in range(number_of_vertices):
+                gain, part = self.best_move(vertex, indptr, indices, data, labels, cpu, ram, part_cpu, part_ram)
+                if part is not None:
+                    heap.append((-gain, vertex, part))
+            heapq.heapify(heap)
+
+            moves = []
+            cut_change = 0.0
+            best_change = 0.0
+            best_length = 0
+            bad_moves = 0
+            while heap and bad_moves <= Multilevel_Partition.max_bad_moves:
+                gain, vertex, part = heapq.heappop(heap)
+                if locked[vertex]:
+                    continue
+                # The gain may have changed since the entry was pushed
+                current_gain, current_part = self.best_move(vertex, indptr, indices, data, labels, cpu, ram,
+                                                            part_cpu, part_ram)
+                if current_part is None:
+                    continue
+                if current_gain != -gain or current_part != part:
+                    heapq.heappush(heap, (-current_gain, vertex, current_part))
+                    continue
+
+                source = labels[vertex]
+                labels[vertex] = part
+                part_cpu[source] -= cpu[vertex]
+                part_ram[source] -= ram[vertex]
+                part_cpu[part] += cpu[vertex]
+                part_ram[part] += ram[vertex]
+                locked[vertex] = True
+                moves.append((vertex, source))
+                cut_change -= current_gain
+                if cut_change < best_change - 1e-12:
+                    best_change, best_length, bad_moves = cut_change, len(moves), 0
+                else:
+                    bad_moves += 1
+
+                for edge in range(indptr[vertex], indptr[vertex + 1]):
+                    neighbour = indices[edge]
+                    if not locked[neighbour]:
+                        neighbour_gain, neighbour_part = self.best_move(neighbour, indptr, indices, data, labels, cpu,
+                                                                        ram, part_cpu, part_ram)
+                        if neighbour_part is not None:
+                            heapq.heappush(heap, (-neighbour_gain, neighbour, neighbour_part))
+
+            # Roll back the moves after the best prefix
+            for vertex, source in reversed(moves[best_length:]):
+                part = labels[vertex]
+                labels[vertex] = source
+                part_cpu[part] -= cpu[vertex]
+                part_ram[part] -= ram[vertex]
+                part_cpu[source] += cpu[vertex]
+                part_ram[source] += ram[vertex]
+            if best_length == 0:
+                break
+        return labels
+
+    # Multilevel partition for the given alpha value (percentage of resources usage)
+    @Instrumentation.timed
+    def partition(self, alpha):
+        self.cpu_limit = self.max_cpu_allocation * alpha
+        self.ram_limit = self.max_ram_allocation * alpha
+        if self.number_of_services == 0:
+            return {}, 0.0
+
+        # Coarsening
+        levels = []
+        graph, cpu, ram = self.graph, self.service_cpu, self.service_ram
+        while len(cpu) > Multilevel_Partition.coarsest_size:
+            coarse_graph, coarse_cpu, coarse_ram, coarse = self.coarsen(graph, cpu, ram)
+            if len(coarse_cpu) > Multilevel_Partition.coarsening_ratio * len(cpu):
+                break
+            levels.append((graph, cpu, ram, coarse))
+            graph, cpu, ram = coarse_graph, coarse_cpu, coarse_ram
+
+        # Initial partition and refinement of the coarsest graph
+        labels = self.refine(graph, cpu, ram, self.initial_partition(graph, cpu, ram))
+
+        # Uncoarsening - Project the labels to the finer level and refine
+        for graph, cpu, ram, coarse in reversed(levels):
+            labels = [labels[vertex] for vertex in coarse.tolist()]
+            labels = self.refine(graph, cpu, ram, labels)
+
+        return self.partition_from_labels(labels), self.cut_weight(self.graph, labels)
+
+    # Pattern: {"1": [services], "2": [...], ...} - Parts are numbered in order of their first service
+    def partition_from_labels(self, labels):
+        app_partition = {}
+        parts = {}
+        for service, label in enumerate(labels):
+            if label not in parts:
+                parts[label] = str(len(parts) + 1)
+                app_partition[parts[label]] = []
+            app_partition[parts[label]].append(self.services[service])
+        return app_partition
@@ -0,0 +1,122 @@
+######################################################
+# Randomized contraction trials spread over a process pool
+# Every trial gets a seed derived from one master seed so that runs can be reproduced exactly, the global random
+# state is never touched
+# One pool is started on the first part large enough for it and reused for every later part until close, smaller
+# parts run their trials in-process since starting and feeding the workers costs more than the trials
+# The graph of a part is built once from the Placement_Problem and every trial only gets the graph of its part
+# Input: Engine, K value, Services of the part, Placement_Problem, Number of trials
+# Output: Partition with the minimum cut in the app_partition format and the weight of the cut
+######################################################
+import copy
+import math
+import multiprocessing
+import random
+import time
+
+import numpy as np
+
+from Instrumentation import Instrumentation
+from Karger_Stein import Karger_Stein
+
+
+# Run one trial - Returns the trial index, the partition and the cut weight (None if the trial failed)
+# The part graph is the edges of the part for Karger-Stein and the graph with its affinities for the contraction
+def run_trial(arguments):
+    index, seed, engine, contract_function, k_partition, services, part_graph = arguments
+    if engine == "karger_stein":
+        karger_stein = Karger_Stein(services, None, np.random.default_rng(seed), part_graph)
+        labels, cut = karger_stein.trial(k_partition)
+        return index, karger_stein.partition_from_labels(labels), cut
+
+    # Contraction of the partition algorithm with its own random state - It changes the affinities it is given
+    temp_graph, part_service_traffic = part_graph
+    service_traffic = {}
+    for source in part_service_traffic:
+        service_traffic[source] = dict(part_service_traffic[source])
+    partitioned_graph = contract_function(k_partition, temp_graph, service_traffic, random.Random(seed))
+    if not bool(partitioned_graph):
+        return index, partitioned_graph, None
+    cut = 0.0
+    for service in service_traffic:
+        for x in service_traffic[service]:
+            cut += float(service_traffic[service][x])
+    return index, partitioned_graph, cut
+
+
+class Parallel_Contraction:
+    pool_services = 50  # Parts with fewer services run their trials in-process
+
+    def __init__(self, processes=1, seed=None, target_cut=None, time_budget=None):
+        self.processes = processes
+        self.pool = None  # Started on the first part that needs it
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.target_cut = target_cut  # Stop once a cut with at most this weight is found
+        self.time_budget = time_budget  # Seconds allowed for the trials of one part
+        self.trials_run = 0  # Trials completed over all parts
+
+    # Seeds of the trials of the next part - Parts are seeded in the order they are partitioned
+    def trial_seeds(self, trials):
+        part_sequence = self.seed_sequence.spawn(1)[0]
+        return [int(child.generate_state(1, dtype=np.uint64)[0]) for child in part_sequence.spawn(trials)]
+
+    def min_cut(self, engine, contract_function, k_partition, services, problem, trials):
+        seeds = self.trial_seeds(trials)
+        if engine == "karger_stein":
+            services, part_graph = problem.part_edges(services)
+        else:
+            part_graph = problem.part_affinities(services)
+        tasks = [(index, seeds[index], engine, contract_function, k_partition, services, part_graph)
+                 for index in range(trials)]
+        start_time = time.time()
+
+        # Results are reduced in trial order so that the chosen cut does not depend on scheduling
+        # The contraction keeps the part as it is unless a trial cuts less than the whole traffic of the part
+        best_partition = None
+        best_cut = None
+        if engine != "karger_stein":
+            best_partition, part_service_traffic = copy.deepcopy(part_graph)
+            best_cut = 0.0
+            for source in part_service_traffic:
+                for dest in part_service_traffic[source]:
+                    best_cut += part_service_traffic[source][dest]
+        if self.processes > 1 and trials > 1 and len(set(services)) >= Parallel_Contraction.pool_services:
+            if self.pool is None:
+                self.pool = multiprocessing.Pool(self.processes)
+            chunksize = max(1, math.ceil(trials / (4 * min(self.processes, trials))))
+            for index, partition, cut in self.pool.imap(run_trial, tasks, chunksize):
+                best_partition, best_cut = self.reduce(best_partition, best_cut, partition, cut)
+                self.trials_run += 1
+                Instrumentation.count("contraction_trials")
+                if self.stop(best_cut, start_time):
+                    # Trials still queued would delay the next part - The pool is stopped with them
+                    self.close()
+                    break
+        else:
+            for task in tasks:
+                index, partition, cut = run_trial(task)
+                best_partition, best_cut = self.reduce(best_partition, best_cut, partition, cut)
+                self.trials_run += 1
+                Instrumentation.count("contraction_trials")
+                if self.stop(best_cut, start_time):
+                    break
+        return best_partition, best_cut
+
+    # Stop the pool - A later part starts a new one
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    @staticmethod
+    def reduce(best_partition, best_cut, partition, cut):
+        if cut is not None and (best_cut is None or cut < best_cut):
+            return partition, cut
+        return best_partition, best_cut
+
+    # Early stopping once the target cut weight or the time budget is reached
+    def stop(self, best_cut, start_time):
+        if self.target_cut is not None and best_cut is not None and best_cut <= self.target_cut:
+            return True
+        return self.time_budget is not None and time.time() - start_time >= self.time_budget
@@ -0,0 +1,332 @@
+######################################################
+# Long-running placement controller
+# The collector (with its keep-alive connections), the cluster state of the last solve and the last placement stay in
+# memory, the metrics are refreshed every interval and the placement is solved again only when the cross-host
+# fraction of the traffic of the running placement drifted past the threshold from the fraction it was solved for
+# (hysteresis) - A change of the load that keeps the placement as good as before does not trigger a solve
+# Every refresh is a full collection (GCP_Metrics.reset and collect_resources) that only saves the connection setup,
+# the solves are what is cheaper: they are incremental (Incremental_Placement) while the hosts are the same, a full
+# solve runs on the first cycle, when the hosts change, when the incremental solve fails or leaves services without
+# a host and every full_solve_every solves - A full solve that still leaves services without a host is reported as
+# partial and the previous plan is kept
+# The latest plan, its scores and the timings of every phase are served over a local HTTP endpoint
+# Input: GCP_Metrics, Algorithm, Affinity metric, Interval, Drift threshold
+# Output: GET /plan (placement and scores), /status (cycle state and timings), /metrics (Prometheus text)
+######################################################
+import argparse
+import collections
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from Batch_Placement import affinity_metrics
+from Cluster_Snapshot import Cluster_Snapshot
+from GCP_Metrics import GCP_Metrics
+from Incremental_Placement import Incremental_Placement
+from Instrumentation import Instrumentation
+from Placement_Scoring import Placement_Scoring
+from Portfolio_Runner import Portfolio_Runner
+
+
+class Controller_Handler(BaseHTTPRequestHandler):
+    controller = None  # Set on a subclass per server
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/plan":
+            self.reply(200, "application/json", json.dumps(self.controller.plan()))
+        elif path == "/status":
+            self.reply(200, "application/json", json.dumps(self.controller.status()))
+        elif path == "/metrics":
+            self.reply(200, "text/plain; version=0.0.4", self.controller.prometheus_text())
+        elif path == "/healthz":
+            self.reply(200, "text/plain", "ok\n")
+        else:
+            self.reply(404, "application/json", json.dumps({"error": "unknown path " + path}))
+
+    def reply(self, code, content_type, body):
+        body = body.encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Requests are not logged to standard error
+    def log_message(self, format, *args):
+        pass
+
+
+class Placement_Controller:
+    history_size = 100  # Cycles kept in the status
+
+    def __init__(self, collector, algorithm="heuristic_first_fit", affinity_metric="service_affinities",
+                 options=None, interval=60.0, drift_threshold=0.1, full_solve_every=0, portfolio_budget=60.0,
+                 address="127.0.0.1", port=8080):
+        self.collector = collector  # GCP_Metrics refreshed in place - Anything with reset() and collect_resources()
+        self.algorithm = algorithm  # Full solve - A pipeline of Portfolio_Runner or "portfolio"
+        self.affinity_metric = affinity_metric
+        self.options = dict(Portfolio_Runner.default_options)
+        if options is not None:
+            self.options.update(options)
+        self.interval = interval  # Seconds between the start of two cycles
+        self.drift_threshold = drift_threshold  # Relative change of the cross-host fraction that triggers a solve
+        self.full_solve_every = full_solve_every  # Solves between two full solves - 0 solves fully only when needed
+        self.portfolio_budget = portfolio_budget
+        self.address = address
+        self.port = port
+
+        self.solved_state = None  # Cluster state of the last solve
+        self.placement = {}  # Last placement solution
+        self.baseline_fraction = None  # Cross-host fraction of the traffic of the running placement at the last solve
+        self.plan_scores = {}
+        self.cycles = 0
+        self.solves = 0
+        self.incremental_solves = 0
+        self.last_cycle = {}
+        self.history = collections.deque(maxlen=Placement_Controller.history_size)
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.server = None
+
+    # Collect again through the same collector and connection pool
+    def refresh(self):
+        self.collector.reset()
+        self.collector.collect_resources()
+
+    def scoring(self, collector):
+        return Placement_Scoring.from_metrics(collector, Portfolio_Runner.affinities(collector, self.affinity_metric))
+
+    # Pattern: {service: [hosts]} with the hosts of the replicas sorted
+    @staticmethod
+    def service_hosts(placement):
+        service_hosts = Incremental_Placement.service_hosts(placement)
+        for service in service_hosts:
+            service_hosts[service] = sorted(service_hosts[service])
+        return service_hosts
+
+    # Cross-host traffic of the placement and the traffic of all the edges between services of the application
+    @staticmethod
+    def traffic(placement_scoring, placement):
+        unplaced = np.full(placement_scoring.number_of_services, -1, dtype=np.int64)
+        scores = placement_scoring.score(np.vstack([placement_scoring.assignment(placement), unplaced]))
+        return float(scores["cross_host_rate"][0]), float(scores["cross_host_rate"][1])
+
+    # Relative change of the cross-host fraction of the traffic since the last solve
+    def drift(self, fraction):
+        if self.baseline_fraction is None:
+            return None
+        if self.baseline_fraction == 0.0:
+            return 0.0 if fraction == 0.0 else float("inf")
+        return abs(fraction - self.baseline_fraction) / self.baseline_fraction
+
+    # Reason to solve again - None keeps the last plan
+    def solve_reason(self, drift):
+        if self.solved_state is None:
+            return "first cycle"
+        if sorted(self.collector.host_list) != sorted(self.solved_state["attributes"]["host_list"]):
+            return "hosts changed"
+        if drift > self.drift_threshold:
+            return "drift"
+        return None
+
+    def full_solve(self):
+        if self.algorithm == "portfolio":
+            return Portfolio_Runner(self.collector, self.affinity_metric, self.portfolio_budget,
+                                    options=self.options).run()
+        return getattr(Portfolio_Runner, self.algorithm)(self.collector, self.affinity_metric, self.options)
+
+    # Only the services that changed since the last solve and their neighbours move
+    def incremental_solve(self):
+        previous_collector = Cluster_Snapshot.from_state(self.solved_state)
+        incremental_placement = Incremental_Placement(
+            self.placement, self.collector.current_placement,
+            Portfolio_Runner.affinities(previous_collector, self.affinity_metric),
+            Portfolio_Runner.affinities(self.collector, self.affinity_metric),
+            previous_collector.current_pod_request_cpu, previous_collector.current_pod_request_ram,
+            self.collector.current_pod_request_cpu, self.collector.current_pod_request_ram,
+            self.collector.node_initial_available_cpu, self.collector.node_initial_available_ram,
+            self.collector.host_list)
+        placement = incremental_placement.incremental_placement()
+        if incremental_placement.unplaced_services:
+            return {}
+        return placement
+
+    # Returns the placement, the solve mode and the error of an incremental solve that fell back to a full one
+    def solve(self, reason):
+        full = reason != "drift" or not bool(self.placement) or \
+            (self.full_solve_every > 0 and self.solves % self.full_solve_every == 0)
+        error = None
+        if not full:
+            try:
+                placement = self.incremental_solve()
+                if bool(placement):
+                    return placement, "incremental", None
+            except Exception as exception:
+                error = repr(exception)
+        return self.full_solve(), "full", error
+
+    # One refresh of the metrics and a solve if needed
+    @Instrumentation.timed
+    def cycle(self):
+        cycle = {"cycle": self.cycles + 1, "time": time.time(), "status": "ok", "solved": False, "reason": None,
+                 "timings": {}}
+        start_time = time.perf_counter()
+        try:
+            self.refresh()
+            cycle["timings"]["collection"] = time.perf_counter() - start_time
+
+            phase_time = time.perf_counter()
+            placement_scoring = self.scoring(self.collector)
+            running_placement = self.collector.current_placement
+            traffic, total_traffic = self.traffic(placement_scoring, running_placement)
+            fraction = traffic / total_traffic if total_traffic > 0.0 else 0.0
+            # The last plan was applied - It is the new baseline without solving
+            if bool(self.placement) and self.service_hosts(running_placement) == self.service_hosts(self.placement):
+                self.baseline_fraction = fraction
+            drift = self.drift(fraction)
+            cycle["cross_host_traffic"] = traffic
+            cycle["total_traffic"] = total_traffic
+            cycle["cross_host_fraction"] = fraction
+            cycle["baseline_fraction"] = self.baseline_fraction
+            cycle["drift"] = drift
+            cycle["timings"]["scoring"] = time.perf_counter() - phase_time
+
+            reason = self.solve_reason(drift)
+            if reason is not None:
+                phase_time = time.perf_counter()
+                placement, mode, incremental_error = self.solve(reason)
+                cycle["timings"]["solve"] = time.perf_counter() - phase_time
+                cycle["reason"] = reason
+                cycle["mode"] = mode
+                if incremental_error is not None:
+                    cycle["incremental_error"] = incremental_error
+                scores = placement_scoring.score(placement_scoring.assignment(placement)) if bool(placement) else None
+                if scores is not None and int(scores["unplaced"][0]) > 0:
+                    # Services without a host - The previous plan and baseline are kept
+                    cycle["status"] = "partial"
+                    cycle["unplaced_services"] = int(scores["unplaced"][0])
+                elif scores is not None:
+                    with self.lock:
+                        self.placement = placement
+                        self.plan_scores = {"cross_host_traffic": float(scores["cross_host_rate"][0]),
+                                            "cross_host_bytes": float(scores["cross_host_bytes"][0]),
+                                            "nodes_used": int(scores["nodes_used"][0]),
+                                            "migrations": int(scores["migrations"][0]),
+                                            "unplaced": int(scores["unplaced"][0]),
+                                            "mode": mode, "cycle": cycle["cycle"]}
+                        self.solved_state = Cluster_Snapshot.state(self.collector)
+                        self.baseline_fraction = fraction
+                        self.solves += 1
+                        if mode == "incremental":
+                            self.incremental_solves += 1
+                    cycle["solved"] = True
+                else:
+                    cycle["status"] = "no solution"
+        except Exception as error:
+            cycle["status"] = "error: " + repr(error)
+        cycle["timings"]["cycle"] = time.perf_counter() - start_time
+
+        with self.lock:
+            self.cycles += 1
+            self.last_cycle = cycle
+            self.history.append(cycle)
+        return cycle
+
+    def plan(self):
+        with self.lock:
+            return {"placement": self.placement, "scores": dict(self.plan_scores), "algorithm": self.algorithm,
+                    "affinity_metric": self.affinity_metric}
+
+    def status(self):
+        with self.lock:
+            return {"cycles": self.cycles, "solves": self.solves, "incremental_solves": self.incremental_solves,
+                    "interval": self.interval, "drift_threshold": self.drift_threshold,
+                    "baseline_fraction": self.baseline_fraction, "last_cycle": self.last_cycle,
+                    "history": list(self.history)}
+
+    # Controller gauges and the spans and counters of Instrumentation
+    def prometheus_text(self):
+        with self.lock:
+            values = {"controller_cycles_total": self.cycles, "controller_solves_total": self.solves,
+                      "controller_incremental_solves_total": self.incremental_solves,
+                      "controller_cross_host_traffic": self.last_cycle.get("cross_host_traffic"),
+                      "controller_cross_host_fraction": self.last_cycle.get("cross_host_fraction"),
+                      "controller_baseline_fraction": self.baseline_fraction,
+                      "controller_plan_cross_host_traffic": self.plan_scores.get("cross_host_traffic")}
+            for phase, seconds in self.last_cycle.get("timings", {}).items():
+                values["controller_" + phase + "_seconds"] = seconds
+        lines = []
+        for name in sorted(values):
+            if values[name] is not None:
+                lines.append(Instrumentation.metric_name(name) + " " + repr(float(values[name])))
+        return "\n".join(lines) + "\n" + Instrumentation.prometheus_text()
+
+    # HTTP endpoint in a thread of its own
+    def start_server(self):
+        handler = type("Placement_Controller_Handler", (Controller_Handler,), {"controller": self})
+        self.server = ThreadingHTTPServer((self.address, self.port), handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="controller-http", daemon=True).start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    # Cycles until stop() - cycles limits them (None runs for ever)
+    def run(self, cycles=None):
+        self.start_server()
+        try:
+            while not self.stop_event.is_set() and (cycles is None or self.cycles < cycles):
+                start_time = time.time()
+                self.cycle()
+                self.stop_event.wait(max(self.interval - (time.time() - start_time), 0.0))
+        finally:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(description="Keep the service placement of a live cluster up to date and serve "
+                                                 "the latest plan over HTTP")
+    parser.add_argument("--host", required=True, help="external IP of one VM of the cluster")
+    parser.add_argument("--algorithm", default="heuristic_first_fit",
+                        choices=Portfolio_Runner.pipelines + ["spectral_partition", "portfolio"])
+    parser.add_argument("--affinity-metric", default="requests", choices=sorted(affinity_metrics))
+    parser.add_argument("--interval", type=float, default=60.0, help="seconds between two refreshes")
+    parser.add_argument("--drift-threshold", type=float, default=0.1,
+                        help="relative change of the cross-host fraction of the traffic that triggers a new solve")
+    parser.add_argument("--full-solve-every", type=int, default=0,
+                        help="solves between two full solves - 0 solves fully only when needed")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--portfolio-budget", type=float, default=60.0)
+    parser.add_argument("--address", default="127.0.0.1", help="address of the HTTP endpoint")
+    parser.add_argument("--port", type=int, default=8080, help="port of the HTTP endpoint")
+    parser.add_argument("--kiali-port", type=int, default=32002)
+    parser.add_argument("--prometheus-port", type=int, default=32003)
+    parser.add_argument("--namespace", default="default")
+    parser.add_argument("--instrumentation", action="store_true", help="record spans and counters of every phase")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    arguments = parse_arguments(argv)
+    if arguments.instrumentation:
+        Instrumentation.enable()
+    collector = GCP_Metrics(arguments.host, arguments.kiali_port, arguments.prometheus_port, arguments.namespace,
+                            grouped_usage_queries=True)
+    controller = Placement_Controller(collector, arguments.algorithm, affinity_metrics[arguments.affinity_metric],
+                                      {"seed": arguments.seed}, arguments.interval, arguments.drift_threshold,
+                                      arguments.full_solve_every, arguments.portfolio_budget, arguments.address,
+                                      arguments.port)
+    try:
+        controller.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
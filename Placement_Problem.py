@@ -0,0 +1,251 @@
+######################################################
+# Integer indexed placement problem shared by all algorithms
+# Services and hosts get dense integer ids, resources are kept in NumPy arrays and affinities in CSR form
+# Input: GCP_Metrics collector (or the same dictionaries) and the affinity metric
+# Output: Problem instance with adapters back to the name keyed dictionaries
+# Bin_Packing, Binary_Partition, K_Partition and Heuristic_First_Fit run on the arrays of a problem, built once per
+# pipeline and shared by every solve - Edges keep the order of the affinities dictionary so that results do not
+# change with the representation
+######################################################
+import numpy as np
+from scipy import sparse
+
+
+class Placement_Problem:
+    def __init__(self, service_list, host_list, pod_request_cpu, pod_request_ram, node_available_cpu,
+                 node_available_ram, node_initial_available_cpu, node_initial_available_ram, node_initial_cpu_usage,
+                 node_initial_ram_usage, service_affinities, max_cpu_allocation, max_ram_allocation, current_placement):
+        # Services - Unique names in order of appearance, the service list keeps one entry per pod
+        self.service_list = list(service_list)
+        self.services = []
+        self.service_to_id = {}
+        names = list(service_list) + list(pod_request_cpu)
+        for source in service_affinities:
+            names.append(source)
+            names.extend(service_affinities[source])
+        for host in current_placement:
+            names.extend(current_placement[host])
+        for service in names:
+            if service not in self.service_to_id:
+                self.service_to_id[service] = len(self.services)
+                self.services.append(service)
+        self.number_of_services = len(self.services)
+
+        # Hosts
+        self.hosts = list(host_list)
+        self.host_to_id = {}
+        for index, host in enumerate(self.hosts):
+            self.host_to_id[host] = index
+        self.number_of_hosts = len(self.hosts)
+
+        # Resource demands of services - Services without requests demand nothing
+        self.service_cpu = np.zeros(self.number_of_services)
+        self.service_ram = np.zeros(self.number_of_services)
+        for service in pod_request_cpu:
+            self.service_cpu[self.service_to_id[service]] = float(pod_request_cpu[service])
+            self.service_ram[self.service_to_id[service]] = float(pod_request_ram[service])
+
+        # Host resources - Available with the current pods, available and used without them
+        self.node_available_cpu = self.host_array(node_available_cpu)
+        self.node_available_ram = self.host_array(node_available_ram)
+        self.node_initial_available_cpu = self.host_array(node_initial_available_cpu)
+        self.node_initial_available_ram = self.host_array(node_initial_available_ram)
+        self.node_initial_cpu_usage = self.host_array(node_initial_cpu_usage)
+        self.node_initial_ram_usage = self.host_array(node_initial_ram_usage)
+        self.max_cpu_allocation = float(max_cpu_allocation)
+        self.max_ram_allocation = float(max_ram_allocation)
+
+        # Affinities - Edges in the order of the dictionary, the directed matrix keeps the source->dest order and
+        # the symmetric one sums both directions
+        rows = []
+        cols = []
+        weights = []
+        self.affinity_sources = np.zeros(self.number_of_services, dtype=bool)  # Keys of the affinities dictionary
+        for source in service_affinities:
+            self.affinity_sources[self.service_to_id[source]] = True
+            for dest in service_affinities[source]:
+                rows.append(self.service_to_id[source])
+                cols.append(self.service_to_id[dest])
+                weights.append(float(service_affinities[source][dest]))
+        self.edge_source = np.array(rows, dtype=np.int64)
+        self.edge_dest = np.array(cols, dtype=np.int64)
+        self.edge_weight = np.array(weights, dtype=float)
+        # Decreasing affinity with ties in dictionary order as in GCP_Metrics.affinities_collection
+        self.edge_order = np.argsort(-self.edge_weight, kind="stable")
+        shape = (self.number_of_services, self.number_of_services)
+        self.affinity_directed = sparse.csr_matrix((self.edge_weight, (self.edge_source, self.edge_dest)), shape=shape)
+        self.affinity = (self.affinity_directed + self.affinity_directed.T).tocsr()
+
+        # Current placement - One entry per pod so that replicas are kept, pods of unknown hosts are left out
+        pod_service = []
+        pod_host = []
+        pod_position = []  # Position of the pod in the services of its host
+        for host in current_placement:
+            if host not in self.host_to_id:
+                continue
+            for position, service in enumerate(current_placement[host]):
+                pod_service.append(self.service_to_id[service])
+                pod_host.append(self.host_to_id[host])
+                pod_position.append(position)
+        self.pod_service = np.array(pod_service, dtype=np.int64)
+        self.pod_host = np.array(pod_host, dtype=np.int64)
+        self.pod_position = np.array(pod_position, dtype=np.int64)
+        self.replicas = np.bincount(self.pod_service, minlength=self.number_of_services)
+        self.current_assignment = np.full(self.number_of_services, -1, dtype=np.int64)
+        self.current_assignment[self.pod_service] = self.pod_host
+
+    # Build the problem from a collector with the chosen affinity metric (requests per second by default)
+    @staticmethod
+    def from_metrics(collector, service_affinities=None):
+        if service_affinities is None:
+            service_affinities = collector.service_affinities
+        return Placement_Problem(collector.service_list, collector.host_list, collector.current_pod_request_cpu,
+                                 collector.current_pod_request_ram, collector.node_available_cpu,
+                                 collector.node_available_ram, collector.node_initial_available_cpu,
+                                 collector.node_initial_available_ram, collector.node_initial_cpu_usage,
+                                 collector.node_initial_ram_usage, service_affinities, collector.max_cpu_allocation,
+                                 collector.max_ram_allocation, collector.current_placement)
+
+    def host_array(self, values):
+        array = np.zeros(self.number_of_hosts)
+        for host in values:
+            if host in self.host_to_id:
+                array[self.host_to_id[host]] = float(values[host])
+        return array
+
+    # Adapters back to name keyed dictionaries
+    def service_names(self, service_ids):
+        return [self.services[service] for service in service_ids]
+
+    def host_values(self, array):
+        values = {}
+        for host in self.hosts:
+            values[host] = float(array[self.host_to_id[host]])
+        return values
+
+    def request_dicts(self):
+        pod_request_cpu = {}
+        pod_request_ram = {}
+        for index, service in enumerate(self.services):
+            pod_request_cpu[service] = float(self.service_cpu[index])
+            pod_request_ram[service] = float(self.service_ram[index])
+        return pod_request_cpu, pod_request_ram
+
+    # Pattern: {"source1": {"dest1": value, ...}, ...} as in GCP_Metrics.service_affinities, in the same order
+    def affinity_dict(self):
+        affinities = {}
+        for source, dest, weight in zip(self.edge_source.tolist(), self.edge_dest.tolist(), self.edge_weight.tolist()):
+            if self.services[source] not in affinities:
+                affinities[self.services[source]] = {}
+            affinities[self.services[source]][self.services[dest]] = weight
+        return affinities
+
+    # Pattern: {"source->dest": value, ...} sorted in decent order as in GCP_Metrics.affinities_collection
+    def affinity_collection(self):
+        collection = {}
+        for index in self.edge_order.tolist():
+            collection[self.services[self.edge_source[index]] + "->" + self.services[self.edge_dest[index]]] = float(
+                self.edge_weight[index])
+        return collection
+
+    # Pattern: {"host": [services], ...} with one entry per pod
+    def current_placement_dict(self):
+        placement = {}
+        for host in self.hosts:
+            placement[host] = []
+        for service, host in zip(self.pod_service, self.pod_host):
+            placement[self.hosts[host]].append(self.services[service])
+        return placement
+
+    # Host id of every service in a placement dictionary (-1 for services that are not placed)
+    def assignment_from_placement(self, placement):
+        assignment = np.full(self.number_of_services, -1, dtype=np.int64)
+        for host in placement:
+            for service in placement[host]:
+                assignment[self.service_to_id[service]] = self.host_to_id[host]
+        return assignment
+
+    # Placement dictionary of an assignment array - Only hosts with services are kept as in Bin_Packing
+    def placement_from_assignment(self, assignment):
+        placement = {}
+        for service, host in enumerate(assignment):
+            if host < 0:
+                continue
+            if self.hosts[host] not in placement:
+                placement[self.hosts[host]] = []
+            placement[self.hosts[host]].append(self.services[service])
+        return placement
+
+    # Part id of every service in an app_partition dictionary
+    def labels_from_partition(self, app_partition):
+        labels = np.full(self.number_of_services, -1, dtype=np.int64)
+        for index, part in enumerate(app_partition):
+            for service in app_partition[part]:
+                labels[self.service_to_id[service]] = index
+        return labels
+
+    # Pattern: {"1": [services], "2": [...], ...} as consumed by Bin_Packing
+    def partition_from_labels(self, labels):
+        app_partition = {}
+        parts = {}
+        for service, label in enumerate(labels):
+            if label < 0:
+                continue
+            if label not in parts:
+                parts[label] = str(len(parts) + 1)
+                app_partition[parts[label]] = []
+            app_partition[parts[label]].append(self.services[service])
+        return app_partition
+
+    # Ids of a list of services
+    def service_ids(self, services):
+        return np.array([self.service_to_id[service] for service in services], dtype=np.int64)
+
+    # Concatenation of the ranges [start, start + count)
+    @staticmethod
+    def expand_ranges(starts, counts):
+        total = int(counts.sum())
+        offsets = np.repeat(np.cumsum(counts) - counts, counts)
+        return np.repeat(starts, counts) + np.arange(total, dtype=np.int64) - offsets
+
+    # Part of the services in order of first appearance and mask of the edges between them
+    def part_mask(self, services):
+        local = np.full(self.number_of_services, -1, dtype=np.int64)
+        part_services = []
+        for service in services:
+            service_id = self.service_to_id[service]
+            if local[service_id] < 0:
+                local[service_id] = len(part_services)
+                part_services.append(service)
+        return part_services, local, (local[self.edge_source] >= 0) & (local[self.edge_dest] >= 0)
+
+    # Undirected edges (u, v, weight) of the part with local ids - Both directions are summed, self loops are
+    # dropped and edges keep the order of their first direction in the affinities dictionary
+    def part_edges(self, services):
+        part_services, local, mask = self.part_mask(services)
+        u = local[self.edge_source[mask]]
+        v = local[self.edge_dest[mask]]
+        weights = self.edge_weight[mask]
+        keep = u != v
+        low = np.minimum(u[keep], v[keep])
+        high = np.maximum(u[keep], v[keep])
+        keys, first, inverse = np.unique(low * max(len(part_services), 1) + high, return_index=True,
+                                         return_inverse=True)
+        summed = np.bincount(inverse, weights=weights[keep], minlength=keys.size)
+        order = np.argsort(first, kind="stable")
+        return part_services, (low[first[order]], high[first[order]], summed[order])
+
+    # Graph {source: [dests]} and affinities {source: {dest: value}} of the part in dictionary order
+    def part_affinities(self, services):
+        _, _, mask = self.part_mask(services)
+        temp_graph = {}
+        part_service_traffic = {}
+        for source, dest, weight in zip(self.edge_source[mask].tolist(), self.edge_dest[mask].tolist(),
+                                        self.edge_weight[mask].tolist()):
+            source = self.services[source]
+            if source not in temp_graph:
+                temp_graph[source] = []
+                part_service_traffic[source] = {}
+            temp_graph[source].append(self.services[dest])
+            part_service_traffic[source][self.services[dest]] = weight
+        return temp_graph, part_service_traffic
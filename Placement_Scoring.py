@@ -0,0 +1,164 @@
+######################################################
+# Batch scoring of candidate placements
+# Candidates are rows of an int array (candidates x services) holding the host index of every service (-1 unplaced)
+# and every metric is computed for all rows at once
+# Services of the application (service list, resource demands or current placement) left unplaced count every
+# edge they have as cross-host, so a partial placement never scores better than a complete one - Endpoints that are
+# only seen in the traffic (e.g. clients outside the cluster) are never placed and their edges are not counted
+# Input: Services, Hosts, Traffic in bytes, Service Affinities, Resource demands, VM resources, Current placement
+# Output: Cross-host bytes and request rate, CPU and RAM imbalance, nodes used, migrations and unplaced services of
+# every candidate
+######################################################
+import numpy as np
+
+
+class Placement_Scoring:
+    chunk_cells = 2 ** 24  # Candidates x edges compared at once - Bounds the memory of large batches
+
+    def __init__(self, service_list, host_list, traffic_requested_bytes, service_affinities, pod_request_cpu,
+                 pod_request_ram, node_initial_cpu_usage, node_initial_ram_usage, node_initial_available_cpu,
+                 node_initial_available_ram, current_placement):
+        # Services - Unique names in order of appearance in any of the inputs
+        self.services = []
+        self.service_to_id = {}
+        names = list(service_list) + list(pod_request_cpu)
+        for traffic in (traffic_requested_bytes, service_affinities):
+            for source in traffic:
+                names.append(source)
+                names.extend(traffic[source])
+        for host in current_placement:
+            names.extend(current_placement[host])
+        for service in names:
+            if service not in self.service_to_id:
+                self.service_to_id[service] = len(self.services)
+                self.services.append(service)
+        self.number_of_services = len(self.services)
+
+        # Services that every placement must hold
+        self.placeable = np.zeros(self.number_of_services, dtype=bool)
+        for service in list(service_list) + list(pod_request_cpu):
+            self.placeable[self.service_to_id[service]] = True
+        for host in current_placement:
+            for service in current_placement[host]:
+                self.placeable[self.service_to_id[service]] = True
+
+        self.hosts = list(host_list)
+        self.host_to_id = {}
+        for index, host in enumerate(self.hosts):
+            self.host_to_id[host] = index
+        self.number_of_hosts = len(self.hosts)
+
+        # Directed edges of both traffic metrics
+        self.bytes_source, self.bytes_dest, self.bytes_weight = self.edge_arrays(traffic_requested_bytes)
+        self.rate_source, self.rate_dest, self.rate_weight = self.edge_arrays(service_affinities)
+
+        # Resource demands and VM capacity - Capacity is the usage plus the availability without the application pods
+        self.service_cpu = np.zeros(self.number_of_services)
+        self.service_ram = np.zeros(self.number_of_services)
+        for service in pod_request_cpu:
+            self.service_cpu[self.service_to_id[service]] = float(pod_request_cpu[service])
+            self.service_ram[self.service_to_id[service]] = float(pod_request_ram[service])
+        self.base_cpu = self.host_array(node_initial_cpu_usage)
+        self.base_ram = self.host_array(node_initial_ram_usage)
+        self.capacity_cpu = self.base_cpu + self.host_array(node_initial_available_cpu)
+        self.capacity_ram = self.base_ram + self.host_array(node_initial_available_ram)
+
+        self.current_assignment = self.assignment(current_placement)
+
+    # Build the scoring from a collector with the chosen affinity metric (requests per second by default)
+    @staticmethod
+    def from_metrics(collector, service_affinities=None):
+        if service_affinities is None:
+            service_affinities = collector.service_affinities
+        return Placement_Scoring(collector.service_list, collector.host_list, collector.traffic_requested_bytes,
+                                 service_affinities, collector.current_pod_request_cpu,
+                                 collector.current_pod_request_ram, collector.node_initial_cpu_usage,
+                                 collector.node_initial_ram_usage, collector.node_initial_available_cpu,
+                                 collector.node_initial_available_ram, collector.current_placement)
+
+    def edge_arrays(self, traffic):
+        sources = []
+        dests = []
+        weights = []
+        for source in traffic:
+            for dest in traffic[source]:
+                sources.append(self.service_to_id[source])
+                dests.append(self.service_to_id[dest])
+                weights.append(float(traffic[source][dest]))
+        return np.array(sources, dtype=np.int64), np.array(dests, dtype=np.int64), np.array(weights, dtype=float)
+
+    def host_array(self, values):
+        array = np.zeros(self.number_of_hosts)
+        for host in values:
+            if host in self.host_to_id:
+                array[self.host_to_id[host]] = float(values[host])
+        return array
+
+    # Host index of every service in a placement dictionary - With replicas the last pod wins
+    def assignment(self, placement):
+        assignment = np.full(self.number_of_services, -1, dtype=np.int64)
+        for host in placement:
+            if host not in self.host_to_id:
+                continue
+            for service in placement[host]:
+                if service in self.service_to_id:
+                    assignment[self.service_to_id[service]] = self.host_to_id[host]
+        return assignment
+
+    # Candidate array of many placement dictionaries
+    def assignments(self, placements):
+        return np.array([self.assignment(placement) for placement in placements], dtype=np.int64).reshape(
+            len(placements), self.number_of_services)
+
+    # Traffic of edges whose services are placed on different hosts or that have an unplaced service
+    def cross_host_traffic(self, assignments, sources, dests, weights):
+        scores = np.zeros(assignments.shape[0])
+        if weights.size == 0:
+            return scores
+        step = max(1, Placement_Scoring.chunk_cells // weights.size)
+        for start in range(0, assignments.shape[0], step):
+            source_hosts = assignments[start:start + step, sources]
+            dest_hosts = assignments[start:start + step, dests]
+            source_unplaced = (source_hosts < 0) & self.placeable[sources]
+            dest_unplaced = (dest_hosts < 0) & self.placeable[dests]
+            crossing = ((source_hosts != dest_hosts) & (source_hosts >= 0) & (dest_hosts >= 0)) | source_unplaced | \
+                dest_unplaced
+            scores[start:start + step] = crossing @ weights
+        return scores
+
+    # Load of every host for every candidate - (candidates x hosts)
+    def host_loads(self, assignments, demands):
+        candidates = assignments.shape[0]
+        placed = assignments >= 0
+        cells = (assignments + self.number_of_hosts * np.arange(candidates)[:, None])[placed]
+        weights = np.broadcast_to(demands, assignments.shape)[placed]
+        return np.bincount(cells, weights=weights, minlength=candidates * self.number_of_hosts).reshape(
+            candidates, self.number_of_hosts)
+
+    # Standard deviation of the utilization of the hosts
+    @staticmethod
+    def imbalance(base, loads, capacity):
+        utilization = np.zeros(loads.shape)
+        usable = capacity > 0.0
+        utilization[:, usable] = (base[usable] + loads[:, usable]) / capacity[usable]
+        return utilization.std(axis=1)
+
+    # Pattern: {"metric": array with one value per candidate}
+    def score(self, assignments):
+        assignments = np.atleast_2d(np.asarray(assignments, dtype=np.int64))
+        pods = self.host_loads(assignments, np.ones(self.number_of_services))
+        moved = (assignments != self.current_assignment) & (assignments >= 0) & (self.current_assignment >= 0)
+        return {"cross_host_bytes": self.cross_host_traffic(assignments, self.bytes_source, self.bytes_dest,
+                                                            self.bytes_weight),
+                "cross_host_rate": self.cross_host_traffic(assignments, self.rate_source, self.rate_dest,
+                                                           self.rate_weight),
+                "cpu_imbalance": self.imbalance(self.base_cpu, self.host_loads(assignments, self.service_cpu),
+                                                self.capacity_cpu),
+                "ram_imbalance": self.imbalance(self.base_ram, self.host_loads(assignments, self.service_ram),
+                                                self.capacity_ram),
+                "nodes_used": (pods > 0).sum(axis=1),
+                "migrations": moved.sum(axis=1),
+                "unplaced": ((assignments < 0) & self.placeable).sum(axis=1)}
+
+    def score_placements(self, placements):
+        return self.score(self.assignments(placements))
@@ -0,0 +1,228 @@
+######################################################
+# Portfolio of placement algorithms run on the same cluster state at the same time
+# Every pipeline runs in its own process under a shared wall-clock budget, the placements returned in time are
+# scored with one objective (cross-host traffic of the chosen affinity metric) and the best one is kept
+# Affinity metrics: requests per second, mean bytes exchanged or request rate x response time (Latency_Objective)
+# The Placement_Problem of the cluster state is built once and every pipeline runs on its arrays
+# Input: GCP_Metrics (collected or replayed), Affinity metric, Time budget
+# Output: Best placement solution and a timing and quality table of every algorithm
+######################################################
+import multiprocessing
+import time
+
+import numpy as np
+
+from Alpha_Search import Alpha_Search, solve_alpha
+from Bin_Packing import Bin_Packing
+from Binary_Partition import Binary_Partition
+from Bisecting_K_means import Bisecting_K_means
+from Cluster_Snapshot import Cluster_Snapshot
+from Heuristic_First_Fit import Heuristic_First_Fit
+from K_Partition import K_Partition
+from Latency_Objective import Latency_Objective
+from Placement_Problem import Placement_Problem
+from Placement_Scoring import Placement_Scoring
+from Spectral_Partition import Spectral_Partition
+
+
+# Run one pipeline on a collector rebuilt from its state and the problem of the portfolio - Returns the name,
+# the placement solution, the seconds it took and the error message (None if it finished)
+def run_pipeline(arguments):
+    name, state, affinity_metric, options, problem = arguments
+    start_time = time.time()
+    try:
+        collector = Cluster_Snapshot.from_state(state)
+        placement = getattr(Portfolio_Runner, name)(collector, affinity_metric, options, problem)
+        return name, placement, time.time() - start_time, None
+    except Exception as error:
+        return name, {}, time.time() - start_time, repr(error)
+
+
+class Portfolio_Runner:
+    pipelines = ["heuristic_first_fit", "binary_partition", "k_partition", "bisecting_k_means"]
+    # Engines and seed of the partition algorithms, alpha policy ("search", "linear" or "fixed" at alpha)
+    # and K of Bisecting K-Means (None sweeps K) - Pipelines already run in their own process
+    default_options = {"binary_partition_engine": "stoer_wagner", "partition_engine": "karger_stein", "seed": None,
+                       "alpha_policy": "search", "alpha": None, "k_value": None}
+
+    def __init__(self, collector, affinity_metric="service_affinities", time_budget=60.0, pipelines=None,
+                 options=None):
+        self.collector = collector
+        self.affinity_metric = affinity_metric  # "service_affinities", "total_affinities_bytes" or "latency_affinities"
+        self.time_budget = time_budget  # Seconds shared by all the pipelines
+        self.pipeline_names = list(pipelines) if pipelines is not None else list(Portfolio_Runner.pipelines)
+        if not self.pipeline_names:
+            raise ValueError("The portfolio needs at least one pipeline")
+        self.options = dict(Portfolio_Runner.default_options)
+        if options is not None:
+            self.options.update(options)
+        self.results = []  # Pattern: [{"algorithm": name, "status": ..., "seconds": ..., scores...}]
+        self.best_algorithm = None
+        self.placement = {}
+
+    # Pattern: {"source": {"dest": value}} of the metric - Latency affinities are built from the response times
+    @staticmethod
+    def affinities(collector, affinity_metric):
+        if affinity_metric == "latency_affinities":
+            return Latency_Objective.from_metrics(collector).latency_affinities()
+        return getattr(collector, affinity_metric)
+
+    # Problem of the collector with the affinities of the metric - Pipelines build it when they are not given one
+    @staticmethod
+    def problem(collector, affinity_metric):
+        return Placement_Problem.from_metrics(collector, Portfolio_Runner.affinities(collector, affinity_metric))
+
+    # Heuristic Based Affinity Algorithm - A modified First-Fit algorithm
+    # Affinities are visited in the decreasing order of the collection of the metric
+    @staticmethod
+    def heuristic_first_fit(collector, affinity_metric, options, problem=None):
+        if problem is None:
+            problem = Portfolio_Runner.problem(collector, affinity_metric)
+        heuristic_first_fit = Heuristic_First_Fit.from_problem(problem)
+        heuristic_first_fit.heuristic_placement()
+        return heuristic_first_fit.final_placement
+
+    # Arguments of Bin Packing after the partition - The packing reads them from the problem
+    @staticmethod
+    def packing_arguments(collector, problem):
+        return (collector.current_placement, collector.node_initial_cpu_usage, collector.node_initial_ram_usage,
+                collector.node_initial_available_cpu, collector.node_initial_available_ram,
+                collector.current_pod_request_cpu, collector.current_pod_request_ram, collector.host_list, None,
+                problem)
+
+    # Partition - Bin Packing with the search of the largest alpha, the sweep from 1.0 down or a fixed alpha
+    @staticmethod
+    def alpha_search(collector, affinity_metric, partition_class, partition_options, options, problem=None):
+        service_affinities = Portfolio_Runner.affinities(collector, affinity_metric)
+        if problem is None:
+            problem = Placement_Problem.from_metrics(collector, service_affinities)
+        partition_arguments = (collector.current_pod_request_cpu, collector.current_pod_request_ram,
+                               service_affinities, collector.max_ram_allocation,
+                               collector.max_cpu_allocation, collector.host_list, collector.service_list)
+        packing_arguments = Portfolio_Runner.packing_arguments(collector, problem)
+        companions = {'cartservice': 'redis-cart'}
+        if options["alpha_policy"] == "search":
+            alpha_search = Alpha_Search(partition_class, partition_arguments, partition_options, packing_arguments,
+                                        companions=companions, problem=problem)
+            return alpha_search.search()
+        if options["alpha_policy"] == "fixed":
+            alphas = [float(options["alpha"])]
+        elif options["alpha_policy"] == "linear":
+            alphas = [round(1.0 - step * 0.1, 10) for step in range(11)]
+        else:
+            raise ValueError("Unknown alpha policy: " + str(options["alpha_policy"]))
+        # solve_alpha returns {} unless every part of the partition was packed
+        for index, alpha in enumerate(alphas):
+            placement = solve_alpha((index, alpha, partition_class, partition_arguments, partition_options, None,
+                                     packing_arguments, companions, problem))[3]
+            if bool(placement):
+                return placement
+        return {}
+
+    @staticmethod
+    def binary_partition(collector, affinity_metric, options, problem=None):
+        return Portfolio_Runner.alpha_search(collector, affinity_metric, Binary_Partition,
+                                             {"engine": options["binary_partition_engine"], "seed": options["seed"],
+                                              "processes": 1}, options, problem)
+
+    @staticmethod
+    def k_partition(collector, affinity_metric, options, problem=None):
+        return Portfolio_Runner.alpha_search(collector, affinity_metric, K_Partition,
+                                             {"engine": options["partition_engine"], "seed": options["seed"],
+                                              "processes": 1}, options, problem)
+
+    @staticmethod
+    def spectral_partition(collector, affinity_metric, options, problem=None):
+        return Portfolio_Runner.alpha_search(collector, affinity_metric, Spectral_Partition, {"seed": options["seed"]},
+                                             options, problem)
+
+    # Bisecting K-Means - Bin Packing with the K sweep or the given K
+    @staticmethod
+    def bisecting_k_means(collector, affinity_metric, options, problem=None):
+        service_affinities = Portfolio_Runner.affinities(collector, affinity_metric)
+        if problem is None:
+            problem = Placement_Problem.from_metrics(collector, service_affinities)
+        random_generator = np.random.default_rng(options["seed"]) if options["seed"] is not None else None
+        bkm = Bisecting_K_means(service_affinities, collector.service_list, random_generator)
+        if options["k_value"] is None:
+            return bkm.find_best_k(Portfolio_Runner.packing_arguments(collector, problem))
+        bkm.find_bistecting_K_means_partitions(options["k_value"])
+        bin_packing = Bin_Packing.from_problem(problem, bkm.app_clusters)
+        return bin_packing.heuristic_packing()
+
+    def run(self):
+        state = Cluster_Snapshot.state(self.collector)
+        # The problem is built once for every pipeline
+        service_affinities = Portfolio_Runner.affinities(self.collector, self.affinity_metric)
+        problem = Placement_Problem.from_metrics(self.collector, service_affinities)
+        tasks = [(name, state, self.affinity_metric, self.options, problem) for name in self.pipeline_names]
+        start_time = time.time()
+        finished = {}
+
+        # Pipelines still running when the budget is over are terminated with the pool
+        pool = multiprocessing.Pool(len(tasks))
+        try:
+            pending = [(task[0], pool.apply_async(run_pipeline, (task,))) for task in tasks]
+            for name, result in pending:
+                remaining = self.time_budget - (time.time() - start_time)
+                try:
+                    finished[name] = result.get(timeout=max(remaining, 0.0))
+                except multiprocessing.TimeoutError:
+                    pass
+        finally:
+            pool.terminate()
+            pool.join()
+
+        # Score every placement returned in time in one batch
+        scored = [name for name in self.pipeline_names if name in finished and bool(finished[name][1])]
+        placement_scoring = Placement_Scoring.from_metrics(self.collector, service_affinities)
+        scores = placement_scoring.score_placements([finished[name][1] for name in scored])
+
+        self.results = []
+        self.best_algorithm = None
+        self.placement = {}
+        best_key = None
+        for name in self.pipeline_names:
+            result = {"algorithm": name, "status": "timeout", "seconds": None, "cross_host_traffic": None,
+                      "cross_host_bytes": None, "nodes_used": None, "migrations": None, "unplaced": None}
+            if name in finished:
+                result["seconds"] = finished[name][2]
+                if finished[name][3] is not None:
+                    result["status"] = "error: " + finished[name][3]
+                elif not bool(finished[name][1]):
+                    result["status"] = "no solution"
+                else:
+                    index = scored.index(name)
+                    result["status"] = "ok"
+                    result["cross_host_traffic"] = float(scores["cross_host_rate"][index])
+                    result["cross_host_bytes"] = float(scores["cross_host_bytes"][index])
+                    result["nodes_used"] = int(scores["nodes_used"][index])
+                    result["migrations"] = int(scores["migrations"][index])
+                    result["unplaced"] = int(scores["unplaced"][index])
+                    # Fewest unplaced services, then least cross-host traffic, then fewest migrations
+                    key = (result["unplaced"], result["cross_host_traffic"], result["migrations"])
+                    if best_key is None or key < best_key:
+                        best_key = key
+                        self.best_algorithm = name
+                        self.placement = finished[name][1]
+            self.results.append(result)
+        return self.placement
+
+    def print_report(self):
+        columns = ["algorithm", "status", "seconds", "cross_host_traffic", "cross_host_bytes", "nodes_used",
+                   "migrations", "unplaced"]
+        print("#" * 100)
+        print("Portfolio of algorithms - Time budget " + str(self.time_budget) + " seconds")
+        print("-" * 40)
+        print("".join(column.ljust(22) for column in columns))
+        for result in self.results:
+            values = []
+            for column in columns:
+                value = result[column]
+                if isinstance(value, float):
+                    value = format(value, '.3f')
+                values.append(str(value if value is not None else "-").ljust(22))
+            print("".join(values))
+        print("-" * 40)
+        print("Best algorithm: " + str(self.best_algorithm))
+        print("#" * 100)
@@ -1,51 +1,174 @@
+######################################################
+# Comparison of the response times between services over many runs
+# Runs are joined by their (source, dest) edge into one array (runs x edges, NaN where an edge is missing),
+# every file is reduced to one row as soon as it is read and all statistics are computed on the array
+# Input: Response time files of the runs in the format of GCP_Metrics ({"source": {"dest": ms}}), baseline run
+# Output: Overall and per-edge deltas against the baseline run and p50/p95/p99 latencies
+######################################################
+import argparse
 import json
-import math
-
-# Opening JSON file - Initial Response Times
-with open('initial_response_times_with_stressing.json') as json_file:
-    firstdict = json.load(json_file)
-
-# Opening JSON file - Response Times after new Placement
-with open('final_markov_with_bin_packing_with_stressing.json') as json_file:
-    seconddict = json.load(json_file)
-
-firstsum = 0
-# Calculate Initial total repsone time sum
-listofcouples = []
-for x in sorted(firstdict.keys()):
-    for y in sorted(firstdict[x].keys()):
-        couples = []
-        print(x + "->" + y)
-        firstsum += int(firstdict[x][y])
-        couples.append(int(firstdict[x][y]))
-        listofcouples.append(couples)
-
-counter = 0
-secondsum = 0
-# Calculate total repsone time sum after new placement
-for x in sorted(seconddict.keys()):
-    for y in sorted(seconddict[x].keys()):
-        secondsum += int(seconddict[x][y])
-        listofcouples[counter].append(int(seconddict[x][y]))
-        counter += 1
-
-print(listofcouples)
-sqsum = 0
-absdifsum = 0
-for i in listofcouples:
-    sqsum += math.pow(i[1] - i[0], 2)
-    absdifsum += abs(i[1] - i[0])
-
-variation = firstsum - secondsum
-print("Variation after placement of the overall response time is: " + str(variation))
-
-print("Mean Squared Error: " + str(sqsum / len(listofcouples)))
-
-print("Sum of Absolute Differences:" + str(absdifsum))
-
-if variation > 0:
-    print("Reduced " + str(variation) + " ms")
-elif variation < 0:
-    print("Increased " + str(abs(variation)) + " ms")
-else:
-    print("No change was noticed!")
+import os
+import sys
+import warnings
+
+import numpy as np
+
+
+class ResponseTime:
+    percentiles = [50, 95, 99]
+
+    def __init__(self):
+        self.edges = []  # Pattern: ["source->dest"] in order of first appearance
+        self.edge_to_index = {}
+        self.runs = []  # Names of the runs
+        self.rows = []  # One array per run - Edges found by later runs are missing from earlier rows
+
+    # Files of the given files and directories - Directories are listed in name order
+    @staticmethod
+    def files(paths):
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                for name in sorted(os.listdir(path)):
+                    if name.endswith(".json"):
+                        files.append(os.path.join(path, name))
+            else:
+                files.append(path)
+        return files
+
+    @staticmethod
+    def value(response_time):
+        try:
+            return float(response_time)
+        except (TypeError, ValueError):
+            return np.nan
+
+    # NaN is written as null in the JSON results
+    @staticmethod
+    def number(value):
+        return None if np.isnan(value) else float(value)
+
+    @staticmethod
+    def milliseconds(value):
+        return "-" if value is None else format(value, '.2f')
+
+    def add_run(self, name, response_times):
+        indexes = []
+        values = []
+        for source in response_times:
+            for dest in response_times[source]:
+                key = source + "->" + dest
+                if key not in self.edge_to_index:
+                    self.edge_to_index[key] = len(self.edges)
+                    self.edges.append(key)
+                indexes.append(self.edge_to_index[key])
+                values.append(self.value(response_times[source][dest]))
+        row = np.full(len(self.edges), np.nan)
+        row[np.array(indexes, dtype=np.int64)] = values
+        self.runs.append(name)
+        self.rows.append(row)
+
+    def load(self, path):
+        with open(path) as json_file:
+            self.add_run(path, json.load(json_file))
+
+    # Pattern: runs x edges - NaN where a run has no response time for an edge
+    def matrix(self):
+        matrix = np.full((len(self.rows), len(self.edges)), np.nan)
+        for run, row in enumerate(self.rows):
+            matrix[run, :row.size] = row
+        return matrix
+
+    # Statistics of every run and every edge against the baseline run - Only edges of both runs are compared
+    def compare(self, baseline=0):
+        matrix = self.matrix()
+        deltas = matrix - matrix[baseline]
+        common = ~np.isnan(deltas)
+        count = common.sum(axis=1)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)  # All-NaN runs and edges give NaN
+            run_percentiles = np.nanpercentile(matrix, ResponseTime.percentiles, axis=1) if matrix.size else \
+                np.full((len(ResponseTime.percentiles), len(self.runs)), np.nan)
+            edge_percentiles = np.nanpercentile(matrix, ResponseTime.percentiles, axis=0) if matrix.size else \
+                np.full((len(ResponseTime.percentiles), len(self.edges)), np.nan)
+            edge_mean_delta = np.nanmean(np.delete(deltas, baseline, axis=0), axis=0) if len(self.runs) > 1 else \
+                np.full(len(self.edges), np.nan)
+
+        baseline_sum = np.where(common, matrix[baseline], 0.0).sum(axis=1)
+        run_sum = np.where(common, matrix, 0.0).sum(axis=1)
+        filled = np.where(common, deltas, 0.0)
+        runs = []
+        for run in range(len(self.runs)):
+            result = {"run": self.runs[run], "edges": int((~np.isnan(matrix[run])).sum()),
+                      "common_edges": int(count[run]), "variation": float(baseline_sum[run] - run_sum[run]),
+                      "mean_squared_error": float((filled[run] ** 2).sum() / count[run]) if count[run] else None,
+                      "sum_of_absolute_differences": float(np.abs(filled[run]).sum())}
+            for index, percentile in enumerate(ResponseTime.percentiles):
+                result["p" + str(percentile)] = ResponseTime.number(run_percentiles[index, run])
+            runs.append(result)
+
+        edges = []
+        for edge in range(len(self.edges)):
+            result = {"edge": self.edges[edge], "runs": int((~np.isnan(matrix[:, edge])).sum()),
+                      "mean_delta": ResponseTime.number(edge_mean_delta[edge])}
+            for index, percentile in enumerate(ResponseTime.percentiles):
+                result["p" + str(percentile)] = ResponseTime.number(edge_percentiles[index, edge])
+            edges.append(result)
+        return {"baseline": self.runs[baseline], "runs": runs, "edges": edges}
+
+    # Overall result of every run and the edges with the largest mean change
+    @staticmethod
+    def print_report(results, top=10):
+        print("#" * 100)
+        print("Response times against " + results["baseline"])
+        print("-" * 40)
+        for result in results["runs"]:
+            print(result["run"])
+            print("  Edges: " + str(result["edges"]) + " (" + str(result["common_edges"]) + " common with the baseline)")
+            print("  p50/p95/p99: " + "/".join(ResponseTime.milliseconds(result["p" + str(percentile)])
+                                              for percentile in ResponseTime.percentiles) + " ms")
+            print("  Variation after placement of the overall response time is: " + str(result["variation"]))
+            print("  Mean Squared Error: " + str(result["mean_squared_error"]))
+            print("  Sum of Absolute Differences: " + str(result["sum_of_absolute_differences"]))
+            if result["variation"] > 0:
+                print("  Reduced " + str(result["variation"]) + " ms")
+            elif result["variation"] < 0:
+                print("  Increased " + str(abs(result["variation"])) + " ms")
+            else:
+                print("  No change was noticed!")
+        if top > 0:
+            changed = [edge for edge in results["edges"] if edge["mean_delta"] is not None]
+            changed.sort(key=lambda edge: abs(edge["mean_delta"]), reverse=True)
+            print("-" * 40)
+            print("Edges with the largest mean change (ms)")
+            for edge in changed[:top]:
+                print("  " + edge["edge"].ljust(60) + format(edge["mean_delta"], '+.2f').ljust(12) + "p95 " +
+                      ResponseTime.milliseconds(edge["p95"]))
+        print("#" * 100)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Compare the response times between services of many runs")
+    parser.add_argument("files", nargs="*", default=["initial_response_times_with_stressing.json",
+                                                     "final_markov_with_bin_packing_with_stressing.json"],
+                        help="response time files or directories of .json files - the first run is the baseline")
+    parser.add_argument("--baseline", type=int, default=0, help="index of the baseline run")
+    parser.add_argument("--top", type=int, default=10, help="edges with the largest change to print")
+    parser.add_argument("--json", default=None, help="file to write the statistics of every run and edge to")
+    arguments = parser.parse_args(argv)
+
+    response_time = ResponseTime()
+    for path in ResponseTime.files(arguments.files):
+        response_time.load(path)
+    if not response_time.runs or not 0 <= arguments.baseline < len(response_time.runs):
+        parser.error("no response time files or baseline out of range")
+    results = response_time.compare(arguments.baseline)
+    ResponseTime.print_report(results, arguments.top)
+    if arguments.json is not None:
+        with open(arguments.json, "w") as json_file:
+            json.dump(results, json_file, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,293 @@
+######################################################
+# Kubernetes scheduler extender backed by a precomputed affinity score table
+# The score of a service on a node is the affinity (both directions) between the service and every pod already on
+# the node, the table holds it for every (service, node) and a bind only adds the affinities of the bound service to
+# the row of each of its neighbours and an unbind (pod deleted) subtracts them again - Filter and prioritize answer
+# with dictionary lookups under a lock
+# Filter drops the nodes without the CPU and RAM requested by the service, prioritize scales the scores of the
+# candidate nodes to 0..max_priority - Pods of unknown services and unknown nodes are never filtered out
+# With the bind verb configured the extender binds the pods - A binder (pod name, namespace, uid, node) -> error
+# message performs the binding, without one the bind verb answers with an error and records nothing
+# Pods deleted outside the extender are reported with POST /unbind, and with a rebuild interval the table is built
+# again from a new collection so that it never drifts from the cluster
+# Input: Service Affinities, Current placement, Resource requests and available node resources of GCP_Metrics
+# Output: HTTP extender verbs POST /filter, /prioritize and /bind, POST /unbind, GET /scores
+######################################################
+import argparse
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from Batch_Placement import affinity_metrics
+from Cluster_Snapshot import Cluster_Snapshot
+from GCP_Metrics import GCP_Metrics
+from Portfolio_Runner import Portfolio_Runner
+
+
+class Extender_Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive connections with kube-scheduler
+    disable_nagle_algorithm = True  # Headers and body are written apart - Nagle would hold the body for an ACK
+    extender = None  # Set on a subclass per server
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0]
+        verbs = {"/filter": self.extender.filter, "/prioritize": self.extender.prioritize,
+                 "/bind": self.extender.bind_pod, "/unbind": self.extender.unbind_pod}
+        if path not in verbs:
+            self.reply(404, {"Error": "unknown verb " + path})
+            return
+        try:
+            arguments = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        except ValueError as error:
+            self.reply(400, {"Error": "invalid request: " + str(error)})
+            return
+        self.reply(200, verbs[path](arguments))
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] == "/scores":
+            self.reply(200, self.extender.scores())
+        else:
+            self.reply(404, {"Error": "unknown path " + self.path})
+
+    def reply(self, code, result):
+        body = json.dumps(result).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Requests are not logged to standard error
+    def log_message(self, format, *args):
+        pass
+
+
+class Scheduler_Extender:
+    max_priority = 10  # Highest score of an extender in kube-scheduler
+
+    def __init__(self, service_affinities, current_placement, pod_request_cpu, pod_request_ram, node_available_cpu,
+                 node_available_ram, binder=None):
+        self.pod_request_cpu = pod_request_cpu
+        self.pod_request_ram = pod_request_ram
+        self.binder = binder
+        self.lock = threading.Lock()
+
+        # Pattern: {"service": {"neighbour": affinity of both directions}}
+        self.neighbours = {}
+        for source in service_affinities:
+            for dest in service_affinities[source]:
+                if source == dest:
+                    continue
+                affinity = float(service_affinities[source][dest])
+                for service, neighbour in ((source, dest), (dest, source)):
+                    if service not in self.neighbours:
+                        self.neighbours[service] = {}
+                    self.neighbours[service][neighbour] = self.neighbours[service].get(neighbour, 0.0) + affinity
+
+        # Free resources left on every node - Lowered by every bind, raised by every unbind
+        self.available_cpu = {}
+        self.available_ram = {}
+        for host in node_available_cpu:
+            self.available_cpu[host] = float(node_available_cpu[host])
+            self.available_ram[host] = float(node_available_ram[host])
+
+        # Pattern: {"service": {"node": score}} - Nodes without a neighbour of the service are left out
+        self.table = {}
+        for service in self.neighbours:
+            self.table[service] = {}
+        for host in current_placement:
+            for service in current_placement[host]:
+                self.add_pod(service, host)
+
+    @staticmethod
+    def from_metrics(collector, affinity_metric="service_affinities", binder=None):
+        return Scheduler_Extender(Portfolio_Runner.affinities(collector, affinity_metric), collector.current_placement,
+                                  collector.current_pod_request_cpu, collector.current_pod_request_ram,
+                                  collector.node_available_cpu, collector.node_available_ram, binder)
+
+    # Replace the whole table with one built from a new collection - Requests wait for the swap only
+    def rebuild(self, collector, affinity_metric="service_affinities"):
+        extender = Scheduler_Extender.from_metrics(collector, affinity_metric)
+        with self.lock:
+            self.pod_request_cpu = extender.pod_request_cpu
+            self.pod_request_ram = extender.pod_request_ram
+            self.neighbours = extender.neighbours
+            self.available_cpu = extender.available_cpu
+            self.available_ram = extender.available_ram
+            self.table = extender.table
+
+    # A pod of the service on the node raises the score of the node for every neighbour of the service
+    def add_pod(self, service, node):
+        for neighbour, affinity in self.neighbours.get(service, {}).items():
+            row = self.table[neighbour]
+            row[node] = row.get(node, 0.0) + affinity
+
+    # A pod of the service leaving the node takes its affinities out of the score of the node
+    def remove_pod(self, service, node):
+        for neighbour, affinity in self.neighbours.get(service, {}).items():
+            row = self.table[neighbour]
+            if node not in row:
+                continue
+            row[node] -= affinity
+            if row[node] <= 1e-9:
+                del row[node]
+
+    # Pattern: service_name-ID-SubID - The app label is used when the pod has one
+    @staticmethod
+    def pod_service(pod):
+        metadata = pod.get("metadata", {})
+        labels = metadata.get("labels") or {}
+        if "app" in labels:
+            return labels["app"]
+        try:
+            return GCP_Metrics.service_name(metadata.get("name", ""))
+        except IndexError:
+            return metadata.get("name", "")
+
+    # Candidate nodes of the request - The names when the scheduler caches the nodes, else the node objects
+    @staticmethod
+    def node_names(arguments):
+        if arguments.get("NodeNames") is not None:
+            return arguments["NodeNames"]
+        return [node["metadata"]["name"] for node in (arguments.get("Nodes") or {}).get("items") or []]
+
+    def fits(self, service, node):
+        if node not in self.available_cpu or service not in self.pod_request_cpu:
+            return True
+        return float(self.pod_request_cpu[service]) <= self.available_cpu[node] and \
+            float(self.pod_request_ram[service]) <= self.available_ram[node]
+
+    # Extender filter verb - Pattern of the result: ExtenderFilterResult
+    def filter(self, arguments):
+        service = self.pod_service(arguments.get("Pod") or {})
+        passed = set()
+        failed = {}
+        with self.lock:
+            for node in self.node_names(arguments):
+                if self.fits(service, node):
+                    passed.add(node)
+                else:
+                    failed[node] = "Not enough CPU or RAM for " + service
+        result = {"FailedNodes": failed, "Error": ""}
+        if arguments.get("NodeNames") is not None:
+            result["NodeNames"] = [node for node in arguments["NodeNames"] if node in passed]
+        else:
+            nodes = dict(arguments.get("Nodes") or {})
+            nodes["items"] = [node for node in nodes.get("items") or [] if node["metadata"]["name"] in passed]
+            result["Nodes"] = nodes
+        return result
+
+    # Extender prioritize verb - Pattern of the result: HostPriorityList
+    def prioritize(self, arguments):
+        service = self.pod_service(arguments.get("Pod") or {})
+        nodes = self.node_names(arguments)
+        with self.lock:
+            row = self.table.get(service, {})
+            scores = [row.get(node, 0.0) for node in nodes]
+        highest = max(scores) if scores else 0.0
+        priorities = []
+        for node, score in zip(nodes, scores):
+            priority = int(round(Scheduler_Extender.max_priority * score / highest)) if highest > 0.0 else 0
+            priorities.append({"Host": node, "Score": priority})
+        return priorities
+
+    # Record a pod of the service bound to the node
+    def bind(self, service, node):
+        with self.lock:
+            self.add_pod(service, node)
+            if node in self.available_cpu and service in self.pod_request_cpu:
+                self.available_cpu[node] -= float(self.pod_request_cpu[service])
+                self.available_ram[node] -= float(self.pod_request_ram[service])
+
+    # Record a pod of the service deleted from the node
+    def unbind(self, service, node):
+        with self.lock:
+            self.remove_pod(service, node)
+            if node in self.available_cpu and service in self.pod_request_cpu:
+                self.available_cpu[node] += float(self.pod_request_cpu[service])
+                self.available_ram[node] += float(self.pod_request_ram[service])
+
+    # Extender bind verb - Pattern of the arguments: ExtenderBindingArgs, of the result: ExtenderBindingResult
+    # The pod is only recorded once the binder bound it - Without a binder the verb must not be configured
+    def bind_pod(self, arguments):
+        if self.binder is None:
+            return {"Error": "the extender has no binder - bind verb not supported"}
+        error = self.binder(arguments.get("PodName"), arguments.get("PodNamespace"), arguments.get("PodUID"),
+                            arguments.get("Node"))
+        if error:
+            return {"Error": error}
+        self.bind(self.pod_service({"metadata": {"name": arguments.get("PodName", "")}}), arguments.get("Node"))
+        return {"Error": ""}
+
+    # Pod deleted from a node - Pattern of the arguments: {"PodName": ..., "PodNamespace": ..., "Node": ...}
+    def unbind_pod(self, arguments):
+        self.unbind(self.pod_service({"metadata": {"name": arguments.get("PodName", "")}}), arguments.get("Node"))
+        return {"Error": ""}
+
+    def scores(self):
+        with self.lock:
+            return {"table": dict((service, dict(row)) for service, row in self.table.items()),
+                    "available_cpu": dict(self.available_cpu), "available_ram": dict(self.available_ram)}
+
+    def serve(self, address="127.0.0.1", port=8888):
+        handler = type("Scheduler_Extender_Handler", (Extender_Handler,), {"extender": self})
+        server = ThreadingHTTPServer((address, port), handler)
+        server.daemon_threads = True
+        return server
+
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(description="Serve the filter, prioritize and bind verbs of a kube-scheduler "
+                                                 "extender from the affinities of the services")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--host", help="external IP of one VM of a live cluster")
+    source.add_argument("--snapshot", help="recorded cluster snapshot file")
+    parser.add_argument("--affinity-metric", default="requests", choices=sorted(affinity_metrics))
+    parser.add_argument("--address", default="127.0.0.1", help="address of the extender")
+    parser.add_argument("--port", type=int, default=8888, help="port of the extender")
+    parser.add_argument("--kiali-port", type=int, default=32002)
+    parser.add_argument("--prometheus-port", type=int, default=32003)
+    parser.add_argument("--namespace", default="default")
+    parser.add_argument("--rebuild-interval", type=float, default=0.0,
+                        help="seconds between two rebuilds of the table from a new collection - 0 never rebuilds")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    arguments = parse_arguments(argv)
+    if arguments.snapshot is not None:
+        collector = Cluster_Snapshot.replay(arguments.snapshot)
+    else:
+        collector = GCP_Metrics(arguments.host, arguments.kiali_port, arguments.prometheus_port, arguments.namespace,
+                                grouped_usage_queries=True)
+        collector.collect_resources()
+    extender = Scheduler_Extender.from_metrics(collector, affinity_metrics[arguments.affinity_metric])
+    server = extender.serve(arguments.address, arguments.port)
+    # A live cluster is collected again through the same collector and the table swapped
+    stop_event = threading.Event()
+    if arguments.snapshot is None and arguments.rebuild_interval > 0.0:
+        def rebuild():
+            while not stop_event.wait(arguments.rebuild_interval):
+                start_time = time.time()
+                try:
+                    collector.reset()
+                    collector.collect_resources()
+                    extender.rebuild(collector, affinity_metrics[arguments.affinity_metric])
+                except Exception as error:
+                    print("Rebuild failed: " + repr(error), file=sys.stderr)
+                    continue
+                print("Table rebuilt in " + format(time.time() - start_time, '.3f') + " seconds", file=sys.stderr)
+        threading.Thread(target=rebuild, daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
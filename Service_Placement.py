@@ -9,6 +9,7 @@
 
 import pandas as pd
 import json
+import os
 import numpy as np
 import warnings
 import time
@@ -17,13 +18,24 @@ import sys
 import re
 import networkx as nx
 
+from Alpha_Search import Alpha_Search
 from Application_Graph import Application_Graph
 from Bin_Packing import Bin_Packing
 from Bisecting_K_means import Bisecting_K_means
+from Cluster_Snapshot import Cluster_Snapshot
 from GCP_Metrics import GCP_Metrics
 from Binary_Partition import Binary_Partition
 from Heuristic_First_Fit import Heuristic_First_Fit
+from Incremental_Placement import Incremental_Placement
+from Instrumentation import Instrumentation
 from K_Partition import K_Partition
+from Latency_Objective import Latency_Objective
+from Local_Search import Local_Search
+from Migration_Planner import Migration_Planner
+from Placement_Problem import Placement_Problem
+from Placement_Scoring import Placement_Scoring
+from Portfolio_Runner import Portfolio_Runner
+from Spectral_Partition import Spectral_Partition
 
 warnings.filterwarnings('ignore')
 pd.set_option('display.max_columns', None)
@@ -32,6 +44,16 @@ pd.set_option('display.max_columns', None)
 kiali_port = 32002  # Kiali NodePort running on Kubernetes Cluster
 prometheus_port = 32003  # Prometheus NodePort running on Kubernetes Cluster
 namespace = "default"  # the namespace of the app
+grouped_usage_queries = True  # Collect pod usage with cluster-wide queries grouped by node instead of per host
+node_shard_size = 0  # Hosts per grouped usage query - 0 queries all hosts at once
+partition_engine = "karger_stein"  # Min-cut engine of K Partition: "contraction", "karger_stein" or "multilevel"
+binary_partition_engine = "stoer_wagner"  # Min-cut engine of Binary Partition - "stoer_wagner" is exact
+partition_processes = os.cpu_count()  # Processes running the contraction trials in parallel
+partition_seed = None  # Master seed of the contraction trials - Set it to reproduce a run exactly
+local_search_budget = 0.0  # Seconds of simulated annealing on the placement solution - Opt-in, 0 disables it
+alpha_search_processes = 1  # Candidate alphas solved at the same time - Contraction trials then run in one process
+portfolio_budget = 60.0  # Seconds shared by the algorithms of the portfolio - Slower ones are left out
+instrumentation_enabled = False  # Record spans and counters of every phase and export them at the end
 
 
 def construct_graph(service_list, service_affinities, service_to_id, id_to_service):
@@ -59,7 +81,9 @@ def print_menu():
     print("2) Binary Partition - Bin Packing")
     print("3) K-Partition - Bin Packing")
     print("4) Bisecting K-Means - Bin Packing")
-    print("5) Exit")
+    print("5) Spectral Partition - Bin Packing")
+    print("6) Portfolio of algorithms - Best placement within a time budget")
+    print("7) Exit")
     print("#" * 100)
 
 
@@ -68,43 +92,19 @@ def affinity_metric_menu():
     print("-" * 50)
     print("1) Requests per second")
     print("2) Mean value of bytes exchanged")
+    print("3) Requests per second x response time")
     print("#" * 100)
 
 
 # Function to calculate total requested bytes before and after placement for measuring traffic between Egress
 def calculate_total_bytes_requested(current_placement, final_placement, traffic_requested_bytes):
-    initial_host_per_pod = {}
-    final_host_per_pod = {}
-    initial_bytes_requested = 0.0
-    final_bytes_requested = 0.0
-
-    # Find initial hosts per pod
-    for host in current_placement:
-        for service in current_placement[host]:
-            initial_host_per_pod[service] = host
-
-    # Find initial bytes requested
-    for source in traffic_requested_bytes:
-        for dest in traffic_requested_bytes[source]:
-            # Check for same host
-            if initial_host_per_pod[source] == initial_host_per_pod[dest]:
-                continue
-            else:
-                initial_bytes_requested += float(traffic_requested_bytes[source][dest])
-
-    # Find final hosts per pod
-    for host in final_placement:
-        for service in final_placement[host]:
-            final_host_per_pod[service] = host
-
-    # Find initial bytes requested
-    for source in traffic_requested_bytes:
-        for dest in traffic_requested_bytes[source]:
-            # Check for same host
-            if final_host_per_pod[source] == final_host_per_pod[dest]:
-                continue
-            else:
-                final_bytes_requested += float(traffic_requested_bytes[source][dest])
+    # Both placements are scored in one batch - Hosts are the ones of either placement
+    host_list = list(current_placement) + [host for host in final_placement if host not in current_placement]
+    placement_scoring = Placement_Scoring([], host_list, traffic_requested_bytes, {}, {}, {}, {}, {}, {}, {},
+                                          current_placement)
+    scores = placement_scoring.score_placements([current_placement, final_placement])
+    initial_bytes_requested = float(scores["cross_host_bytes"][0])
+    final_bytes_requested = float(scores["cross_host_bytes"][1])
 
     print("")
     print("#" * 100)
@@ -112,15 +112,79 @@ def calculate_total_bytes_requested(current_placement, final_placement, traffic_
     print("-" * 50)
     print("Initial Placement: " + str(initial_bytes_requested))
     print("Final Placement: " + str(final_bytes_requested))
+    if int(scores["unplaced"][1]) > 0:
+        print("Unplaced services (their traffic is counted as cross-host): " + str(int(scores["unplaced"][1])))
+    print("#" * 100)
+
+
+# Function to predict the latency saved by the edges that become node-local and lost by the ones that become remote
+def calculate_latency_saving(latency_objective, final_placement):
+    total_saving, mean_saving = latency_objective.predicted_latency_saving(final_placement)
+
+    print("")
+    print("#" * 100)
+    print("Predicted latency saving of the placement")
+    print("-" * 50)
+    print("Remote overhead per request (ms): " + format(latency_objective.remote_overhead, '.3f'))
+    print("Saved request-milliseconds per second: " + format(total_saving, '.3f'))
+    print("Mean saving per request (ms): " + format(mean_saving, '.3f'))
     print("#" * 100)
 
 
-def servicePlacement(host_ip):
+# Incremental re-placement between two recorded collections - Only changed services and their neighbours move
+# The previous plan is a JSON file with the placement computed for the previous collection ({"host": [services]} or
+# a result with a "placement" key as written by Batch_Placement and served by Placement_Controller), without it the
+# placement running during the previous collection is used
+def incrementalPlacement(previous_snapshot, snapshot, previous_plan=None):
+    previous_collector = Cluster_Snapshot.replay(previous_snapshot)
+    gcp_metrics_collector = Cluster_Snapshot.replay(snapshot)
+    previous_placement = None
+    if previous_plan is not None:
+        with open(previous_plan) as plan_file:
+            previous_placement = json.load(plan_file)
+        if "placement" in previous_placement and isinstance(previous_placement["placement"], dict):
+            previous_placement = previous_placement["placement"]
+
+    start_time = time.time()
+    incremental_placement = Incremental_Placement.from_collections(previous_collector, gcp_metrics_collector,
+                                                                   previous_placement)
+    placement_solution = incremental_placement.incremental_placement()
+    end_time = time.time()
+    print("#" * 100)
+    print("Incremental Placement")
+    print("-" * 40)
+    pprint.pprint(placement_solution)
+    print("-" * 40)
+    print("Changed affinities: " + str(len(incremental_placement.changed_affinities)) + " Changed services: " +
+          str(len(incremental_placement.changed_services)) + " Affected services: " +
+          str(len(incremental_placement.affected_services)) + " Migrations: " + str(incremental_placement.migrations))
+    if incremental_placement.unplaced_services:
+        print("ERROR: Services without a host: " + str(incremental_placement.unplaced_services))
+    print("Execution time of algorithm:  --- %s seconds ---" % (end_time - start_time))
+    print("#" * 100)
+
+    # Calculate total requested bytes before and after placement
+    calculate_total_bytes_requested(gcp_metrics_collector.current_placement, placement_solution,
+                                    gcp_metrics_collector.traffic_requested_bytes)
+
+
+def servicePlacement(host_ip, replay_snapshot=None, record_snapshot=None):
     G = nx.Graph()
-    # Initialize Class
-    gcp_metrics_collector = GCP_Metrics(host_ip, kiali_port, prometheus_port, namespace)
-    # Collect Resources from Prometheus and Prometheus
-    gcp_metrics_collector.collect_resources()
+    if instrumentation_enabled:
+        Instrumentation.enable()
+    if replay_snapshot is not None:
+        # Offline mode - Rebuild the collected cluster state from a snapshot file
+        gcp_metrics_collector = Cluster_Snapshot.replay(replay_snapshot)
+    else:
+        # Initialize Class
+        gcp_metrics_collector = GCP_Metrics(host_ip, kiali_port, prometheus_port, namespace,
+                                            grouped_usage_queries=grouped_usage_queries,
+                                            node_shard_size=node_shard_size)
+        # Collect Resources from Prometheus and Prometheus
+        gcp_metrics_collector.collect_resources()
+        gcp_metrics_collector.print_collection_report()
+        if record_snapshot is not None:
+            Cluster_Snapshot.record(gcp_metrics_collector, record_snapshot)
 
     # Graph Constructor given the service list and affinities
     service_to_id = {}
@@ -158,12 +222,12 @@ def servicePlacement(host_ip):
         print_menu()
         option = input('Pick an option:')
         if option.isnumeric():
-            if 0 < int(option) < 5:
+            if 0 < int(option) < 7:
                 while True:
                     affinity_metric_menu()
                     affinity_option = input('Pick an option:')
                     if affinity_option.isnumeric():
-                        if 0 < int(affinity_option) < 3:
+                        if 0 < int(affinity_option) < 4:
                             break
                     else:
                         print("Wrong Input! Pick a correct value!")
@@ -172,28 +236,23 @@ def servicePlacement(host_ip):
             print("Wrong Input! Pick a correct value!")
 
     # Affinity Metric option
-    if affinity_option == 1:
+    # Latency objective - Hot and slow call paths weigh the most
+    latency_objective = Latency_Objective.from_metrics(gcp_metrics_collector)
+    if int(affinity_option) == 1:
         affinity_metric = gcp_metrics_collector.service_affinities
+    elif int(affinity_option) == 3:
+        affinity_metric = latency_objective.latency_affinities()
     else:
         affinity_metric = gcp_metrics_collector.total_affinities_bytes
+    graph_affinities = affinity_metric  # Pattern: {"source": {"dest": value}} of the chosen metric
+    # Integer indexed problem of the collection - Built once and shared by the algorithms of the menu
+    placement_problem = Placement_Problem.from_metrics(gcp_metrics_collector, affinity_metric)
 
     # Algorithm choice
     if int(option) == 1:
         start_time = time.time()
-        # Affinity Metric option
-        if affinity_option == 1:
-            affinity_metric = gcp_metrics_collector.affinities_collection
-        else:
-            affinity_metric = gcp_metrics_collector.affinities_bytes_collection
-
-        # Heuristic Based Affinity Algorithm - A modified First-Fit algorithm
-        heuristic_first_fit_algorithm = Heuristic_First_Fit(gcp_metrics_collector.current_placement,
-                                                            gcp_metrics_collector.current_pod_request_cpu,
-                                                            gcp_metrics_collector.current_pod_request_ram,
-                                                            gcp_metrics_collector.node_available_cpu,
-                                                            gcp_metrics_collector.node_available_ram,
-                                                            affinity_metric,
-                                                            gcp_metrics_collector.host_list)
+        # Heuristic Based Affinity Algorithm - A modified First-Fit algorithm - Affinities in decreasing order
+        heuristic_first_fit_algorithm = Heuristic_First_Fit.from_problem(placement_problem)
 
         heuristic_first_fit_algorithm.heuristic_placement()
         end_time = time.time()
@@ -206,106 +265,65 @@ def servicePlacement(host_ip):
         print("Execution time of algorithm:  --- %s seconds ---" % (end_time - start_time))
         print("#" * 100)
         heuristic_first_fit_algorithm.moved_services.clear()
-    elif int(option) == 2:
-        # Binary Partition - Bin Packing
+    elif int(option) == 2 or int(option) == 3 or int(option) == 5:
+        # Binary Partition / K Partition / Spectral Partition - Bin Packing
         start_time = time.time()
-        alpha = 1.0
-        delta = 0.1
-        placement_solution = {}
-
-        while alpha >= 0.0:
-            bp = Binary_Partition(gcp_metrics_collector.current_pod_request_cpu,
-                                  gcp_metrics_collector.current_pod_request_ram,
-                                  affinity_metric,
-                                  gcp_metrics_collector.max_ram_allocation,
-                                  gcp_metrics_collector.max_cpu_allocation,
-                                  gcp_metrics_collector.host_list, gcp_metrics_collector.service_list)
-
-            bp.calculate_app_partitions(alpha)
-            # Insert Redis-Cart in Cart-Service partition
-            for key in bp.app_partition:
-                for x in range(len(bp.app_partition[key])):
-                    if 'cartservice' == bp.app_partition[key][x]:
-                        bp.app_partition[key].append('redis-cart')
-
-            # Bin Packing
-            bin_packing = Bin_Packing(bp.app_partition, gcp_metrics_collector.current_placement,
-                                      gcp_metrics_collector.node_initial_cpu_usage,
-                                      gcp_metrics_collector.node_initial_ram_usage,
-                                      gcp_metrics_collector.node_initial_available_cpu,
-                                      gcp_metrics_collector.node_initial_available_ram,
-                                      gcp_metrics_collector.current_pod_request_cpu,
-                                      gcp_metrics_collector.current_pod_request_ram,
-                                      gcp_metrics_collector.host_list,
-                                      affinity_metric)
-
-            bin_packing.heuristic_packing()
-            placement_solution = bin_packing.app_placement
-            if bool(placement_solution):
-                break
-            else:
-                alpha -= delta
-        end_time = time.time()
-        print("#" * 100)
-        print("Binary Partition - Bin Packing Solution")
-        print("-" * 40)
-        pprint.pprint(placement_solution)
-        print("-" * 40)
-        print("Execution time of algorithm:  --- %s seconds ---" % (end_time - start_time))
-        print("#" * 100)
-    elif int(option) == 3:
-        # K Partition - Bin Packing
-        start_time = time.time()
-        alpha = 1.0
-        delta = 0.1
-        placement_solution = {}
-
-        while alpha >= 0.0:
-            kp = K_Partition(gcp_metrics_collector.current_pod_request_cpu,
-                             gcp_metrics_collector.current_pod_request_ram,
-                             affinity_metric,
-                             gcp_metrics_collector.max_ram_allocation,
-                             gcp_metrics_collector.max_cpu_allocation,
-                             gcp_metrics_collector.host_list, gcp_metrics_collector.service_list)
-
-            kp.calculate_app_partitions(alpha)
-            # Insert Redis-Cart in Cart-Service partition
-            for key in kp.app_partition:
-                for x in range(len(kp.app_partition[key])):
-                    if 'cartservice' == kp.app_partition[key][x]:
-                        kp.app_partition[key].append('redis-cart')
-
-            # Bin Packing
-            bin_packing = Bin_Packing(kp.app_partition, gcp_metrics_collector.current_placement,
-                                      gcp_metrics_collector.node_initial_cpu_usage,
-                                      gcp_metrics_collector.node_initial_ram_usage,
-                                      gcp_metrics_collector.node_initial_available_cpu,
-                                      gcp_metrics_collector.node_initial_available_ram,
-                                      gcp_metrics_collector.current_pod_request_cpu,
-                                      gcp_metrics_collector.current_pod_request_ram,
-                                      gcp_metrics_collector.host_list,
-                                      affinity_metric)
-
-            bin_packing.heuristic_packing()
-            placement_solution = bin_packing.app_placement
-            if bool(placement_solution):
-                break
-            else:
-                alpha -= delta
+        if int(option) == 2:
+            partition_class = Binary_Partition
+            partition_options = {"engine": binary_partition_engine, "seed": partition_seed,
+                                 "processes": partition_processes}
+            solution_name = "Binary Partition - Bin Packing Solution"
+        elif int(option) == 3:
+            partition_class = K_Partition
+            partition_options = {"engine": partition_engine, "seed": partition_seed,
+                                 "processes": partition_processes}
+            solution_name = "K-Partition - Bin Packing Solution"
+        else:
+            partition_class = Spectral_Partition
+            partition_options = {"seed": partition_seed}
+            solution_name = "Spectral Partition - Bin Packing Solution"
+
+        # Search the largest alpha with a placement solution
+        alpha_search = Alpha_Search(partition_class,
+                                    (gcp_metrics_collector.current_pod_request_cpu,
+                                     gcp_metrics_collector.current_pod_request_ram,
+                                     affinity_metric,
+                                     gcp_metrics_collector.max_ram_allocation,
+                                     gcp_metrics_collector.max_cpu_allocation,
+                                     gcp_metrics_collector.host_list, gcp_metrics_collector.service_list),
+                                    partition_options,
+                                    (gcp_metrics_collector.current_placement,
+                                     gcp_metrics_collector.node_initial_cpu_usage,
+                                     gcp_metrics_collector.node_initial_ram_usage,
+                                     gcp_metrics_collector.node_initial_available_cpu,
+                                     gcp_metrics_collector.node_initial_available_ram,
+                                     gcp_metrics_collector.current_pod_request_cpu,
+                                     gcp_metrics_collector.current_pod_request_ram,
+                                     gcp_metrics_collector.host_list,
+                                     affinity_metric),
+                                    companions={'cartservice': 'redis-cart'},  # Insert Redis-Cart in Cart-Service partition
+                                    processes=alpha_search_processes, problem=placement_problem)
+        placement_solution = alpha_search.search()
         end_time = time.time()
         print("#" * 100)
-        print("K-Partition - Bin Packing Solution")
+        print(solution_name)
         print("-" * 40)
         pprint.pprint(placement_solution)
         print("-" * 40)
+        if int(option) == 2:
+            print("Cut weights of the partitioned parts (" + binary_partition_engine + "): " +
+                  str(alpha_search.cut_weights))
+        alpha_search.print_report()
         print("Execution time of algorithm:  --- %s seconds ---" % (end_time - start_time))
         print("#" * 100)
     elif int(option) == 4:
         # Bisecting K-Means - Bin Packing
 
-        # Insert K-Value
+        # Insert K-Value - Empty input picks K by the cross-host traffic after Bin Packing
         while True:
-            K_value = input('Choose value for K clusters to be created:')
+            K_value = input('Choose value for K clusters to be created (Enter for automatic K):')
+            if K_value == '':
+                break
             if K_value.isnumeric():
                 if int(K_value) <= len(gcp_metrics_collector.service_list):
                     break
@@ -314,21 +332,28 @@ def servicePlacement(host_ip):
 
         start_time = time.time()
         bkm = Bisecting_K_means(affinity_metric, gcp_metrics_collector.service_list)
-        bkm.find_bistecting_K_means_partitions(K_value)
-
-        # Bin Packing
-        bin_packing = Bin_Packing(bkm.app_clusters, gcp_metrics_collector.current_placement,
-                                  gcp_metrics_collector.node_initial_cpu_usage,
-                                  gcp_metrics_collector.node_initial_ram_usage,
-                                  gcp_metrics_collector.node_initial_available_cpu,
-                                  gcp_metrics_collector.node_initial_available_ram,
-                                  gcp_metrics_collector.current_pod_request_cpu,
-                                  gcp_metrics_collector.current_pod_request_ram,
-                                  gcp_metrics_collector.host_list,
-                                  affinity_metric)
-
-        bin_packing.heuristic_packing()
-        placement_solution = bin_packing.app_placement
+        packing_arguments = (gcp_metrics_collector.current_placement,
+                             gcp_metrics_collector.node_initial_cpu_usage,
+                             gcp_metrics_collector.node_initial_ram_usage,
+                             gcp_metrics_collector.node_initial_available_cpu,
+                             gcp_metrics_collector.node_initial_available_ram,
+                             gcp_metrics_collector.current_pod_request_cpu,
+                             gcp_metrics_collector.current_pod_request_ram,
+                             gcp_metrics_collector.host_list,
+                             affinity_metric,
+                             placement_problem)
+        if K_value == '':
+            # K sweep - Clusters of every K are packed in parallel
+            placement_solution = bkm.find_best_k(packing_arguments, partition_processes)
+            print("Bisecting K-Means: K=" + str(bkm.best_k) + " picked out of " + str(len(bkm.k_scores)) +
+                  " packed K values")
+        else:
+            bkm.find_bistecting_K_means_partitions(K_value)
+
+            # Bin Packing
+            bin_packing = Bin_Packing.from_problem(placement_problem, bkm.app_clusters)
+
+            placement_solution = bin_packing.heuristic_packing()
         end_time = time.time()
         if not bool(placement_solution):
             print("ERROR: Placement solution hasn't been found!")
@@ -340,28 +365,92 @@ def servicePlacement(host_ip):
             print("-" * 40)
             print("Execution time of algorithm:  --- %s seconds ---" % (end_time - start_time))
             print("#" * 100)
+    elif int(option) == 6:
+        # Heuristic First Fit, Binary Partition, K-Partition and Bisecting K-Means in parallel processes
+        if int(affinity_option) == 1:
+            affinity_name = "service_affinities"
+        elif int(affinity_option) == 3:
+            affinity_name = "latency_affinities"
+        else:
+            affinity_name = "total_affinities_bytes"
+        portfolio_runner = Portfolio_Runner(gcp_metrics_collector, affinity_name, portfolio_budget,
+                                            options={"binary_partition_engine": binary_partition_engine,
+                                                     "partition_engine": partition_engine, "seed": partition_seed})
+        placement_solution = portfolio_runner.run()
+        portfolio_runner.print_report()
+        if not bool(placement_solution):
+            print("ERROR: Placement solution hasn't been found!")
+        else:
+            print("#" * 100)
+            print("Portfolio Solution (" + portfolio_runner.best_algorithm + ")")
+            print("-" * 40)
+            pprint.pprint(placement_solution)
+            print("#" * 100)
     else:
         return
 
+    # Improve the placement with simulated annealing
+    if local_search_budget > 0.0 and bool(placement_solution):
+        local_search = Local_Search.from_metrics(gcp_metrics_collector, placement_solution, graph_affinities,
+                                                 local_search_budget, partition_seed)
+        placement_solution = local_search.simulated_annealing()
+        print("#" * 100)
+        print("Local Search - Simulated Annealing")
+        print("-" * 40)
+        pprint.pprint(placement_solution)
+        print("-" * 40)
+        print("Cross-host traffic: " + str(local_search.initial_cost) + " -> " + str(local_search.best_cost) +
+              " after " + str(local_search.moves_evaluated) + " moves")
+        print("Improvement curve (seconds, cross-host traffic): " + str(local_search.curve))
+        print("#" * 100)
+
     # Calculate total requested bytes before and after placement
     calculate_total_bytes_requested(gcp_metrics_collector.current_placement, placement_solution,
                                     gcp_metrics_collector.traffic_requested_bytes)
+    calculate_latency_saving(latency_objective, placement_solution)
+
+    # Rollout of the placement solution in waves that never overcommit a host
+    if bool(placement_solution):
+        migration_planner = Migration_Planner.from_metrics(gcp_metrics_collector, placement_solution)
+        migration_planner.plan()
+        migration_planner.print_report()
 
     # Export initial Placement
     with open("final_markov_with_bin_packing_with_stressing.json", "w") as outfile:
         json.dump(gcp_metrics_collector.response_times, outfile)
 
+    # Export spans and counters of the run
+    if instrumentation_enabled:
+        Instrumentation.print_report()
+        Instrumentation.export_json("instrumentation.json")
+        Instrumentation.export_prometheus("instrumentation.prom")
+
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("ERROR:External IP of one VM should be inserted as parameter! Try again!")
+    # Usage: External IP [snapshot file to record], a snapshot file to replay
+    # or a previous and a current snapshot file [previous plan file] for an incremental re-placement
+    if len(sys.argv) < 2 or len(sys.argv) > 4:
+        print("ERROR:External IP of one VM or a snapshot file should be inserted as parameter! Try again!")
+        exit(1)
+
+    # Incremental re-placement between two recorded snapshots
+    if len(sys.argv) >= 3 and os.path.isfile(sys.argv[1]) and os.path.isfile(sys.argv[2]):
+        incrementalPlacement(sys.argv[1], sys.argv[2], sys.argv[3] if len(sys.argv) == 4 else None)
+        exit(0)
+    if len(sys.argv) == 4:
+        print("ERROR:A previous plan file is only used with a previous and a current snapshot file! Try again!")
         exit(1)
 
+    # Replay a recorded snapshot without a live cluster
+    if os.path.isfile(sys.argv[1]):
+        servicePlacement(None, replay_snapshot=sys.argv[1])
+        exit(0)
+
     # Validate the formal of IP
     validate_IP = re.match(r"^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$", sys.argv[1])
     if validate_IP:
         vm_external_ip = sys.argv[1]  # External ip for host machine to fetch the data (One required) given as input
-        servicePlacement(vm_external_ip)
+        servicePlacement(vm_external_ip, record_snapshot=sys.argv[2] if len(sys.argv) == 3 else None)
     else:
         print("ERROR:Wrong Format of External IP!Try again!")
         exit(1)
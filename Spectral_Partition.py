@@ -0,0 +1,201 @@
+######################################################
+# Spectral partition algorithm to produce clusters given specific thresholds of cpu and ram usage
+# Services are embedded with the leading eigenvectors of the normalized affinity matrix of the application graph,
+# the embedding is clustered with a seeded k-means and clusters above the thresholds are split recursively
+# by the sweep cut of their Fiedler vector
+# Input: Service List, Service Affinities
+# Output: Partition of application ready to be packed into host machines
+# Paper: On Spectral Clustering: Analysis and an algorithm, Ng, Jordan and Weiss
+######################################################
+import math
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse import linalg
+
+from Instrumentation import Instrumentation
+
+
+class Spectral_Partition:
+    dense_size = 200  # Graphs up to this size are solved with a dense eigensolver
+    max_dimensions = 32  # Eigenvectors kept for the embedding
+    max_iterations = 100  # K-means iterations
+
+    def __init__(self, pod_request_cpu, pod_request_ram, service_affinities, max_ram_allocation, max_cpu_allocation,
+                 host_list, service_list, seed=None):
+        self.pod_request_cpu = pod_request_cpu
+        self.pod_request_ram = pod_request_ram
+        self.service_affinities = service_affinities
+        self.max_ram_allocation = float(max_ram_allocation)
+        self.max_cpu_allocation = float(max_cpu_allocation)
+        self.host_list = host_list
+        self.service_list = service_list
+        self.app_partition = {}
+        self.seed = seed if seed is not None else 0  # Seed of the k-means and the eigensolver start vector
+        self.cut_weights = []  # Weight of the cut of each calculated partition
+
+        self.services = []
+        self.service_to_id = {}
+        for service in service_list:
+            if service not in self.service_to_id:
+                self.service_to_id[service] = len(self.services)
+                self.services.append(service)
+        self.service_cpu = np.array([float(pod_request_cpu[service]) for service in self.services], dtype=float)
+        self.service_ram = np.array([float(pod_request_ram[service]) for service in self.services], dtype=float)
+
+        # Same graph as Application_Graph - The later direction of an affinity overwrites the earlier one
+        # and self loops are dropped since they never cross a cut
+        edge_weights = {}
+        for source in service_affinities:
+            if source not in self.service_to_id:
+                continue
+            for dest in service_affinities[source]:
+                if dest not in self.service_to_id or dest == source:
+                    continue
+                u, v = self.service_to_id[source], self.service_to_id[dest]
+                edge_weights[(min(u, v), max(u, v))] = float(service_affinities[source][dest])
+        rows = np.array([key[0] for key in edge_weights], dtype=np.int64)
+        cols = np.array([key[1] for key in edge_weights], dtype=np.int64)
+        weights = np.array(list(edge_weights.values()), dtype=float)
+        shape = (len(self.services), len(self.services))
+        upper = sparse.csr_matrix((weights, (rows, cols)), shape=shape)
+        self.graph = (upper + upper.T).tocsr()
+        self.graph.eliminate_zeros()
+
+    # Normalized affinity matrix D^-1/2 W D^-1/2 - Its leading eigenvectors are the ones of the smallest
+    # eigenvalues of the normalized Laplacian I - D^-1/2 W D^-1/2
+    @staticmethod
+    def normalized_affinity(graph):
+        degrees = np.asarray(graph.sum(axis=1)).ravel()
+        scale = np.zeros(degrees.size)
+        scale[degrees > 0] = 1.0 / np.sqrt(degrees[degrees > 0])
+        diagonal = sparse.diags(scale)
+        return (diagonal @ graph @ diagonal).tocsr()
+
+    # Eigenvectors of the largest eigenvalues in decreasing order of the eigenvalue
+    def leading_eigenvectors(self, matrix, dimensions):
+        size = matrix.shape[0]
+        if size <= Spectral_Partition.dense_size or dimensions >= size - 1:
+            values, vectors = np.linalg.eigh(matrix.toarray())
+        else:
+            start = np.random.default_rng(self.seed).random(size)  # Fixed start vector - Same result every run
+            values, vectors = linalg.eigsh(matrix, k=dimensions, which="LA", v0=start)
+        order = np.argsort(-values, kind="stable")[:dimensions]
+        return vectors[:, order]
+
+    # Seeded k-means++ and Lloyd iterations on the rows of the embedding
+    def k_means(self, points, clusters):
+        random_generator = np.random.default_rng(self.seed)
+        size = points.shape[0]
+        centers = [points[0]]
+        distances = ((points - points[0]) ** 2).sum(axis=1)
+        for _ in range(1, clusters):
+            total = distances.sum()
+            if total <= 0.0:
+                centers.append(points[int(random_generator.integers(size))])
+            else:
+                centers.append(points[int(random_generator.choice(size, p=distances / total))])
+            distances = np.minimum(distances, ((points - centers[-1]) ** 2).sum(axis=1))
+        centers = np.array(centers)
+
+        labels = np.full(size, -1, dtype=np.int64)
+        squared_norms = (points ** 2).sum(axis=1)
+        for _ in range(Spectral_Partition.max_iterations):
+            squared_distances = squared_norms[:, None] - 2.0 * points @ centers.T + (centers ** 2).sum(axis=1)[None, :]
+            new_labels = np.argmin(squared_distances, axis=1)
+            if np.array_equal(new_labels, labels):
+                break
+            labels = new_labels
+            counts = np.bincount(labels, minlength=clusters)
+            for dimension in range(points.shape[1]):
+                sums = np.bincount(labels, weights=points[:, dimension], minlength=clusters)
+                centers[counts > 0, dimension] = sums[counts > 0] / counts[counts > 0]
+            # Empty clusters restart from the point farthest from its center
+            for cluster in np.flatnonzero(counts == 0):
+                farthest = int(np.argmax(squared_distances[np.arange(size), labels]))
+                centers[cluster] = points[farthest]
+                labels[farthest] = cluster
+        return labels
+
+    # Same criteria as Binary and K Partition - A part is small enough when both demands are below the thresholds
+    def exceeds_alpha(self, members, alpha):
+        if members.size <= 1:
+            return False
+        return not (self.service_cpu[members].sum() < self.max_cpu_allocation * alpha and
+                    self.service_ram[members].sum() < self.max_ram_allocation * alpha)
+
+    # Split a group in two at the sweep cut of its Fiedler vector with the smallest ratio cut
+    def fiedler_split(self, members):
+        size = members.size
+        if size == 2:
+            return members[:1], members[1:]
+        subgraph = self.graph[members][:, members].tocsr()
+        vectors = self.leading_eigenvectors(self.normalized_affinity(subgraph), 2)
+        order = np.argsort(vectors[:, 1], kind="stable")
+
+        # Cut after every position of the sorted order - An edge crosses the cuts between its two positions
+        position = np.empty(size, dtype=np.int64)
+        position[order] = np.arange(size)
+        coo = sparse.triu(subgraph, k=1).tocoo()
+        low = np.minimum(position[coo.row], position[coo.col])
+        high = np.maximum(position[coo.row], position[coo.col])
+        changes = np.bincount(low, weights=coo.data, minlength=size) - np.bincount(high, weights=coo.data,
+                                                                                   minlength=size)
+        cuts = np.cumsum(changes)[:-1]
+        left = np.arange(1, size)
+        best = int(np.argmin(cuts * (1.0 / left + 1.0 / (size - left))))
+        return members[order[:best + 1]], members[order[best + 1:]]
+
+    def cut_weight(self, labels):
+        coo = sparse.triu(self.graph, k=1).tocoo()
+        return float(coo.data[labels[coo.row] != labels[coo.col]].sum())
+
+    # Calculate the partitions of Application for given alpha value (percentage of resources usage)
+    # A partition found for a higher alpha can be given as initial partition since a lower alpha only refines it
+    @Instrumentation.timed
+    def calculate_app_partitions(self, alpha, initial_partition=None):
+        number_of_services = len(self.services)
+        if initial_partition is not None:
+            groups = [np.array([self.service_to_id[service] for service in initial_partition[part]], dtype=np.int64)
+                      for part in initial_partition]
+        elif number_of_services == 0:
+            groups = []
+        else:
+            # Number of clusters needed to meet the thresholds on resource demands alone
+            clusters = 1
+            for demand, capacity in ((self.service_cpu.sum(), self.max_cpu_allocation * alpha),
+                                     (self.service_ram.sum(), self.max_ram_allocation * alpha)):
+                clusters = max(clusters, number_of_services if capacity <= 0.0 else math.ceil(demand / capacity))
+            clusters = min(clusters, number_of_services)
+
+            if clusters == 1:
+                groups = [np.arange(number_of_services)]
+            elif clusters == number_of_services:
+                groups = [np.array([service]) for service in range(number_of_services)]
+            else:
+                dimensions = min(clusters, Spectral_Partition.max_dimensions, number_of_services - 1)
+                embedding = self.leading_eigenvectors(self.normalized_affinity(self.graph), dimensions)
+                norms = np.linalg.norm(embedding, axis=1)
+                embedding[norms > 0] /= norms[norms > 0][:, None]
+                labels = self.k_means(embedding, clusters)
+                groups = [np.flatnonzero(labels == cluster) for cluster in range(clusters)]
+
+        # Split the groups above the thresholds until every group meets them
+        feasible_groups = []
+        while groups:
+            members = groups.pop()
+            if members.size == 0:
+                continue
+            if self.exceeds_alpha(members, alpha):
+                groups.extend(self.fiedler_split(members))
+            else:
+                feasible_groups.append(np.sort(members))
+
+        # Pattern: {"1": [services], "2": [...], ...} - Parts are numbered in order of their first service
+        feasible_groups.sort(key=lambda members: members[0])
+        labels = np.full(number_of_services, -1, dtype=np.int64)
+        self.app_partition = {}
+        for index, members in enumerate(feasible_groups):
+            labels[members] = index
+            self.app_partition[str(index + 1)] = [self.services[service] for service in members]
+        self.cut_weights.append(self.cut_weight(labels))
@@ -0,0 +1,107 @@
+######################################################
+# Stoer-Wagner deterministic minimum weighted cut of a part of the application
+# Maximum adjacency orderings are found with a binary heap and the last two vertices are merged each phase
+# Input: Services of the part, Service Affinities (or the edges of the part from Placement_Problem)
+# Output: Partition in the app_partition format of contract_graph and the weight of the cut
+# Paper: A Simple Min-Cut Algorithm, Stoer and Wagner
+######################################################
+import heapq
+
+
+class Stoer_Wagner:
+    def __init__(self, services, service_affinities, edges=None):
+        self.services = []
+        self.service_to_id = {}
+        for service in services:
+            if service not in self.service_to_id:
+                self.service_to_id[service] = len(self.services)
+                self.services.append(service)
+        self.number_of_services = len(self.services)
+
+        # Undirected weighted graph - Both directions of an affinity are summed
+        self.adjacency = [{} for _ in range(self.number_of_services)]
+        if edges is not None:
+            # Edges (u, v, weight) given with the ids of the services already sum both directions
+            for u, v, weight in zip(*(array.tolist() for array in edges)):
+                self.adjacency[u][v] = self.adjacency[u].get(v, 0.0) + weight
+                self.adjacency[v][u] = self.adjacency[v].get(u, 0.0) + weight
+            return
+        for source in service_affinities:
+            if source not in self.service_to_id:
+                continue
+            for dest in service_affinities[source]:
+                if dest not in self.service_to_id or dest == source:
+                    continue
+                u, v = self.service_to_id[source], self.service_to_id[dest]
+                weight = float(service_affinities[source][dest])
+                self.adjacency[u][v] = self.adjacency[u].get(v, 0.0) + weight
+                self.adjacency[v][u] = self.adjacency[v].get(u, 0.0) + weight
+
+    # One phase - Returns the last two vertices of the maximum adjacency ordering and the cut of the last one
+    @staticmethod
+    def maximum_adjacency_phase(adjacency, active):
+        connectivity = {}
+        heap = []
+        for vertex in active:
+            connectivity[vertex] = 0.0
+            heap.append((0.0, vertex))
+        heapq.heapify(heap)
+
+        visited = set()
+        previous = last = None
+        last_weight = 0.0
+        while heap:
+            weight, vertex = heapq.heappop(heap)
+            # Skip stale heap entries
+            if vertex in visited or -weight != connectivity[vertex]:
+                continue
+            visited.add(vertex)
+            previous, last, last_weight = last, vertex, connectivity[vertex]
+            for neighbour, edge_weight in adjacency[vertex].items():
+                if neighbour not in visited:
+                    connectivity[neighbour] += edge_weight
+                    heapq.heappush(heap, (-connectivity[neighbour], neighbour))
+        return previous, last, last_weight
+
+    # Minimum cut over all phases - Deterministic since ties are broken by service order
+    def min_cut(self):
+        if self.number_of_services < 2:
+            return self.partition_from_side(set(range(self.number_of_services))), 0.0
+
+        adjacency = [dict(neighbours) for neighbours in self.adjacency]
+        members = [[vertex] for vertex in range(self.number_of_services)]
+        active = list(range(self.number_of_services))
+        best_cut = None
+        best_side = None
+
+        while len(active) > 1:
+            previous, last, cut = self.maximum_adjacency_phase(adjacency, active)
+            if best_cut is None or cut < best_cut:
+                best_cut = cut
+                best_side = set(members[last])
+
+            # Merge the last vertex into the previous one
+            for neighbour, edge_weight in adjacency[last].items():
+                adjacency[neighbour].pop(last)
+                if neighbour == previous:
+                    continue
+                adjacency[previous][neighbour] = adjacency[previous].get(neighbour, 0.0) + edge_weight
+                adjacency[neighbour][previous] = adjacency[neighbour].get(previous, 0.0) + edge_weight
+            adjacency[last] = {}
+            members[previous].extend(members[last])
+            active.remove(last)
+
+        return self.partition_from_side(best_side), best_cut
+
+    # Pattern: {"service": [services on the same side], ...} - The first service of each side is the key
+    def partition_from_side(self, side):
+        app_partition = {}
+        group_key = {}
+        for service in range(self.number_of_services):
+            label = service in side
+            if label not in group_key:
+                group_key[label] = self.services[service]
+                app_partition[self.services[service]] = []
+            else:
+                app_partition[group_key[label]].append(self.services[service])
+        return app_partition